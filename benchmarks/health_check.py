@@ -0,0 +1,132 @@
+"""Compare the startup time and memory use of the health check servers.
+
+Each server type is started in a fresh interpreter so that the measurements do
+not affect each other. The startup time is measured from creating the server
+until the first successful response to /healthz. The memory use is the
+resident set size of the interpreter and its child processes after the server
+has started minus the resident set size before creating the server, read from
+/proc so this works on Linux only.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER_TYPES = ("process", "thread")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument(
+        "--measure",
+        choices=SERVER_TYPES,
+        default=None,
+        help="Measure one server type in this interpreter and print JSON",
+    )
+    return parser.parse_args()
+
+
+def get_rss_in_bytes(pid):
+    status = pathlib.Path(f"/proc/{pid}/status").read_text(encoding="utf-8")
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def get_child_pids(pid):
+    children = []
+    for task in pathlib.Path(f"/proc/{pid}/task").iterdir():
+        children.extend(
+            int(child) for child in (task / "children").read_text().split()
+        )
+    return children
+
+
+def get_total_rss_in_bytes(pid):
+    return get_rss_in_bytes(pid) + sum(
+        get_total_rss_in_bytes(child) for child in get_child_pids(pid)
+    )
+
+
+def is_responding(url):
+    try:
+        with urllib.request.urlopen(url) as response:  # noqa: S310
+            response.read()
+    except urllib.error.HTTPError:
+        # The server responded even if the service is not healthy yet.
+        return True
+    except urllib.error.URLError:
+        return False
+    return True
+
+
+def wait_until_responding(url):
+    while not is_responding(url):
+        time.sleep(0.001)
+
+
+def measure(server_type, port):
+    from waltti_apc_vehicle_anonymization_profiler import health_check
+
+    rss_before = get_total_rss_in_bytes(os.getpid())
+    start = time.perf_counter()
+    server = health_check.create_health_check_server(
+        {"port": port, "server_type": server_type}
+    )
+    wait_until_responding(f"http://127.0.0.1:{port}/healthz")
+    startup_in_seconds = time.perf_counter() - start
+    rss_after = get_total_rss_in_bytes(os.getpid())
+    server["close_health_check_server"]()
+    return {
+        "startupInSeconds": startup_in_seconds,
+        "rssIncreaseInBytes": rss_after - rss_before,
+    }
+
+
+def measure_in_subprocess(server_type, port):
+    completed = subprocess.run(
+        [  # noqa: S603
+            sys.executable,
+            __file__,
+            "--measure",
+            server_type,
+            "--port",
+            str(port),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main():
+    args = parse_arguments()
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure, args.port)))
+        return
+    for server_type in SERVER_TYPES:
+        results = [
+            measure_in_subprocess(server_type, args.port)
+            for _ in range(args.repetitions)
+        ]
+        startup = statistics.median(r["startupInSeconds"] for r in results)
+        rss = statistics.median(r["rssIncreaseInBytes"] for r in results)
+        print(
+            f"{server_type:<8} median startup {startup * 1000:8.1f} ms"
+            f" median RSS increase {rss / 2**20:7.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure the import time of the service and check it against a budget.
+
+The main module is imported in fresh interpreters with -X importtime. The
+median cumulative import time is compared with the budget and the slowest
+direct imports are listed. The exit status is non-zero if the budget is
+exceeded so that the script can be used to catch startup regressions.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULE = "waltti_apc_vehicle_anonymization_profiler.main"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument(
+        "--budget-in-milliseconds",
+        type=float,
+        default=250.0,
+        help="The maximum median cumulative import time of the main module",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    return parser.parse_args()
+
+
+def parse_importtime(stderr):
+    """Parse the -X importtime output into (cumulative us, depth, module)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    return rows
+
+
+def measure():
+    completed = subprocess.run(
+        [  # noqa: S603
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {MODULE}",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return parse_importtime(completed.stderr)
+
+
+def main():
+    args = parse_arguments()
+    runs = [measure() for _ in range(args.repetitions)]
+    totals = [
+        next(c for c, _, name in rows if name == MODULE) / 1000
+        for rows in runs
+    ]
+    median_total = statistics.median(totals)
+    # The modules imported directly by the modules of the service.
+    direct = sorted((row for row in runs[-1] if row[1] == 1), reverse=True)
+    print(f"Slowest direct imports of the last run of {MODULE}:")
+    for cumulative, _, name in direct[: args.top]:
+        print(f"{cumulative / 1000:9.1f} ms {name}")
+    print(
+        f"Median cumulative import time {median_total:.1f} ms, budget"
+        f" {args.budget_in_milliseconds:.1f} ms"
+    )
+    if median_total > args.budget_in_milliseconds:
+        print("The import time budget was exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
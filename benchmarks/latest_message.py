@@ -0,0 +1,87 @@
+"""Benchmark reading the latest message from a topic with a large backlog.
+
+Fill a fresh topic on a Pulsar instance with a backlog of catalogue-sized
+messages and compare reading the latest message by scanning the whole topic
+from the earliest message with starting from the latest message inclusively.
+
+Pulsar standalone is enough, e.g.
+`docker run -p 6650:6650 apachepulsar/pulsar bin/pulsar standalone`.
+"""
+
+import argparse
+import logging
+import time
+import uuid
+
+import pulsar
+from waltti_apc_vehicle_anonymization_profiler import (
+    configuration,
+    message_processing,
+)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--service-url", default="pulsar://localhost:6650")
+    parser.add_argument(
+        "--topic-prefix", default="persistent://public/default"
+    )
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--message-bytes", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def fill_topic(client, topic, messages, message_bytes):
+    producer = client.create_producer(
+        topic, batching_enabled=True, block_if_queue_full=True
+    )
+    payload = b"x" * message_bytes
+    for index in range(messages):
+        producer.send_async(
+            payload, None, properties={"index": str(index)}, event_timestamp=1
+        )
+    producer.flush()
+    producer.close()
+
+
+def time_read(client, logger, topic, is_latest_only_read):
+    reader = client.create_reader(
+        topic, **configuration.get_reader_start(is_latest_only_read)
+    )
+    start = time.perf_counter()
+    message = message_processing.read_latest_message(
+        logger, reader, is_latest_only_read
+    )
+    duration = time.perf_counter() - start
+    reader.close()
+    return duration, message.properties()["index"]
+
+
+def main():
+    args = parse_arguments()
+    logger = logging.getLogger(__name__)
+    client = pulsar.Client(args.service_url)
+    topic = f"{args.topic_prefix}/latest-message-benchmark-{uuid.uuid4()}"
+    print(
+        f"Fill {topic} with {args.messages} messages of"
+        f" {args.message_bytes} bytes"
+    )
+    fill_topic(client, topic, args.messages, args.message_bytes)
+    for is_latest_only_read in (False, True):
+        mode = "latest-only" if is_latest_only_read else "full scan"
+        durations = []
+        for _ in range(args.repeats):
+            duration, index = time_read(
+                client, logger, topic, is_latest_only_read
+            )
+            durations.append(duration)
+        print(
+            f"{mode}: best {min(durations):.3f} s, worst"
+            f" {max(durations):.3f} s, read message index {index}"
+        )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Benchmark the stages of the pipeline with synthetic catalogues.
+
+Generate synthetic vehicle-APC mapping catalogues for a grid of numbers of
+feeds and vehicles and time each stage of turning them into a profile
+collection message separately. The profile computation is replaced with a stub
+that returns a fixed CSV profile so that only the glue code is measured.
+
+The results are saved as JSON named after the current commit so that the
+results of two commits can be compared with --compare.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import pathlib
+import platform
+import random
+import subprocess
+import time
+
+from waltti_apc_vehicle_anonymization_profiler import message_processing
+
+RESULTS_DIRECTORY = pathlib.Path(__file__).parent / "results"
+
+# A stand-in for the output of the profile computation.
+STUB_PROFILE = "count,EMPTY,FULL\n0,1.0,0.0\n1,0.5,0.5\n"
+
+
+class SyntheticMessage:
+    def __init__(self, data, topic):
+        self._data = data
+        self._topic = topic
+
+    def data(self):
+        return self._data
+
+    def properties(self):
+        return {}
+
+    def event_timestamp(self):
+        return 1
+
+    def topic_name(self):
+        return self._topic
+
+
+def parse_comma_separated_ints(string):
+    return [int(value) for value in string.split(",")]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--feeds",
+        type=parse_comma_separated_ints,
+        default=[10, 100, 10_000],
+        help="Comma-separated numbers of feeds",
+    )
+    parser.add_argument(
+        "--vehicles",
+        type=parse_comma_separated_ints,
+        default=[1_000, 10_000, 100_000, 1_000_000],
+        help="Comma-separated total numbers of vehicles",
+    )
+    parser.add_argument("--models", type=int, default=500)
+    parser.add_argument("--apc-share", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    parser.add_argument(
+        "--compare",
+        type=pathlib.Path,
+        default=None,
+        help="A results file of an earlier run to compare with",
+    )
+    return parser.parse_args()
+
+
+def create_vehicle(rng, operator_id, short_name, capacities, apc_share):
+    seating_capacity, standing_capacity = rng.choice(capacities)
+    equipment = [{"type": "LOCATION_PRODUCER", "id": f"l{short_name}"}]
+    if rng.random() < apc_share:
+        equipment.append(
+            {
+                "type": "PASSENGER_COUNTER",
+                "id": f"p{operator_id}-{short_name}",
+                "apcSystem": "SYNTHETIC",
+            }
+        )
+    return {
+        "operatorId": operator_id,
+        "vehicleShortName": short_name,
+        "seatingCapacity": seating_capacity,
+        "standingCapacity": standing_capacity,
+        "equipment": equipment,
+    }
+
+
+def create_catalogue_messages(rng, feeds, vehicles, models, apc_share):
+    capacities = rng.sample(
+        [(a, b) for a in range(10, 90) for b in range(120)], models
+    )
+    messages = {}
+    for feed in range(feeds):
+        vehicles_in_feed = vehicles // feeds + (feed < vehicles % feeds)
+        catalogue = [
+            create_vehicle(rng, str(feed), str(i), capacities, apc_share)
+            for i in range(vehicles_in_feed)
+        ]
+        messages[f"fi:feed{feed}"] = SyntheticMessage(
+            json.dumps(catalogue).encode("utf-8"),
+            f"persistent://public/default/catalogue-{feed}",
+        )
+    return messages
+
+
+def stub_computation(tuple_models):
+    return {
+        message_processing.combine_model_tuple_to_string(model): STUB_PROFILE
+        for model in tuple_models
+    }
+
+
+def time_stage(results, scenario, stage, function, *args):
+    start = time.perf_counter()
+    output = function(*args)
+    seconds = time.perf_counter() - start
+    results.append(scenario | {"stage": stage, "seconds": seconds})
+    print(
+        f"{scenario['feeds']:>6} feeds {scenario['vehicles']:>8} vehicles"
+        f" {stage:<55} {seconds:9.3f} s"
+    )
+    return output
+
+
+def run_scenario(logger, args, feeds, vehicles):
+    rng = random.Random(args.seed)
+    scenario = {"feeds": feeds, "vehicles": vehicles}
+    results = []
+    messages = create_catalogue_messages(
+        rng, feeds, vehicles, args.models, args.apc_share
+    )
+    vehicle_apc_mappings = time_stage(
+        results,
+        scenario,
+        "validate_and_return_vehicle_apc_mapping_messages",
+        message_processing.validate_and_return_vehicle_apc_mapping_messages,
+        logger,
+        messages,
+    )
+    time_stage(
+        results,
+        scenario,
+        "keep_only_vehicles_with_apc",
+        message_processing.keep_only_vehicles_with_apc,
+        vehicle_apc_mappings,
+    )
+    vehicles_to_tuple_models = time_stage(
+        results,
+        scenario,
+        "get_latest_vehicles_to_tuple_models",
+        message_processing.get_latest_vehicles_to_tuple_models,
+        logger,
+        messages,
+        vehicle_apc_mappings,
+    )
+    time_stage(
+        results,
+        scenario,
+        "get_latest_vehicles_to_tuple_models_in_single_pass",
+        message_processing.get_latest_vehicles_to_tuple_models_in_single_pass,
+        logger,
+        messages,
+    )
+    needed_tuple_models = vehicles_to_tuple_models.needed_tuple_models
+    # Half of the needed profiles are cached and half are newly computed.
+    sorted_needed_tuple_models = sorted(needed_tuple_models)
+    new_string_models_to_profiles = stub_computation(
+        sorted_needed_tuple_models[::2]
+    )
+    cached_string_models_to_profiles = stub_computation(
+        sorted_needed_tuple_models[1::2]
+    )
+    needed_string_models_to_profiles = time_stage(
+        results,
+        scenario,
+        "get_needed_string_models_to_profiles",
+        message_processing.get_needed_string_models_to_profiles,
+        logger,
+        vehicles_to_tuple_models,
+        new_string_models_to_profiles,
+        cached_string_models_to_profiles,
+    )
+    time_stage(
+        results,
+        scenario,
+        "form_producer_message_data",
+        message_processing.form_producer_message_data,
+        vehicles_to_tuple_models.get_vehicles_to_string_models(),
+        needed_string_models_to_profiles,
+    )
+    return results
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S603, S607
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, previous):
+    previous_seconds = {
+        (r["feeds"], r["vehicles"], r["stage"]): r["seconds"]
+        for r in previous["results"]
+    }
+    print(f"Compared with commit {previous['commit']}:")
+    for result in results:
+        key = (result["feeds"], result["vehicles"], result["stage"])
+        if key in previous_seconds and previous_seconds[key] > 0:
+            ratio = result["seconds"] / previous_seconds[key]
+            print(
+                f"{key[0]:>6} feeds {key[1]:>8} vehicles {key[2]:<55}"
+                f" {ratio:6.2f}x"
+            )
+
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=logging.ERROR)
+    logger = logging.getLogger(__name__)
+    results = []
+    for feeds in args.feeds:
+        for vehicles in args.vehicles:
+            if vehicles >= feeds:
+                results.extend(run_scenario(logger, args, feeds, vehicles))
+    commit = get_commit()
+    output = args.output
+    if output is None:
+        RESULTS_DIRECTORY.mkdir(exist_ok=True)
+        output = RESULTS_DIRECTORY / f"pipeline-{commit}.json"
+    output.write_text(
+        json.dumps(
+            {
+                "commit": commit,
+                "createdAt": datetime.datetime.now(datetime.UTC).isoformat(),
+                "python": platform.python_version(),
+                "arguments": {
+                    "models": args.models,
+                    "apcShare": args.apc_share,
+                    "seed": args.seed,
+                },
+                "results": results,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    print(f"Saved the results into {output}")
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
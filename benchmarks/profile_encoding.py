@@ -0,0 +1,114 @@
+"""Benchmark the JSON and binary encodings of profile collections.
+
+Build a synthetic profile collection with numeric CSV profiles and compare the
+size of each encoding, also after zlib compression as the messages are
+compressed by Pulsar, and the time it takes to decode each encoding.
+"""
+
+import argparse
+import random
+import time
+import zlib
+
+from waltti_apc_vehicle_anonymization_profiler import profile_encoding
+
+COLUMNS = [
+    "EMPTY",
+    "MANY_SEATS_AVAILABLE",
+    "FEW_SEATS_AVAILABLE",
+    "STANDING_ROOM_ONLY",
+    "CRUSHED_STANDING_ROOM_ONLY",
+    "FULL",
+]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--max-count", type=int, default=150)
+    parser.add_argument("--vehicles", type=int, default=2_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def create_profile(rng, max_count):
+    lines = [",".join(["count", *COLUMNS])]
+    for count in range(max_count + 1):
+        probabilities = [rng.random() for _ in COLUMNS]
+        total = sum(probabilities)
+        lines.append(
+            ",".join([str(count), *(repr(p / total) for p in probabilities)])
+        )
+    return "\n".join(lines) + "\n"
+
+
+def create_collection(args):
+    rng = random.Random(args.seed)
+    models = [
+        f"{seating}-{standing}"
+        for seating, standing in rng.sample(
+            [(a, b) for a in range(100) for b in range(100)], args.models
+        )
+    ]
+    return {
+        "schemaVersion": profile_encoding.JSON_SCHEMA_VERSION,
+        "vehicleModels": {
+            f"1_{vehicle}": rng.choice(models)
+            for vehicle in range(args.vehicles)
+        },
+        "modelProfiles": {
+            model: create_profile(rng, rng.randint(1, args.max_count))
+            for model in models
+        },
+    }
+
+
+def time_decode(data, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decoded = profile_encoding.decode_profile_collection(data)
+        durations.append(time.perf_counter() - start)
+    return min(durations), decoded
+
+
+def time_decode_tables(data, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        profile_encoding.decode_binary_tables(data)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main():
+    args = parse_arguments()
+    collection = create_collection(args)
+    print(
+        f"{len(collection['modelProfiles'])} profiles for"
+        f" {len(collection['vehicleModels'])} vehicles"
+    )
+    encoded = {
+        encoding: profile_encoding.encode_profile_collection(
+            collection
+            | {"schemaVersion": profile_encoding.get_schema_version(encoding)},
+            encoding,
+        )
+        for encoding in ("json", "binary")
+    }
+    for encoding, data in encoded.items():
+        duration, decoded = time_decode(data, args.repeats)
+        if decoded["modelProfiles"] != collection["modelProfiles"]:
+            msg = f"The {encoding} encoding did not round-trip the profiles"
+            raise RuntimeError(msg)
+        print(
+            f"{encoding}: {len(data)} bytes, {len(zlib.compress(data))} bytes"
+            f" compressed, decoded into CSV text in {duration * 1000:.1f} ms"
+        )
+    duration = time_decode_tables(encoded["binary"], args.repeats)
+    print(f"binary: decoded into typed columns in {duration * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Digests of the catalogue messages processed by the previous run.
+
+A digest combines the Pulsar message ID with a hash of the message content so
+that a run can tell right after reading the catalogue topics whether any
+catalogue has changed since the previous successful run.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import traceback
+
+
+def get_message_digest(message):
+    if message is None:
+        return None
+    return {
+        "messageId": message.message_id().serialize().hex(),
+        "sha256": hashlib.sha256(message.data()).hexdigest(),
+    }
+
+
+def get_message_digests(messages):
+    return {
+        feed_publisher_id: get_message_digest(message)
+        for feed_publisher_id, message in messages.items()
+    }
+
+
+def read_digests(logger, path):
+    """Read the digests written by the previous successful run.
+
+    A missing or unreadable file results in no digests so that the catalogues
+    are processed as usual.
+    """
+    digests = {}
+    try:
+        digests = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        logger.info(
+            "No catalogue digests were found from a previous run",
+            extra={"json_fields": {"path": str(path)}},
+        )
+    except Exception as err:
+        logger.error(
+            "Could not read the catalogue digests of the previous run. Process"
+            " the catalogues as usual.",
+            extra={
+                "json_fields": {
+                    "err": traceback.format_exception(err),
+                    "path": str(path),
+                }
+            },
+        )
+    return digests
+
+
+def write_digests(path, digests):
+    """Write the digests atomically so that a crash cannot corrupt them."""
+    tmp_path = pathlib.Path(f"{path}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(digests, f, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp_path.replace(path)
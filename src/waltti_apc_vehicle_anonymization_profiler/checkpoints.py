@@ -0,0 +1,77 @@
+"""Record finished profiles durably while the computation is still running.
+
+Each finished profile is written atomically into its own file in the
+checkpoint directory so that a run that gets interrupted can resume from the
+profiles that were already finished instead of computing them again. The
+directory is cleared once the profiles have been sent.
+"""
+
+import os
+import pathlib
+import traceback
+
+SUFFIX = ".csv"
+
+
+def write_profiles(logger, directory, string_models_to_profiles):
+    """Write each profile atomically so that a crash cannot corrupt it."""
+    directory_path = pathlib.Path(directory)
+    directory_path.mkdir(parents=True, exist_ok=True)
+    for string_model, profile in string_models_to_profiles.items():
+        path = directory_path / f"{string_model}{SUFFIX}"
+        tmp_path = directory_path / f"{string_model}{SUFFIX}.tmp"
+        with tmp_path.open("w", encoding="utf-8") as f:
+            f.write(profile)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp_path.replace(path)
+    logger.debug(
+        "Recorded finished profiles into the checkpoint directory",
+        extra={
+            "json_fields": {
+                "directory": str(directory),
+                "stringModels": sorted(string_models_to_profiles),
+            }
+        },
+    )
+
+
+def read_profiles(logger, directory):
+    """Read the profiles recorded by an interrupted run.
+
+    A missing or unreadable directory results in no profiles.
+    """
+    string_models_to_profiles = {}
+    try:
+        for path in sorted(pathlib.Path(directory).glob(f"*{SUFFIX}")):
+            string_models_to_profiles[path.stem] = path.read_text(
+                encoding="utf-8"
+            )
+    except Exception as err:
+        logger.error(
+            "Could not read the checkpoint directory. Compute the profiles"
+            " as usual.",
+            extra={
+                "json_fields": {
+                    "err": traceback.format_exception(err),
+                    "directory": str(directory),
+                }
+            },
+        )
+        return {}
+    if len(string_models_to_profiles) > 0:
+        logger.info(
+            "Found profiles finished by an interrupted run",
+            extra={
+                "json_fields": {
+                    "directory": str(directory),
+                    "stringModels": sorted(string_models_to_profiles),
+                }
+            },
+        )
+    return string_models_to_profiles
+
+
+def clear(directory):
+    for path in pathlib.Path(directory).glob(f"*{SUFFIX}*"):
+        path.unlink()
@@ -0,0 +1,168 @@
+"""Compute the profiles in a separate process started with spawn.
+
+The Pulsar client does not survive forking the process that holds it, see
+https://github.com/apache/pulsar-client-python/issues/127 . The profile
+computation uses multiprocessing so it is run in a compute process that is
+spawned before any Pulsar client exists. The main process keeps its Pulsar
+client, producer and readers open for the whole run.
+
+The main process sends each computation job over a pipe. The compute process
+sends back the events of the computation, i.e. the profiles finished so far
+for incremental publishing and the durations of single vehicle models, and
+finally either the profiles or the error.
+"""
+
+import contextlib
+import multiprocessing
+import signal
+import traceback
+
+from waltti_apc_vehicle_anonymization_profiler import (
+    gcp_logging,
+    message_processing,
+    metrics,
+)
+
+LOGGER_NAME = "waltti-apc-vehicle-anonymization-profiler-compute"
+
+MODELS_FINISHED = "modelsFinished"
+MODEL_TIMED = "modelTimed"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class ComputeProcessError(RuntimeError):
+    """The computation failed in the compute process or the process died."""
+
+
+def serve_jobs(connection, logger, compute_new_profiles):
+    """Run the jobs received over the connection until told to stop."""
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        processing_config, new_tuple_models, is_publishing = job
+        on_models_finished = None
+        if is_publishing:
+
+            def on_models_finished(string_models_to_profiles):
+                connection.send((MODELS_FINISHED, string_models_to_profiles))
+
+        def on_model_timed(model, duration_in_seconds):
+            connection.send((MODEL_TIMED, (model, duration_in_seconds)))
+
+        try:
+            new_string_models_to_profiles = compute_new_profiles(
+                logger,
+                processing_config,
+                new_tuple_models,
+                on_models_finished,
+                on_model_timed,
+            )
+        except Exception as err:
+            connection.send((FAILED, traceback.format_exception(err)))
+        else:
+            connection.send((SUCCEEDED, new_string_models_to_profiles))
+
+
+def run_compute_process(connection, registry):
+    # The main process decides when to stop so ignore interrupts meant for
+    # the main process, e.g. when pressing Ctrl-C in a terminal.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # A spawned process would otherwise create metrics that nobody reads.
+    metrics.set_registry(registry)
+    logger = gcp_logging.create_logger(LOGGER_NAME)
+    serve_jobs(connection, logger, message_processing.compute_new_profiles)
+    connection.close()
+    gcp_logging.flush_logs(logger)
+
+
+def receive_result(connection, on_models_finished, on_model_timed):
+    """Handle the events of a job until its result arrives."""
+    while True:
+        try:
+            kind, payload = connection.recv()
+        except EOFError as err:
+            msg = "The compute process exited during the computation"
+            raise ComputeProcessError(msg) from err
+        if kind == MODELS_FINISHED:
+            on_models_finished(payload)
+        elif kind == MODEL_TIMED:
+            if on_model_timed is not None:
+                on_model_timed(*payload)
+        elif kind == SUCCEEDED:
+            return payload
+        else:
+            msg = "The computation failed in the compute process:\n" + "".join(
+                payload
+            )
+            raise ComputeProcessError(msg)
+
+
+def start_compute_process(logger):
+    """Spawn the compute process.
+
+    Call this before creating any Pulsar client. Return a function with the
+    signature of message_processing.compute_new_profiles that runs the
+    computation in the compute process and a function to close the process.
+    """
+    context = multiprocessing.get_context("spawn")
+    connection, child_connection = context.Pipe()
+    # The process must not be daemonic as the computation creates processes of
+    # its own.
+    process = context.Process(
+        target=run_compute_process,
+        args=(child_connection, metrics.get_registry()),
+        name="compute",
+    )
+    process.start()
+    child_connection.close()
+    logger.info(
+        "Started the compute process",
+        extra={"json_fields": {"pid": process.pid}},
+    )
+
+    is_computing = False
+
+    def compute_new_profiles(
+        _logger,
+        processing_config,
+        new_tuple_models,
+        on_models_finished=None,
+        on_model_timed=None,
+    ):
+        nonlocal is_computing
+        is_computing = True
+        connection.send(
+            (
+                processing_config,
+                list(new_tuple_models),
+                on_models_finished is not None,
+            )
+        )
+        result = receive_result(connection, on_models_finished, on_model_timed)
+        is_computing = False
+        return result
+
+    def close_compute_process():
+        nonlocal process
+        if process is None:
+            return
+        if is_computing:
+            # Do not wait for the computation to finish, e.g. on a signal.
+            process.terminate()
+        else:
+            # The pipe is broken if the process has already exited.
+            with contextlib.suppress(OSError):
+                connection.send(None)
+        process.join()
+        connection.close()
+        process = None
+
+    return {
+        "close_compute_process": close_compute_process,
+        "compute_new_profiles": compute_new_profiles,
+    }
@@ -65,6 +65,66 @@ def get_health_check_port(env_var):
     return port
 
 
+def get_health_check_server_type(env_var, default):
+    string = os.getenv(env_var)
+    if string is None:
+        return default
+    if string in ("process", "thread"):
+        return string
+    msg = (
+        f"If given, the environment variable {env_var} must be set to either"
+        f' "process" or "thread". Instead, this was given: {string}'
+    )
+    raise ValueError(msg)
+
+
+def get_computation_processes(env_var):
+    processes = get_optional_int_with_default(env_var, 1)
+    if processes < 1:
+        msg = (
+            f"If given, the environment variable {env_var} must be a positive"
+            f" integer. Instead, this was given: {processes}"
+        )
+        raise ValueError(msg)
+    return processes
+
+
+def get_optional_positive_int(env_var):
+    value = get_optional_int_with_default(env_var, None)
+    if value is not None and value < 1:
+        msg = (
+            f"If given, the environment variable {env_var} must be a positive"
+            f" integer. Instead, this was given: {value}"
+        )
+        raise ValueError(msg)
+    return value
+
+
+def get_daemon_config():
+    is_daemon = get_optional_bool_with_default("IS_DAEMON", False)
+    if not is_daemon:
+        return None
+    daemon_config = {
+        "poll_interval_in_seconds": get_optional_int_with_default(
+            "DAEMON_POLL_INTERVAL_IN_SECONDS", 10
+        ),
+        "debounce_in_seconds": get_optional_int_with_default(
+            "DAEMON_DEBOUNCE_IN_SECONDS", 60
+        ),
+        "max_debounce_in_seconds": get_optional_int_with_default(
+            "DAEMON_MAX_DEBOUNCE_IN_SECONDS", 600
+        ),
+    }
+    if any(value < 0 for value in daemon_config.values()):
+        msg = (
+            "If given, the environment variables"
+            " DAEMON_POLL_INTERVAL_IN_SECONDS, DAEMON_DEBOUNCE_IN_SECONDS and"
+            " DAEMON_MAX_DEBOUNCE_IN_SECONDS must not be negative"
+        )
+        raise ValueError(msg)
+    return daemon_config
+
+
 def get_pulsar_compression_type(env_var, default):
     string = os.getenv(env_var)
     if string is None:
@@ -87,7 +147,35 @@ def get_pulsar_compression_type(env_var, default):
     raise ValueError(msg)
 
 
-def get_pulsar_catalogue_readers(env_var):
+def get_profile_collection_encoding(env_var, default):
+    string = os.getenv(env_var)
+    if string is None:
+        return default
+    if string in ("json", "binary"):
+        return string
+    msg = (
+        f"If given, the environment variable {env_var} must be set to either"
+        f' "json" or "binary". Instead, this was given: {string}'
+    )
+    raise ValueError(msg)
+
+
+def get_reader_start(is_latest_only_read):
+    """Get the reader options that decide where a reader starts reading.
+
+    Reading only the latest message means starting from the latest message
+    inclusively. Otherwise the whole topic is scanned from the earliest
+    message.
+    """
+    if is_latest_only_read:
+        return {
+            "start_message_id": pulsar.MessageId.latest,
+            "start_message_id_inclusive": True,
+        }
+    return {"start_message_id": pulsar.MessageId.earliest}
+
+
+def get_pulsar_catalogue_readers(env_var, reader_start):
     string = os.getenv(env_var)
     if string is None:
         msg = f"The environment variable {env_var} is required"
@@ -97,9 +185,9 @@ def get_pulsar_catalogue_readers(env_var):
         return {
             reader_spec["feedPublisherId"]: {
                 "topic": reader_spec["topic"],
-                "start_message_id": pulsar.MessageId.earliest,
                 "reader_name": reader_spec["name"],
             }
+            | reader_start
             for reader_spec in lists
         }
     except Exception as err:
@@ -112,14 +200,56 @@ def get_pulsar_catalogue_readers(env_var):
 
 
 def read_configuration():
+    catalogue_digests_path = get_optional_string_with_default(
+        "CATALOGUE_DIGESTS_PATH", None
+    )
+    checkpoint_directory_path = get_optional_string_with_default(
+        "CHECKPOINT_DIRECTORY_PATH", None
+    )
+    computation_processes = get_computation_processes("COMPUTATION_PROCESSES")
+    computation_time_budget_in_seconds = get_optional_positive_int(
+        "COMPUTATION_TIME_BUDGET_IN_SECONDS"
+    )
+    cprofile_output_path = get_optional_string_with_default(
+        "CPROFILE_OUTPUT_PATH", None
+    )
+    daemon_config = get_daemon_config()
     health_check_port = get_health_check_port("HEALTH_CHECK_PORT")
+    health_check_server_type = get_health_check_server_type(
+        "HEALTH_CHECK_SERVER_TYPE", "process"
+    )
+    is_concurrent_ingestion = get_optional_bool_with_default(
+        "IS_CONCURRENT_INGESTION", True
+    )
     is_fresh_start = get_optional_bool_with_default("IS_FRESH_START", False)
+    is_single_pass_catalogue_ingestion = get_optional_bool_with_default(
+        "IS_SINGLE_PASS_CATALOGUE_INGESTION", True
+    )
+    is_warm_start = get_optional_bool_with_default("IS_WARM_START", False)
+    incremental_publishing_batch_size = get_optional_positive_int(
+        "INCREMENTAL_PUBLISHING_BATCH_SIZE"
+    )
+    profile_collection_encoding = get_profile_collection_encoding(
+        "PROFILE_COLLECTION_ENCODING", "json"
+    )
+    profile_collection_max_message_bytes = get_optional_positive_int(
+        "PROFILE_COLLECTION_MAX_MESSAGE_BYTES"
+    )
+    if profile_collection_max_message_bytes is None:
+        profile_collection_max_message_bytes = 5_000_000
+    profile_store_path = get_optional_string_with_default(
+        "PROFILE_STORE_PATH", None
+    )
     pulsar_block_if_queue_full = get_optional_bool_with_default(
         "PULSAR_BLOCK_IF_QUEUE_FULL", True
     )
     pulsar_cache_reader_name = get_string("PULSAR_CACHE_READER_NAME")
+    pulsar_read_latest_only = get_optional_bool_with_default(
+        "PULSAR_READ_LATEST_ONLY", True
+    )
+    pulsar_reader_start = get_reader_start(pulsar_read_latest_only)
     pulsar_catalogue_readers = get_pulsar_catalogue_readers(
-        "PULSAR_CATALOGUE_READERS"
+        "PULSAR_CATALOGUE_READERS", pulsar_reader_start
     )
     pulsar_compression_type = get_pulsar_compression_type(
         "PULSAR_COMPRESSION_TYPE", pulsar.CompressionType.ZSTD
@@ -127,17 +257,60 @@ def read_configuration():
     pulsar_oauth2_audience = get_string("PULSAR_OAUTH2_AUDIENCE")
     pulsar_oauth2_issuer_url = get_string("PULSAR_OAUTH2_ISSUER_URL")
     pulsar_oauth2_private_key = get_string("PULSAR_OAUTH2_KEY_PATH")
+    pulsar_max_in_flight_messages = get_optional_positive_int(
+        "PULSAR_MAX_IN_FLIGHT_MESSAGES"
+    )
+    if pulsar_max_in_flight_messages is None:
+        pulsar_max_in_flight_messages = 16
+    pulsar_max_send_attempts = get_optional_positive_int(
+        "PULSAR_MAX_SEND_ATTEMPTS"
+    )
+    if pulsar_max_send_attempts is None:
+        pulsar_max_send_attempts = 3
     pulsar_producer_topic = get_string("PULSAR_PRODUCER_TOPIC")
     pulsar_service_url = get_string("PULSAR_SERVICE_URL")
     pulsar_tls_validate_hostname = get_optional_bool_with_default(
         "PULSAR_TLS_VALIDATE_HOSTNAME", True
     )
+    runtime_records_path = get_optional_string_with_default(
+        "RUNTIME_RECORDS_PATH", None
+    )
     return {
         "health_check": {
             "port": health_check_port,
+            "server_type": health_check_server_type,
+        },
+        "instrumentation": {
+            "cprofile_output_path": cprofile_output_path,
         },
         "processing": {
+            "catalogue_digests_path": catalogue_digests_path,
+            "checkpoint_directory_path": checkpoint_directory_path,
+            "computation_processes": computation_processes,
+            "computation_time_budget_in_seconds": (
+                computation_time_budget_in_seconds
+            ),
+            "daemon": daemon_config,
+            "is_concurrent_ingestion": is_concurrent_ingestion,
             "is_fresh_start": is_fresh_start,
+            "is_latest_only_read": pulsar_read_latest_only,
+            "is_single_pass_catalogue_ingestion": (
+                is_single_pass_catalogue_ingestion
+            ),
+            "is_warm_start": is_warm_start,
+            "incremental_publishing_batch_size": (
+                incremental_publishing_batch_size
+            ),
+            "profile_collection_encoding": profile_collection_encoding,
+            "profile_collection_max_message_bytes": (
+                profile_collection_max_message_bytes
+            ),
+            "profile_store_path": profile_store_path,
+            "publishing": {
+                "max_in_flight_messages": pulsar_max_in_flight_messages,
+                "max_send_attempts": pulsar_max_send_attempts,
+            },
+            "runtime_records_path": runtime_records_path,
         },
         "pulsar": {
             "oauth2": {
@@ -157,9 +330,9 @@ def read_configuration():
             },
             "cache_reader": {
                 "topic": pulsar_producer_topic,
-                "start_message_id": pulsar.MessageId.earliest,
                 "reader_name": pulsar_cache_reader_name,
-            },
+            }
+            | pulsar_reader_start,
             "catalogue_readers": pulsar_catalogue_readers,
         },
     }
@@ -0,0 +1,149 @@
+"""Keep running and react to catalogue updates.
+
+Instead of running once and exiting, keep the profile cache in memory, poll
+the catalogue topics for new snapshots and recompute once a burst of updates
+has settled down.
+"""
+
+import time
+
+from waltti_apc_vehicle_anonymization_profiler import message_processing
+
+
+def is_debounce_over(daemon_config, now, first_change_at, last_change_at):
+    """Decide whether to react to the pending catalogue changes.
+
+    React once no new change has arrived within the debounce period or once
+    the oldest pending change has waited for the maximum debounce period.
+    """
+    if first_change_at is None:
+        return False
+    return (
+        now - last_change_at >= daemon_config["debounce_in_seconds"]
+        or now - first_change_at >= daemon_config["max_debounce_in_seconds"]
+    )
+
+
+def get_message_id(message):
+    if message is None:
+        return None
+    return message.message_id().serialize()
+
+
+def poll_catalogue_readers(logger, resources, latest_messages):
+    """Read any new catalogue messages and update latest_messages in place.
+
+    Return the feed publisher IDs whose latest message changed.
+    """
+    changed_feed_publisher_ids = set()
+    for feed_publisher_id, reader in resources[
+        "pulsar_catalogue_readers"
+    ].items():
+        message = message_processing.get_latest_message(reader)
+        if message is not None and get_message_id(message) != get_message_id(
+            latest_messages.get(feed_publisher_id)
+        ):
+            logger.info(
+                "Found a new catalogue message",
+                extra={
+                    "json_fields": {
+                        "feedPublisherId": feed_publisher_id,
+                        "topic": message.topic_name(),
+                    }
+                },
+            )
+            latest_messages[feed_publisher_id] = message
+            changed_feed_publisher_ids.add(feed_publisher_id)
+    return changed_feed_publisher_ids
+
+
+def recompute(
+    logger,
+    processing_config,
+    resources,
+    cached_string_models_to_profiles,
+    latest_messages,
+    vehicle_apc_mappings,
+):
+    """Generate and send a message and update the in-memory cache.
+
+    Return the new models that were left without a profile.
+    """
+    on_store_new_profiles = message_processing.get_on_new_profiles(
+        logger, processing_config
+    )
+
+    def on_new_profiles(new_string_models_to_profiles):
+        cached_string_models_to_profiles.update(new_string_models_to_profiles)
+        if on_store_new_profiles is not None:
+            on_store_new_profiles(new_string_models_to_profiles)
+
+    _, remaining_tuple_models = message_processing.generate_and_send(
+        logger,
+        processing_config,
+        resources,
+        dict(cached_string_models_to_profiles),
+        latest_messages,
+        vehicle_apc_mappings,
+        on_new_profiles,
+    )
+    return remaining_tuple_models
+
+
+def run_daemon(logger, processing_config, resources):
+    daemon_config = processing_config["daemon"]
+    (
+        cached_string_models_to_profiles,
+        latest_messages,
+        vehicle_apc_mappings,
+        _,
+    ) = message_processing.ingest(logger, processing_config, resources)
+    message_processing.log_missing_catalogue_messages(
+        logger,
+        latest_messages,
+        {
+            feed_publisher_id: reader.topic()
+            for feed_publisher_id, reader in resources[
+                "pulsar_catalogue_readers"
+            ].items()
+        },
+    )
+    # React to the messages found on startup right away.
+    first_change_at = last_change_at = (
+        time.monotonic() - daemon_config["max_debounce_in_seconds"]
+    )
+    logger.info(
+        "Run as a daemon",
+        extra={"json_fields": {"daemonConfig": daemon_config}},
+    )
+    while True:
+        now = time.monotonic()
+        if is_debounce_over(
+            daemon_config, now, first_change_at, last_change_at
+        ):
+            logger.info("Catalogue changes have settled down. Recompute.")
+            remaining_tuple_models = recompute(
+                logger,
+                processing_config,
+                resources,
+                cached_string_models_to_profiles,
+                latest_messages,
+                vehicle_apc_mappings,
+            )
+            # The validated catalogues from the first ingestion go stale as
+            # soon as any catalogue changes.
+            vehicle_apc_mappings = None
+            first_change_at = last_change_at = None
+            if len(remaining_tuple_models) > 0:
+                # Continue with the remaining models right away.
+                first_change_at = last_change_at = (
+                    time.monotonic() - daemon_config["max_debounce_in_seconds"]
+                )
+        time.sleep(daemon_config["poll_interval_in_seconds"])
+        changed_feed_publisher_ids = poll_catalogue_readers(
+            logger, resources, latest_messages
+        )
+        if len(changed_feed_publisher_ids) > 0:
+            last_change_at = time.monotonic()
+            if first_change_at is None:
+                first_change_at = last_change_at
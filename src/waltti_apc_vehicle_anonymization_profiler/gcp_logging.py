@@ -1,7 +1,8 @@
+import copy
 import logging
+import logging.handlers
 import os
-
-import google.cloud.logging_v2.handlers
+from queue import SimpleQueue
 
 
 def map_log_level(log_level_string):
@@ -38,10 +39,107 @@ def get_log_level():
     return log_level
 
 
+def get_log_queue_size():
+    # As config has not been created yet, read LOG_QUEUE_SIZE directly from
+    # the environment.
+    string = os.getenv("LOG_QUEUE_SIZE")
+    if string is None:
+        return None
+    try:
+        size = int(string)
+    except ValueError:
+        size = 0
+    if size < 1:
+        msg = (
+            "If given, LOG_QUEUE_SIZE must be a positive integer. Instead,"
+            f' "{string}" was given.'
+        )
+        raise ValueError(msg)
+    return size
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hand the records over to a background writer through a bounded queue.
+
+    The queue is a SimpleQueue as its put is reentrant so that logging from a
+    signal handler cannot deadlock. When the queue holds size records or
+    more, records below WARNING are dropped and counted whereas records of
+    WARNING or above are enqueued anyway.
+
+    Unlike QueueHandler, the records are not formatted in the logging thread.
+    The writer thread formats them and the exception info reaches the
+    structured handler as such.
+    """
+
+    def __init__(self, queue, size):
+        super().__init__(queue)
+        self.size = size
+        # Only updated within handle which holds the reentrant handler lock.
+        self.number_of_dropped_records = 0
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+    def enqueue(self, record):
+        if (
+            record.levelno < logging.WARNING
+            and self.queue.qsize() >= self.size
+        ):
+            self.number_of_dropped_records += 1
+            return
+        self.queue.put_nowait(record)
+
+
+# The queue mode is process-wide like the root logger it is attached to.
+log_queue = {"handler": None, "listener": None}
+
+
 def create_logger(name):
-    google.cloud.logging_v2.handlers.setup_logging(
-        google.cloud.logging_v2.handlers.StructuredLogHandler()
-    )
+    """Create the logger.
+
+    If LOG_QUEUE_SIZE is given, the records are serialized and written by a
+    background thread. Call flush_logs before exiting to write out the queued
+    records.
+    """
+    # Importing the Google Cloud Logging library takes a significant share of
+    # the startup time so import it only when the logger is created.
+    import google.cloud.logging_v2.handlers
+
+    handler = google.cloud.logging_v2.handlers.StructuredLogHandler()
+    log_queue_size = get_log_queue_size()
+    if log_queue_size is not None and log_queue["listener"] is None:
+        queue = SimpleQueue()
+        log_queue["handler"] = BoundedQueueHandler(queue, log_queue_size)
+        log_queue["listener"] = logging.handlers.QueueListener(
+            queue, handler, respect_handler_level=True
+        )
+        log_queue["listener"].start()
+        handler = log_queue["handler"]
+    google.cloud.logging_v2.handlers.setup_logging(handler)
     logger = logging.getLogger(name)
     logger.setLevel(get_log_level())
     return logger
+
+
+def flush_logs(logger):
+    """Write out the queued records and stop the background writer.
+
+    Records logged afterwards are not written. Does nothing unless
+    LOG_QUEUE_SIZE is given.
+    """
+    listener = log_queue["listener"]
+    if listener is None:
+        return
+    number_of_dropped_records = log_queue["handler"].number_of_dropped_records
+    if number_of_dropped_records > 0:
+        logger.warning(
+            "Dropped log records as the log queue was full",
+            extra={
+                "json_fields": {
+                    "numberOfDroppedRecords": number_of_dropped_records
+                }
+            },
+        )
+    listener.stop()
+    log_queue["handler"] = None
+    log_queue["listener"] = None
@@ -3,17 +3,13 @@
 # We wish to log each problematic catalogue reader separately.
 # ruff: noqa: PERF203
 
+import contextlib
 import functools
 import signal
 import sys
 import traceback
 
 
-# FIXME:
-# Due to a known issue we close Pulsar before we use multiprocessing, just in
-# case. Once the issue is satisfactorily resolved, we can merge this back into
-# exit_gracefully if we wish to.
-# https://github.com/apache/pulsar-client-python/issues/127
 def close_pulsar(resources):
     """Close Pulsar resources."""
     logger = resources["logger"]
@@ -117,6 +113,19 @@ def exit_gracefully(resources, exit_code, exception=None):
                 },
             )
     close_pulsar(resources)
+    close_compute_process = resources.get("close_compute_process")
+    if close_compute_process is not None:
+        try:
+            logger.info("Close compute process")
+            close_compute_process()
+            del resources["close_compute_process"]
+        except Exception as err:
+            logger.error(
+                "Something went wrong when closing compute process",
+                extra={
+                    "json_fields": {"err": traceback.format_exception(err)}
+                },
+            )
     close_health_check_server = resources.get("close_health_check_server")
     if close_health_check_server is not None:
         try:
@@ -131,6 +140,13 @@ def exit_gracefully(resources, exit_code, exception=None):
                 },
             )
     logger.info("Exit process")
+    flush_logs = resources.get("flush_logs")
+    if flush_logs is not None:
+        # Write out the queued log records as the background writer thread
+        # would not survive the exit. Logging is over so nothing to report.
+        with contextlib.suppress(Exception):
+            flush_logs(logger)
+            del resources["flush_logs"]
     sys.exit(exit_code)
 
 
@@ -1,21 +1,38 @@
-"""A simple HTTP health check server."""
+"""A simple HTTP health check and metrics server.
+
+The server runs either in a separate process with Flask or in a thread of the
+current process with the standard library. The latter starts faster, uses
+less memory and does not fork the process that holds the Pulsar client.
+"""
 
 # By choice we bind to all interfaces and avoid adding another environment
 # variable.
 # ruff: noqa: S104
 
+import http.server
+import json
 import logging
 import multiprocessing
+import threading
 
-import flask
-import werkzeug
+from waltti_apc_vehicle_anonymization_profiler import graceful_exit, metrics
 
-from waltti_apc_vehicle_anonymization_profiler import graceful_exit
 
+def validate_is_healthy(is_healthy):
+    if not isinstance(is_healthy, bool):
+        msg = "is_healthy must be a boolean value"
+        raise TypeError(msg)
+
+
+def create_process_health_check_server(health_check_config):
+    # Flask is imported only if this server type is used.
+    import flask
+    import werkzeug.serving
 
-def create_health_check_server(health_check_config):
     app = flask.Flask(__name__)
     is_healthy_event = multiprocessing.Event()
+    # Create the registry before forking so that both processes share it.
+    registry = metrics.get_registry()
     process = None
 
     @app.route("/healthz")
@@ -28,6 +45,14 @@ def create_health_check_server(health_check_config):
         response.headers["Content-Type"] = "application/json; charset=utf-8"
         return response, 500
 
+    @app.route("/metrics")
+    def serve_metrics():
+        response = flask.make_response(metrics.render(registry), 200)
+        response.headers[
+            "Content-Type"
+        ] = "text/plain; version=0.0.4; charset=utf-8"
+        return response
+
     def run_app():
         graceful_exit.reset_signal_handlers()
         # Silence werkzeug logging every request if we use logging.DEBUG
@@ -50,14 +75,11 @@ def create_health_check_server(health_check_config):
             process = None
 
     def set_health_ok(is_healthy: bool):
-        if isinstance(is_healthy, bool):
-            if is_healthy:
-                is_healthy_event.set()
-            else:
-                is_healthy_event.clear()
+        validate_is_healthy(is_healthy)
+        if is_healthy:
+            is_healthy_event.set()
         else:
-            msg = "is_healthy must be a boolean value"
-            raise TypeError(msg)
+            is_healthy_event.clear()
 
     process = multiprocessing.Process(target=run_app)
     process.start()
@@ -66,3 +88,77 @@ def create_health_check_server(health_check_config):
         "close_health_check_server": close_health_check_server,
         "set_health_ok": set_health_ok,
     }
+
+
+def create_thread_health_check_server(health_check_config):
+    is_healthy_event = threading.Event()
+    # Create the registry before the request threads may need it.
+    registry = metrics.get_registry()
+
+    class HealthCheckHandler(http.server.BaseHTTPRequestHandler):
+        def send_body(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):  # noqa: N802
+            if self.path == "/healthz":
+                if is_healthy_event.is_set():
+                    self.send_response(204)
+                    self.end_headers()
+                    return
+                self.send_body(
+                    500,
+                    "application/json; charset=utf-8",
+                    json.dumps({"error": "Service is unhealthy"}).encode(
+                        "utf-8"
+                    ),
+                )
+            elif self.path == "/metrics":
+                self.send_body(
+                    200,
+                    "text/plain; version=0.0.4; charset=utf-8",
+                    metrics.render(registry).encode("utf-8"),
+                )
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            # Do not log every request, just like with werkzeug.
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ("0.0.0.0", health_check_config["port"]), HealthCheckHandler
+    )
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def close_health_check_server():
+        nonlocal thread
+        set_health_ok(False)
+        if thread is not None:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            thread = None
+
+    def set_health_ok(is_healthy: bool):
+        validate_is_healthy(is_healthy)
+        if is_healthy:
+            is_healthy_event.set()
+        else:
+            is_healthy_event.clear()
+
+    return {
+        "close_health_check_server": close_health_check_server,
+        "set_health_ok": set_health_ok,
+    }
+
+
+def create_health_check_server(health_check_config):
+    if health_check_config.get("server_type") == "thread":
+        return create_thread_health_check_server(health_check_config)
+    return create_process_health_check_server(health_check_config)
@@ -0,0 +1,75 @@
+"""Measure where the time goes.
+
+Each stage of a run logs its duration together with any item counts and
+sizes it records. Optionally, the whole run is captured with cProfile.
+
+The CPU profile of cProfile is not to be confused with the anonymization
+profiles that this service computes.
+"""
+
+import contextlib
+import cProfile
+import time
+
+from waltti_apc_vehicle_anonymization_profiler import metrics
+
+
+@contextlib.contextmanager
+def time_stage(logger, stage):
+    """Log the duration of the stage run within the context.
+
+    The context yields a dict into which the stage can record item counts and
+    sizes to be logged with the duration. The duration is logged and added to
+    the metrics even if the stage raises.
+    """
+    measurements = {}
+    start = time.perf_counter()
+    try:
+        yield measurements
+    finally:
+        duration_in_seconds = time.perf_counter() - start
+        metrics.observe_stage(stage, duration_in_seconds)
+        logger.info(
+            "Finished a stage",
+            extra={
+                "json_fields": {
+                    "stage": stage,
+                    "durationInSeconds": duration_in_seconds,
+                }
+                | measurements
+            },
+        )
+
+
+@contextlib.contextmanager
+def capture_cprofile(logger, output_path):
+    """Capture the context with cProfile if output_path is given.
+
+    The stats are written into output_path when the context exits for any
+    reason, including SystemExit raised by the signal handlers. Only the
+    current process is captured.
+    """
+    if output_path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    logger.info(
+        "Capture the run with cProfile",
+        extra={"json_fields": {"outputPath": output_path}},
+    )
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+        logger.info(
+            "Wrote the cProfile stats",
+            extra={"json_fields": {"outputPath": output_path}},
+        )
+
+
+def get_total_bytes(messages):
+    return sum(
+        len(message.data()) for message in messages if message is not None
+    )
@@ -0,0 +1,43 @@
+"""Decode JSON incrementally."""
+
+import json
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def skip_whitespace(text, index):
+    return WHITESPACE.match(text, index).end()
+
+
+def iterate_json_array(text):
+    """Yield the elements of the JSON array in text one at a time.
+
+    Only one element is decoded at a time so the whole array is never held in
+    memory as Python objects.
+
+    Raises json.JSONDecodeError if text is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    index = skip_whitespace(text, 0)
+    if text[index : index + 1] != "[":
+        msg = "Expecting '['"
+        raise json.JSONDecodeError(msg, text, index)
+    index = skip_whitespace(text, index + 1)
+    if text[index : index + 1] == "]":
+        index = skip_whitespace(text, index + 1)
+    else:
+        while True:
+            element, index = decoder.raw_decode(text, index)
+            yield element
+            delimiter_index = skip_whitespace(text, index)
+            delimiter = text[delimiter_index : delimiter_index + 1]
+            index = skip_whitespace(text, delimiter_index + 1)
+            if delimiter == "]":
+                break
+            if delimiter != ",":
+                msg = "Expecting ',' delimiter"
+                raise json.JSONDecodeError(msg, text, delimiter_index)
+    if index != len(text):
+        msg = "Extra data"
+        raise json.JSONDecodeError(msg, text, index)
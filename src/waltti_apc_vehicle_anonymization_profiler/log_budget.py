@@ -0,0 +1,56 @@
+"""Keep the log records small and cheap to build.
+
+Some log records could carry whole catalogues or profile collections. Fields
+are built only if the record is going to be emitted, large payloads are
+replaced with their hash, length and a preview, and repeated per-item errors
+are summarized into one record.
+"""
+
+import hashlib
+import json
+
+# Cloud Logging limits the size of a log entry to 256 KiB. Leave room for the
+# other fields.
+MAX_PAYLOAD_LENGTH = 16_384
+PREVIEW_LENGTH = 1024
+MAX_SAMPLES = 10
+
+
+def log_lazily(logger, level, msg, build_json_fields):
+    """Log msg with the fields from build_json_fields if level is enabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={"json_fields": build_json_fields()})
+
+
+def summarize_payload(payload, max_length=MAX_PAYLOAD_LENGTH):
+    """Replace a payload that is too large with its summary.
+
+    Bytes are previewed as UTF-8 text. Other payloads than strings and bytes
+    are measured as JSON. A payload that fits within max_length is returned
+    as such.
+    """
+    if isinstance(payload, bytes):
+        data = payload
+        if len(data) <= max_length:
+            return data.decode(encoding="utf-8", errors="replace")
+    else:
+        text = (
+            payload
+            if isinstance(payload, str)
+            else json.dumps(payload, default=str)
+        )
+        if len(text) <= max_length:
+            return payload
+        data = text.encode("utf-8")
+    return {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "lengthInBytes": len(data),
+        "preview": data[:PREVIEW_LENGTH].decode(
+            encoding="utf-8", errors="replace"
+        ),
+    }
+
+
+def summarize_items(items, max_samples=MAX_SAMPLES):
+    """Summarize repeated items, e.g. vehicles with the same error."""
+    return {"count": len(items), "samples": list(items[:max_samples])}
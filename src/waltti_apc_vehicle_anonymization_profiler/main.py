@@ -5,10 +5,13 @@ import sys
 import traceback
 
 from waltti_apc_vehicle_anonymization_profiler import (
+    compute_process,
     configuration,
+    daemon,
     gcp_logging,
     graceful_exit,
     health_check,
+    instrumentation,
     message_processing,
     pulsar_wrapper,
 )
@@ -19,11 +22,23 @@ def main():
     try:
         logger = gcp_logging.create_logger(service_name)
         try:
-            resources = {"logger": logger}
+            resources = {
+                "logger": logger,
+                "flush_logs": gcp_logging.flush_logs,
+            }
             exit_handler = graceful_exit.get_exit_handler(resources)
             logger.info(f"Start service {service_name}")
             logger.info("Read configuration")
             config = configuration.read_configuration()
+            # The compute process must be spawned before any Pulsar client
+            # exists.
+            # https://github.com/apache/pulsar-client-python/issues/127
+            logger.info("Start compute process")
+            compute = compute_process.start_compute_process(logger)
+            resources["close_compute_process"] = compute[
+                "close_compute_process"
+            ]
+            resources["compute_new_profiles"] = compute["compute_new_profiles"]
             logger.info("Create health check server")
             health_check_server = health_check.create_health_check_server(
                 config["health_check"]
@@ -57,24 +72,13 @@ def main():
             logger.info("Set health check status to OK")
             set_health_ok(True)
             logger.info("Process messages")
-            message_processing.process_messages(
-                logger,
-                config["processing"],
-                # FIXME:
-                # Due to a known issue we send pulsar_config into
-                # message_processing so that the module can destroy and create
-                # Pulsar resources. Once the issue is satisfactorily resolved,
-                # pass just the producer and the readers onwards as usual.
-                # https://github.com/apache/pulsar-client-python/issues/127
-                config["pulsar"],
-                # FIXME:
-                # Due to a known issue we send resources into
-                # message_processing so that the module can destroy and create
-                # Pulsar resources. Once the issue is satisfactorily resolved,
-                # pass just the producer and the readers onwards as usual.
-                # https://github.com/apache/pulsar-client-python/issues/127
-                resources,
-            )
+            process = message_processing.process_messages
+            if config["processing"]["daemon"] is not None:
+                process = daemon.run_daemon
+            with instrumentation.capture_cprofile(
+                logger, config["instrumentation"]["cprofile_output_path"]
+            ):
+                process(logger, config["processing"], resources)
             logger.info("Finished successfully")
             exit_handler(os.EX_OK)
         except Exception as err:
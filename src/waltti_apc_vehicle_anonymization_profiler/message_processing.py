@@ -1,58 +1,168 @@
 """Process messages and handle the business logic."""
 
+import concurrent.futures
+import functools
 import json
+import logging
 import pathlib
 import tempfile
 import time
 import traceback
 
-import apc_anonymizer.configuration
-import jsonschema
-from apc_anonymizer.mechanisms.simple import hyperparameter_optimization
+import pulsar
 
 from waltti_apc_vehicle_anonymization_profiler import (
-    graceful_exit,
-    pulsar_wrapper,
+    catalogue_digests,
+    checkpoints,
+    instrumentation,
+    json_streaming,
+    log_budget,
+    metrics,
+    profile_chunking,
+    profile_encoding,
+    profile_store,
+    publishing,
+    runtime_estimator,
     validators,
+    vehicle_model_index,
 )
 
 
+def read_next(reader):
+    message = reader.read_next()
+    metrics.increment("message_bytes_read_total", len(message.data()))
+    return message
+
+
 def get_latest_message(reader):
     message = None
     while reader.has_message_available():
-        message = reader.read_next()
+        message = read_next(reader)
+    return message
+
+
+def read_latest_message(logger, reader, is_latest_only_read):
+    """Read the latest message on the topic of the reader.
+
+    If the reader was created to start inclusively from the latest message,
+    only the last message is transferred. If that finds nothing, fall back to
+    scanning the topic from the earliest message so that an unexpectedly
+    positioned reader cannot hide existing messages from us.
+    """
+    message = get_latest_message(reader)
+    if message is None and is_latest_only_read:
+        logger.debug(
+            "No message was found from the latest position. Fall back to"
+            " scanning the topic from the earliest message.",
+            extra={"json_fields": {"pulsarTopic": reader.topic()}},
+        )
+        reader.seek(pulsar.MessageId.earliest)
+        message = get_latest_message(reader)
     return message
 
 
-def validate_and_return_message_data(logger, validator, message):
+def iterate_messages(reader):
+    while reader.has_message_available():
+        yield read_next(reader)
+
+
+def read_latest_collection(logger, reader, is_latest_only_read):
+    """Read the messages of the latest complete profile collection.
+
+    If the latest message is the last part of a multi-message collection, seek
+    back to the start of that collection to read its other parts. If the
+    latest collection is incomplete, e.g. because sending it was interrupted,
+    or its parts cannot be found that way, scan the topic from the earliest
+    message for the latest complete collection.
+
+    Return None if there is no complete collection.
+    """
+    if not is_latest_only_read:
+        return profile_chunking.find_latest_complete_collection(
+            logger, iterate_messages(reader)
+        )
+    latest_message = read_latest_message(logger, reader, is_latest_only_read)
+    if latest_message is None:
+        return None
+    if not profile_chunking.is_part(latest_message):
+        return [latest_message]
+    info = profile_chunking.get_last_part_info(latest_message)
+    if info is not None:
+        reader.seek(
+            info[profile_chunking.COLLECTION_START_TIMESTAMP]
+            - profile_chunking.SEEK_MARGIN_IN_MILLISECONDS
+        )
+        collection = profile_chunking.find_latest_complete_collection(
+            logger, iterate_messages(reader)
+        )
+        if (
+            collection is not None
+            and profile_chunking.get_part_info(collection[-1]) == info
+        ):
+            return collection
+    logger.info(
+        "The latest profile collection is incomplete. Scan the topic from the"
+        " earliest message for the latest complete collection.",
+        extra={
+            "json_fields": {
+                "pulsarTopic": reader.topic(),
+                "properties": latest_message.properties(),
+            }
+        },
+    )
+    reader.seek(pulsar.MessageId.earliest)
+    return profile_chunking.find_latest_complete_collection(
+        logger, iterate_messages(reader)
+    )
+
+
+def validate_and_return_message_data(
+    logger, validator, message, decode=json.loads
+):
     result = None
     try:
         message_data = message.data()
-        to_be_validated = json.loads(message_data)
+        to_be_validated = decode(message_data)
         validator.validate(to_be_validated)
         result = to_be_validated
+    except profile_encoding.ProfileEncodingError as err:
+        logger.error(
+            "The Pulsar message data is not a valid binary profile collection",
+            extra={
+                "json_fields": {
+                    "err": traceback.format_exception(err),
+                    "messageDataLength": len(message_data),
+                    "properties": message.properties(),
+                    "messageEventTimestamp": message.event_timestamp(),
+                }
+            },
+        )
     except json.JSONDecodeError as err:
         logger.error(
             "The Pulsar message data is not valid JSON",
             extra={
                 "json_fields": {
                     "err": traceback.format_exception(err),
-                    "messageDataString": message_data.decode(
-                        encoding="utf-8", errors="replace"
+                    "messageDataString": log_budget.summarize_payload(
+                        message_data
                     ),
                     "properties": message.properties(),
                     "messageEventTimestamp": message.event_timestamp(),
                 }
             },
         )
-    except jsonschema.ValidationError as err:
+    # The except clause is evaluated only when an exception was raised so
+    # jsonschema is not imported for valid messages.
+    except validators.get_validation_error_class() as err:
         logger.error(
             "The Pulsar message data does not validate with the given schema"
             " validator",
             extra={
                 "json_fields": {
                     "err": traceback.format_exception(err),
-                    "messageData": to_be_validated,
+                    "messageData": log_budget.summarize_payload(
+                        to_be_validated
+                    ),
                     "properties": message.properties(),
                     "messageEventTimestamp": message.event_timestamp(),
                 }
@@ -72,26 +182,24 @@ def validate_and_return_message_data(logger, validator, message):
     return result
 
 
-def split_model_string_to_tuple(model_string):
-    return tuple(map(int, model_string.split(sep="-", maxsplit=1)))
-
-
-def combine_model_tuple_to_string(model_tuple):
-    return "-".join(map(str, model_tuple))
+# The computation handles single vehicle models without a VehicleModelIndex.
+split_model_string_to_tuple = vehicle_model_index.split_model_string_to_tuple
+combine_model_tuple_to_string = (
+    vehicle_model_index.combine_model_tuple_to_string
+)
 
 
 def build_cache(logger, message):
     validator = validators.get_profile_collection_validator()
     vehicle_profiles = validate_and_return_message_data(
-        logger, validator, message
+        logger,
+        validator,
+        message,
+        decode=profile_encoding.decode_profile_collection,
     )
     return vehicle_profiles["modelProfiles"]
 
 
-def get_vehicle_string(vehicle):
-    return vehicle["operatorId"] + "_" + vehicle["vehicleShortName"]
-
-
 def validate_and_return_vehicle_apc_mapping_messages(logger, messages):
     validator = validators.get_vehicle_apc_mapping_validator()
     return {
@@ -128,7 +236,7 @@ def log_if_multiple_apc_devices(logger, all_vehicles, messages):
                 )
                 > 1
             ],
-            key=get_vehicle_string,
+            key=vehicle_model_index.get_vehicle_string,
         )
         for feed_publisher_id, vehicles in all_vehicles.items()
     }
@@ -146,7 +254,9 @@ def log_if_multiple_apc_devices(logger, all_vehicles, messages):
                             vehicles_with_multiple_apc
                         ),
                         "vehiclesWithMultipleApcSystems": (
-                            vehicles_with_multiple_apc
+                            log_budget.summarize_payload(
+                                vehicles_with_multiple_apc
+                            )
                         ),
                         "feedPublisherId": feed_publisher_id,
                         "topic": messages[feed_publisher_id].topic_name(),
@@ -155,31 +265,57 @@ def log_if_multiple_apc_devices(logger, all_vehicles, messages):
             )
 
 
+def add_vehicle_to_tuple_model(
+    vehicles_to_tuple_models,
+    vehicles_without_capacity,
+    feed_publisher_id,
+    vehicle,
+):
+    seating_capacity = vehicle.get("seatingCapacity")
+    standing_capacity = vehicle.get("standingCapacity")
+    if (seating_capacity is None) or (standing_capacity is None):
+        vehicles_without_capacity.append(vehicle)
+    else:
+        vehicles_to_tuple_models.add_vehicle(
+            vehicle_model_index.get_vehicle_key(feed_publisher_id, vehicle),
+            (seating_capacity, standing_capacity),
+        )
+
+
+def log_vehicles_without_capacity(
+    logger, feed_publisher_id, vehicles_without_capacity
+):
+    """Log one summary of the vehicles without capacity in the feed."""
+    if len(vehicles_without_capacity) > 0:
+        logger.error(
+            "Some vehicles do not have seatingCapacity or standingCapacity"
+            " defined so no anonymization profile can be created for them."
+            " If either value should be zero, mark it explicitly so in the"
+            " vehicle registry.",
+            extra={
+                "json_fields": {
+                    "vehicles": log_budget.summarize_items(
+                        vehicles_without_capacity
+                    ),
+                    "feedPublisherId": feed_publisher_id,
+                }
+            },
+        )
+
+
 def get_vehicles_to_tuple_models(logger, feed_publisher_id, vehicle_catalogue):
-    vehicles_to_tuple_models = {}
+    vehicles_to_tuple_models = vehicle_model_index.VehicleModelIndex()
+    vehicles_without_capacity = []
     for vehicle in vehicle_catalogue:
-        seating_capacity = vehicle.get("seatingCapacity")
-        standing_capacity = vehicle.get("standingCapacity")
-        if (seating_capacity is None) or (standing_capacity is None):
-            logger.error(
-                "The vehicle does not have seatingCapacity or standingCapacity"
-                " defined so no anonymization profile can be created for it."
-                " If either value should be zero, mark it explicitly so in the"
-                " vehicle registry.",
-                extra={
-                    "json_fields": {
-                        "vehicle": vehicle,
-                        "feedPublisherId": feed_publisher_id,
-                    }
-                },
-            )
-        else:
-            vehicles_to_tuple_models[
-                feed_publisher_id + ":" + get_vehicle_string(vehicle)
-            ] = (
-                seating_capacity,
-                standing_capacity,
-            )
+        add_vehicle_to_tuple_model(
+            vehicles_to_tuple_models,
+            vehicles_without_capacity,
+            feed_publisher_id,
+            vehicle,
+        )
+    log_vehicles_without_capacity(
+        logger, feed_publisher_id, vehicles_without_capacity
+    )
     return vehicles_to_tuple_models
 
 
@@ -190,38 +326,177 @@ def extract_vehicles_to_tuple_models(logger, all_vehicles):
     ]
 
 
-def merge_list_of_dicts(list_of_dicts):
-    result = {}
-    for d in list_of_dicts:
-        result.update(d)
+def merge_vehicles_to_tuple_models(list_of_vehicles_to_tuple_models):
+    result = vehicle_model_index.VehicleModelIndex()
+    for vehicles_to_tuple_models in list_of_vehicles_to_tuple_models:
+        result.update(vehicles_to_tuple_models)
     return result
 
 
-def get_latest_vehicles_to_tuple_models(logger, messages):
-    vehicle_apc_mappings = validate_and_return_vehicle_apc_mapping_messages(
-        logger, messages
+class InvalidCatalogueError(Exception):
+    """The catalogue did not pass the single-pass checks."""
+
+
+def count_apc_devices(vehicle):
+    return sum(
+        device["type"] == "PASSENGER_COUNTER"
+        for device in vehicle["equipment"]
     )
+
+
+def stream_vehicles_to_tuple_models(logger, feed_publisher_id, message):
+    """Map the vehicles with APC devices to their models in a single pass.
+
+    Decode, validate, filter and map one vehicle at a time so that the
+    decoded catalogue is never held in memory as a whole. Only the hashes of
+    the vehicles are kept to check that they are unique.
+
+    Raises InvalidCatalogueError if the catalogue does not pass the checks.
+    """
+    vehicle_validator = validators.get_vehicle_validator()
+    vehicles_to_tuple_models = vehicle_model_index.VehicleModelIndex()
+    number_of_vehicles_with_apc = 0
+    vehicles_with_multiple_apc = []
+    vehicles_without_capacity = []
+    number_of_vehicles = 0
+    seen_vehicle_hashes = set()
+    try:
+        for vehicle in json_streaming.iterate_json_array(
+            message.data().decode("utf-8")
+        ):
+            number_of_vehicles += 1
+            vehicle_hash = hash(validators.freeze(vehicle))
+            if vehicle_hash in seen_vehicle_hashes:
+                msg = "A vehicle might be duplicated"
+                raise InvalidCatalogueError(msg)
+            seen_vehicle_hashes.add(vehicle_hash)
+            if not vehicle_validator.check(vehicle):
+                msg = "A vehicle does not validate"
+                raise InvalidCatalogueError(msg)
+            apc_device_count = count_apc_devices(vehicle)
+            if apc_device_count > 0:
+                number_of_vehicles_with_apc += 1
+                add_vehicle_to_tuple_model(
+                    vehicles_to_tuple_models,
+                    vehicles_without_capacity,
+                    feed_publisher_id,
+                    vehicle,
+                )
+            if apc_device_count > 1:
+                vehicles_with_multiple_apc.append(vehicle)
+    except (json.JSONDecodeError, UnicodeDecodeError) as err:
+        msg = "The catalogue is not a JSON array"
+        raise InvalidCatalogueError(msg) from err
+    log_vehicles_without_capacity(
+        logger, feed_publisher_id, vehicles_without_capacity
+    )
+    return {
+        "numberOfVehicles": number_of_vehicles,
+        "numberOfVehiclesWithApc": number_of_vehicles_with_apc,
+        "vehiclesWithMultipleApc": vehicles_with_multiple_apc,
+        "vehiclesToTupleModels": vehicles_to_tuple_models,
+    }
+
+
+def get_latest_vehicles_to_tuple_models_in_single_pass(logger, messages):
+    vehicle_apc_mapping_sizes = {}
+    vehicles_with_apc_sizes = {}
+    merged_vehicles_to_tuple_models = vehicle_model_index.VehicleModelIndex()
+    for feed_publisher_id, message in messages.items():
+        if message is None:
+            continue
+        try:
+            result = stream_vehicles_to_tuple_models(
+                logger, feed_publisher_id, message
+            )
+        except InvalidCatalogueError:
+            # Validate the whole catalogue to log the detailed error. If the
+            # single-pass checks were too cautious, e.g. due to a hash
+            # collision, carry on with the validated catalogue.
+            vehicle_apc_mapping = validate_and_return_message_data(
+                logger, validators.get_vehicle_apc_mapping_validator(), message
+            )
+            if vehicle_apc_mapping is None:
+                continue
+            vehicles_with_apc = keep_only_vehicles_with_apc(
+                {feed_publisher_id: vehicle_apc_mapping}
+            )[feed_publisher_id]
+            result = {
+                "numberOfVehicles": len(vehicle_apc_mapping),
+                "numberOfVehiclesWithApc": len(vehicles_with_apc),
+                "vehiclesWithMultipleApc": [
+                    v for v in vehicles_with_apc if count_apc_devices(v) > 1
+                ],
+                "vehiclesToTupleModels": get_vehicles_to_tuple_models(
+                    logger, feed_publisher_id, vehicles_with_apc
+                ),
+            }
+        log_if_multiple_apc_devices(
+            logger,
+            {feed_publisher_id: result["vehiclesWithMultipleApc"]},
+            messages,
+        )
+        merged_vehicles_to_tuple_models.update(result["vehiclesToTupleModels"])
+        vehicle_apc_mapping_sizes[feed_publisher_id] = result[
+            "numberOfVehicles"
+        ]
+        vehicles_with_apc_sizes[feed_publisher_id] = result[
+            "numberOfVehiclesWithApc"
+        ]
+    log_budget.log_lazily(
+        logger,
+        logging.DEBUG,
+        "Got latest vehicle-to-vehicle-model mappings in a single pass",
+        lambda: {
+            "vehicleApcMappingSizes": vehicle_apc_mapping_sizes,
+            "vehiclesWithApcSizes": vehicles_with_apc_sizes,
+            "mergedVehicleToTupleModels": log_budget.summarize_payload(
+                dict(merged_vehicles_to_tuple_models)
+            ),
+        },
+    )
+    return merged_vehicles_to_tuple_models
+
+
+def get_latest_vehicles_to_tuple_models(
+    logger, messages, vehicle_apc_mappings=None
+):
+    if vehicle_apc_mappings is None:
+        vehicle_apc_mappings = {}
+    unvalidated_messages = {
+        k: v for k, v in messages.items() if k not in vehicle_apc_mappings
+    }
+    if len(unvalidated_messages) > 0:
+        vehicle_apc_mappings = vehicle_apc_mappings | (
+            validate_and_return_vehicle_apc_mapping_messages(
+                logger, unvalidated_messages
+            )
+        )
     vehicles_with_apc = keep_only_vehicles_with_apc(vehicle_apc_mappings)
     log_if_multiple_apc_devices(logger, vehicles_with_apc, messages)
     vehicles_to_tuple_models = extract_vehicles_to_tuple_models(
         logger, vehicles_with_apc
     )
-    merged_vehicles_to_tuple_models = merge_list_of_dicts(
+    merged_vehicles_to_tuple_models = merge_vehicles_to_tuple_models(
         vehicles_to_tuple_models
     )
-    logger.debug(
+    log_budget.log_lazily(
+        logger,
+        logging.DEBUG,
         "Got latest vehicle-to-vehicle-model mappings",
-        extra={
-            "json_fields": {
-                "vehicleApcMappingSizes": {
-                    f: len(v) for f, v in vehicle_apc_mappings.items()
-                },
-                "vehiclesWithApcSizes": {
-                    f: len(v) for f, v in vehicles_with_apc.items()
-                },
-                "vehicleToTupleModels": vehicles_with_apc,
-                "mergedVehicleToTupleModels": merged_vehicles_to_tuple_models,
-            }
+        lambda: {
+            "vehicleApcMappingSizes": {
+                f: len(v) for f, v in vehicle_apc_mappings.items()
+            },
+            "vehiclesWithApcSizes": {
+                f: len(v) for f, v in vehicles_with_apc.items()
+            },
+            "vehicleToTupleModels": log_budget.summarize_payload(
+                vehicles_with_apc
+            ),
+            "mergedVehicleToTupleModels": log_budget.summarize_payload(
+                dict(merged_vehicles_to_tuple_models)
+            ),
         },
     )
     return merged_vehicles_to_tuple_models
@@ -256,6 +531,127 @@ def transform_vehicle_model_to_computation_input(model):
     }
 
 
+def get_computation_input_distance(model_a, model_b):
+    """Measure how far apart the computation inputs of two models are.
+
+    The distance is the sum of the absolute differences of the minimum
+    category counts and of the maximum counts. It is zero only if both models
+    lead to exactly the same computation.
+    """
+    minimum_counts_a = transform_capacity_to_minimum_counts(*model_a)
+    minimum_counts_b = transform_capacity_to_minimum_counts(*model_b)
+    return sum(
+        abs(minimum_counts_a[k] - minimum_counts_b[k])
+        for k in minimum_counts_a
+    ) + abs(sum(model_a) - sum(model_b))
+
+
+def find_nearest_cached_model(model, cached_tuple_models):
+    """Return the nearest cached model and its distance or None."""
+    return min(
+        (
+            (get_computation_input_distance(model, cached_model), cached_model)
+            for cached_model in sorted(cached_tuple_models)
+        ),
+        default=None,
+    )
+
+
+def warm_start(logger, new_tuple_models, cached_tuple_models_to_profiles):
+    """Reuse the cached profiles of models with the same computation input.
+
+    The profile computation does not accept a starting point or a prior so a
+    cached profile can only be reused as such when the nearest cached model
+    leads to exactly the same computation. The nearest cached model of every
+    other new model is logged to help decide whether a prior would pay off.
+
+    Return the reused profiles and the models that still need computing.
+    """
+    reused_string_models_to_profiles = {}
+    tuple_models_to_compute = set()
+    for model in sorted(new_tuple_models):
+        nearest = find_nearest_cached_model(
+            model, cached_tuple_models_to_profiles.keys()
+        )
+        if nearest is None:
+            tuple_models_to_compute.add(model)
+            continue
+        distance, nearest_model = nearest
+        logger.debug(
+            "Found the nearest cached vehicle model",
+            extra={
+                "json_fields": {
+                    "stringModel": combine_model_tuple_to_string(model),
+                    "nearestStringModel": combine_model_tuple_to_string(
+                        nearest_model
+                    ),
+                    "distance": distance,
+                }
+            },
+        )
+        if distance == 0:
+            reused_string_models_to_profiles[
+                combine_model_tuple_to_string(model)
+            ] = cached_tuple_models_to_profiles[nearest_model]
+        else:
+            tuple_models_to_compute.add(model)
+    logger.info(
+        "Warm-started the new vehicle models from the cached ones",
+        extra={
+            "json_fields": {
+                "reusedStringModels": sorted(reused_string_models_to_profiles),
+                "numberOfModelsSaved": len(reused_string_models_to_profiles),
+                "numberOfModelsToCompute": len(tuple_models_to_compute),
+            }
+        },
+    )
+    return reused_string_models_to_profiles, tuple_models_to_compute
+
+
+def resume_from_checkpoints(logger, directory, new_tuple_models):
+    """Reuse the profiles finished by an interrupted run.
+
+    Return the resumed profiles and the models that still need computing.
+    """
+    checkpointed_string_models_to_profiles = checkpoints.read_profiles(
+        logger, directory
+    )
+    resumed_string_models_to_profiles = {}
+    tuple_models_to_compute = set()
+    for model in new_tuple_models:
+        string_model = combine_model_tuple_to_string(model)
+        if string_model in checkpointed_string_models_to_profiles:
+            resumed_string_models_to_profiles[
+                string_model
+            ] = checkpointed_string_models_to_profiles[string_model]
+        else:
+            tuple_models_to_compute.add(model)
+    if len(resumed_string_models_to_profiles) > 0:
+        logger.info(
+            "Resume from the profiles finished by an interrupted run",
+            extra={
+                "json_fields": {
+                    "resumedStringModels": sorted(
+                        resumed_string_models_to_profiles
+                    ),
+                    "numberOfModelsToCompute": len(tuple_models_to_compute),
+                }
+            },
+        )
+    return resumed_string_models_to_profiles, tuple_models_to_compute
+
+
+def prioritize_tuple_models(latest_vehicles_to_tuple_models, tuple_models):
+    """Order the models so that the models used by most vehicles come first."""
+    return sorted(
+        tuple_models,
+        key=lambda model: (
+            -latest_vehicles_to_tuple_models.count_vehicles(model),
+            model,
+        ),
+    )
+
+
 def get_computation_configuration(tmp_dir, models):
     return {
         "configurationVersion": "1-0-0",
@@ -302,7 +698,47 @@ def get_string_models_to_profiles(logger, directory, tuple_models):
     return result
 
 
-def compute_new_profiles(logger, new_tuple_models):
+def import_computation():
+    """Import the profile computation library.
+
+    Most runs find no new vehicle models so the library is imported only when
+    something needs to be computed.
+    """
+    import apc_anonymizer.configuration
+    from apc_anonymizer.mechanisms.simple import hyperparameter_optimization
+
+    return apc_anonymizer.configuration, hyperparameter_optimization
+
+
+def run_computation(directory, tuple_models):
+    """Compute the profiles of the given models into the given directory.
+
+    This function is run in the worker processes of the parallel computation
+    so it must not depend on anything that cannot be pickled, e.g. the logger.
+
+    Return the duration of the computation in seconds.
+    """
+    (
+        anonymizer_configuration,
+        hyperparameter_optimization,
+    ) = import_computation()
+    computation_configuration = (
+        anonymizer_configuration.reinforce_configuration(
+            get_computation_configuration(directory, tuple_models)
+        )
+    )
+    start = time.perf_counter()
+    hyperparameter_optimization.run_inference_for_all_vehicle_models(
+        computation_configuration
+    )
+    return time.perf_counter() - start
+
+
+def compute_new_profiles_serially(logger, new_tuple_models):
+    (
+        anonymizer_configuration,
+        hyperparameter_optimization,
+    ) = import_computation()
     new_string_models_to_profiles = {}
     with tempfile.TemporaryDirectory() as tmp_dir:
         logger.debug(
@@ -326,7 +762,7 @@ def compute_new_profiles(logger, new_tuple_models):
             },
         )
         computation_configuration = (
-            apc_anonymizer.configuration.reinforce_configuration(
+            anonymizer_configuration.reinforce_configuration(
                 computation_configuration
             )
         )
@@ -344,190 +780,908 @@ def compute_new_profiles(logger, new_tuple_models):
     return new_string_models_to_profiles
 
 
+def compute_new_profiles_in_parallel(
+    logger,
+    new_tuple_models,
+    computation_processes,
+    batch_size=None,
+    on_models_finished=None,
+    on_profiles_finished=None,
+    deadline=None,
+    on_model_timed=None,
+):
+    """Compute each new model in its own task in a process pool.
+
+    Every task writes into its own output directory so that the results of
+    the workers cannot get mixed up. If on_models_finished is given, it is
+    called after every batch_size finished models except after the last one.
+    If on_profiles_finished is given, it is called with the profile of each
+    model as soon as the model has finished. If on_model_timed is given, it is
+    called with each model and the duration of its computation in seconds.
+
+    The models are started in the given order and only as workers become
+    free. If deadline, a time.monotonic() value, is given, no new models are
+    started after it.
+    """
+    new_string_models_to_profiles = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_directories = {
+            model: pathlib.Path(tmp_dir) / combine_model_tuple_to_string(model)
+            for model in new_tuple_models
+        }
+        for directory in model_directories.values():
+            directory.mkdir()
+        logger.info(
+            "Create anonymization profiles for the new vehicle models in"
+            " parallel. This is going to take a while.",
+            extra={
+                "json_fields": {
+                    "tmpDir": tmp_dir,
+                    "computationProcesses": computation_processes,
+                }
+            },
+        )
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=computation_processes
+        ) as executor:
+            models_to_start = iter(model_directories.items())
+            futures = {}
+
+            def start_next_model():
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                model, directory = next(models_to_start, (None, None))
+                if model is not None:
+                    future = executor.submit(
+                        run_computation, str(directory), [model]
+                    )
+                    futures[future] = model
+
+            for _ in range(computation_processes):
+                start_next_model()
+            number_of_finished_models = 0
+            while len(futures) > 0:
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                future = done.pop()
+                model = futures.pop(future)
+                duration_in_seconds = future.result()
+                if on_model_timed is not None:
+                    on_model_timed(model, duration_in_seconds)
+                number_of_finished_models += 1
+                finished_string_models_to_profiles = (
+                    get_string_models_to_profiles(
+                        logger, model_directories[model], [model]
+                    )
+                )
+                if on_profiles_finished is not None:
+                    on_profiles_finished(finished_string_models_to_profiles)
+                new_string_models_to_profiles |= (
+                    finished_string_models_to_profiles
+                )
+                logger.info(
+                    "Computing the anonymization profile of a vehicle model"
+                    " has finished",
+                    extra={
+                        "json_fields": {
+                            "stringModel": combine_model_tuple_to_string(
+                                model
+                            ),
+                            "numberOfFinishedModels": (
+                                number_of_finished_models
+                            ),
+                            "numberOfNewModels": len(new_tuple_models),
+                        }
+                    },
+                )
+                if (
+                    on_models_finished is not None
+                    and number_of_finished_models < len(new_tuple_models)
+                    and number_of_finished_models % batch_size == 0
+                ):
+                    on_models_finished(dict(new_string_models_to_profiles))
+                start_next_model()
+        logger.info("Computing new anonymization profiles has finished")
+    return new_string_models_to_profiles
+
+
+def split_into_batches(tuple_models, batch_size):
+    ordered_tuple_models = list(tuple_models)
+    return [
+        ordered_tuple_models[i : i + batch_size]
+        for i in range(0, len(ordered_tuple_models), batch_size)
+    ]
+
+
+def compute_new_profiles_in_batches(
+    logger,
+    new_tuple_models,
+    batch_size,
+    on_models_finished=None,
+    on_profiles_finished=None,
+    deadline=None,
+    on_model_timed=None,
+):
+    new_string_models_to_profiles = {}
+    batches = split_into_batches(new_tuple_models, batch_size)
+    for index, batch in enumerate(batches):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        start = time.perf_counter()
+        finished_string_models_to_profiles = compute_new_profiles_serially(
+            logger, batch
+        )
+        if on_model_timed is not None and len(batch) == 1:
+            on_model_timed(batch[0], time.perf_counter() - start)
+        if on_profiles_finished is not None:
+            on_profiles_finished(finished_string_models_to_profiles)
+        new_string_models_to_profiles |= finished_string_models_to_profiles
+        if on_models_finished is not None and index < len(batches) - 1:
+            on_models_finished(dict(new_string_models_to_profiles))
+    return new_string_models_to_profiles
+
+
+def compute_new_profiles(
+    logger,
+    processing_config,
+    new_tuple_models,
+    on_models_finished=None,
+    on_model_timed=None,
+):
+    """Compute the profiles for the new vehicle models.
+
+    If on_models_finished is given and incremental publishing is configured,
+    it is called with all the profiles finished so far after every batch of
+    models except the last one.
+
+    If on_model_timed is given, it is called with each vehicle model computed
+    on its own and the duration of its computation. If several models are
+    computed in one call, it is called with each of them and their mean
+    duration.
+
+    If a checkpoint directory is configured, the finished profiles are
+    recorded into it as soon as they are available.
+
+    If a time budget is configured, the models are started in the given order
+    and no new models are started once the budget has run out so the result
+    may lack some of the models. Otherwise the models are started in the
+    order of their predicted durations, the longest first, to keep all the
+    workers busy until the end. The durations of single models are recorded
+    for the predictions if a path for them is configured.
+
+    Without parallelism, the models are computed in batches of the
+    incremental publishing batch size or one at a time if any of the above
+    is configured. Otherwise all the models are computed in one call.
+    """
+    deadline = None
+    time_budget = processing_config["computation_time_budget_in_seconds"]
+    if time_budget is not None:
+        deadline = time.monotonic() + time_budget
+    batch_size = processing_config["incremental_publishing_batch_size"]
+    if batch_size is None:
+        on_models_finished = None
+    on_profiles_finished = None
+    checkpoint_directory_path = processing_config["checkpoint_directory_path"]
+    if checkpoint_directory_path is not None:
+        on_profiles_finished = functools.partial(
+            checkpoints.write_profiles, logger, checkpoint_directory_path
+        )
+    runtime_records_path = processing_config["runtime_records_path"]
+    runtime_records = []
+    if runtime_records_path is not None:
+        runtime_records = runtime_estimator.read_records(
+            logger, runtime_records_path
+        )
+    fitted = runtime_estimator.fit(runtime_records)
+    if deadline is None:
+        new_tuple_models = runtime_estimator.schedule_longest_first(
+            fitted, new_tuple_models
+        )
+    new_runtime_records = []
+
+    def record_duration(model, duration_in_seconds):
+        logger.info(
+            "Compare the predicted and the actual computation duration",
+            extra={
+                "json_fields": {
+                    "stringModel": combine_model_tuple_to_string(model),
+                    "maximumCount": sum(model),
+                    "predictedDurationInSeconds": runtime_estimator.predict(
+                        fitted, model
+                    ),
+                    "durationInSeconds": duration_in_seconds,
+                }
+            },
+        )
+        new_runtime_records.append(
+            runtime_estimator.create_record(model, duration_in_seconds)
+        )
+        if on_model_timed is not None:
+            on_model_timed(model, duration_in_seconds)
+
+    computation_processes = min(
+        processing_config["computation_processes"], len(new_tuple_models)
+    )
+    if computation_processes > 1:
+        new_string_models_to_profiles = compute_new_profiles_in_parallel(
+            logger,
+            new_tuple_models,
+            computation_processes,
+            batch_size,
+            on_models_finished,
+            on_profiles_finished,
+            deadline,
+            record_duration,
+        )
+    elif (
+        on_models_finished is not None
+        or on_profiles_finished is not None
+        or deadline is not None
+    ):
+        new_string_models_to_profiles = compute_new_profiles_in_batches(
+            logger,
+            new_tuple_models,
+            batch_size or 1,
+            on_models_finished,
+            on_profiles_finished,
+            deadline,
+            record_duration,
+        )
+    else:
+        start = time.perf_counter()
+        new_string_models_to_profiles = compute_new_profiles_serially(
+            logger, new_tuple_models
+        )
+        duration_in_seconds = time.perf_counter() - start
+        if len(new_tuple_models) == 1:
+            record_duration(new_tuple_models[0], duration_in_seconds)
+        elif on_model_timed is not None:
+            # The models share one call so only their mean duration is known.
+            for model in new_tuple_models:
+                on_model_timed(
+                    model, duration_in_seconds / len(new_tuple_models)
+                )
+    if runtime_records_path is not None and len(new_runtime_records) > 0:
+        runtime_estimator.write_records(
+            runtime_records_path, runtime_records + new_runtime_records
+        )
+    return new_string_models_to_profiles
+
+
 def get_needed_string_models_to_profiles(
     logger,
+    latest_vehicles_to_tuple_models,
     new_string_models_to_profiles,
     cached_string_models_to_profiles,
-    needed_tuple_models,
 ):
     available_string_models_to_profiles = (
         new_string_models_to_profiles | cached_string_models_to_profiles
     )
-    needed_string_models = list(
-        map(combine_model_tuple_to_string, needed_tuple_models)
+    needed_string_models_to_profiles = (
+        latest_vehicles_to_tuple_models.get_needed_string_models_to_profiles(
+            available_string_models_to_profiles
+        )
     )
-    needed_string_models_to_profiles = {
-        k: v
-        for k, v in available_string_models_to_profiles.items()
-        if k in needed_string_models
-    }
-    logger.debug(
+    log_budget.log_lazily(
+        logger,
+        logging.DEBUG,
         "Figured out which vehicle profiles are needed according to the latest"
         " catalogue message",
-        extra={
-            "json_fields": {
-                "neededStringModelsToProfiles": (
-                    needed_string_models_to_profiles
-                )
-            }
+        lambda: {
+            "neededStringModels": sorted(needed_string_models_to_profiles),
+            "neededStringModelsToProfiles": log_budget.summarize_payload(
+                needed_string_models_to_profiles
+            ),
         },
     )
     return needed_string_models_to_profiles
 
 
-def form_producer_message_data(vehicles_to_models, string_models_to_profiles):
+def form_producer_message_data(
+    vehicles_to_models, string_models_to_profiles, encoding="json"
+):
     data = {
-        "schemaVersion": "1-0-0",
+        "schemaVersion": profile_encoding.get_schema_version(encoding),
         "vehicleModels": vehicles_to_models,
         "modelProfiles": string_models_to_profiles,
     }
     validator = validators.get_profile_collection_validator()
     validator.validate(data)
-    return json.dumps(data).encode("utf-8")
+    return profile_encoding.encode_profile_collection(data, encoding)
+
+
+def get_min_event_timestamp(logger, latest_messages):
+    event_timestamps = {
+        feed_publisher_id: message.event_timestamp()
+        for feed_publisher_id, message in latest_messages.items()
+    }
+    for feed_publisher_id, event_timestamp in event_timestamps.items():
+        if event_timestamp is None:
+            message = latest_messages[feed_publisher_id]
+            logger.critical(
+                "Event timestamp must exist as we have computed new models"
+                " and that requires that a message has been received."
+                " Either we have a logic error or the message is missing"
+                " its event timestamp in the source topic.",
+                extra={
+                    "json_fields": {
+                        "messageDataString": log_budget.summarize_payload(
+                            message.data()
+                        ),
+                        "feedPublisherId": feed_publisher_id,
+                        "topic": message.topic_name(),
+                        "properties": message.properties(),
+                    }
+                },
+            )
+    nonempty_event_timestamps = {
+        k: v for k, v in event_timestamps.items() if v is not None
+    }
+    min_event_timestamp = time.time_ns() // 1_000_000
+    if len(nonempty_event_timestamps) > 0:
+        min_event_timestamp = min(nonempty_event_timestamps.values())
+    return min_event_timestamp
+
+
+def form_message_data_from_profiles(
+    logger,
+    latest_vehicles_to_tuple_models,
+    new_string_models_to_profiles,
+    cached_string_models_to_profiles,
+    is_partial=False,
+    encoding="json",
+    max_message_bytes=None,
+):
+    """Form the message data from the profiles available so far.
+
+    A partial message only lists the vehicles whose profile is already
+    available so that no consumer is pointed at a profile that does not exist
+    yet.
+
+    Return a list with the data of each part of the message. There is more
+    than one part only if the message does not fit in max_message_bytes.
+    """
+    needed_string_models_to_profiles = get_needed_string_models_to_profiles(
+        logger,
+        latest_vehicles_to_tuple_models,
+        new_string_models_to_profiles,
+        cached_string_models_to_profiles,
+    )
+    latest_vehicles_to_string_models = (
+        latest_vehicles_to_tuple_models.get_vehicles_to_string_models()
+    )
+    if is_partial:
+        latest_vehicles_to_string_models = {
+            k: v
+            for k, v in latest_vehicles_to_string_models.items()
+            if v in needed_string_models_to_profiles
+        }
+    logger.debug("Form message data to send")
+    producer_message_parts = profile_chunking.split_collection(
+        dict(sorted(latest_vehicles_to_string_models.items())),
+        dict(sorted(needed_string_models_to_profiles.items())),
+        functools.partial(form_producer_message_data, encoding=encoding),
+        max_message_bytes,
+    )
+    if len(producer_message_parts) > 1:
+        logger.info(
+            "Split the message into parts to fit the byte budget",
+            extra={
+                "json_fields": {
+                    "maxMessageBytes": max_message_bytes,
+                    "partBytes": list(map(len, producer_message_parts)),
+                }
+            },
+        )
+    return producer_message_parts
+
+
+def publish_partial_message(
+    logger,
+    publish,
+    latest_vehicles_to_tuple_models,
+    cached_string_models_to_profiles,
+    min_event_timestamp,
+    encoding,
+    max_message_bytes,
+    new_string_models_to_profiles,
+):
+    logger.info(
+        "Publish the anonymization profiles finished so far",
+        extra={
+            "json_fields": {
+                "finishedStringModels": sorted(new_string_models_to_profiles)
+            }
+        },
+    )
+    producer_message_parts = form_message_data_from_profiles(
+        logger,
+        latest_vehicles_to_tuple_models,
+        new_string_models_to_profiles,
+        cached_string_models_to_profiles,
+        is_partial=True,
+        encoding=encoding,
+        max_message_bytes=max_message_bytes,
+    )
+    publish(producer_message_parts, min_event_timestamp)
+
+
+def observe_model_computation(_model, duration_in_seconds):
+    metrics.observe("model_computation_seconds", duration_in_seconds)
 
 
 def generate_message_to_send(
-    logger, cached_string_models_to_profiles, latest_messages
+    logger,
+    processing_config,
+    cached_string_models_to_profiles,
+    latest_messages,
+    vehicle_apc_mappings=None,
+    on_new_profiles=None,
+    publish=None,
+    compute=compute_new_profiles,
 ):
-    producer_message_data = None
+    """Generate the message to send if there are new vehicle models.
+
+    Return the data of each part of the message, the event timestamp to send
+    it with and the new models that were left without a profile, e.g. because
+    the time budget ran out. If any models were left, the message only lists
+    the vehicles that have a profile.
+
+    If publish is given, a partial message is published with it whenever a
+    batch of new models has been computed before the rest have finished. The
+    complete message is returned as usual.
+
+    The new profiles are computed with compute which has the signature of
+    compute_new_profiles, e.g. to compute them in the compute process.
+    """
+    producer_message_parts = None
     min_event_timestamp = None
-    logger.debug("Reformat the cached vehicle models from strings to tuples")
-    cached_tuple_models_to_profiles = {
-        split_model_string_to_tuple(k): v
-        for k, v in cached_string_models_to_profiles.items()
-    }
+    remaining_tuple_models = set()
     logger.debug(
         "Map all vehicles from the latest catalogue messages to their vehicle"
         " models in tuple format. Keep it in one dict."
     )
-    latest_vehicles_to_tuple_models = get_latest_vehicles_to_tuple_models(
-        logger, latest_messages
-    )
-    needed_tuple_models = set(latest_vehicles_to_tuple_models.values())
-    cached_tuple_models = set(cached_tuple_models_to_profiles.keys())
-    logger.debug(
+    with instrumentation.time_stage(
+        logger, "mapVehiclesToModels"
+    ) as measurements:
+        measurements["numberOfCatalogueMessages"] = len(latest_messages)
+        measurements["catalogueBytes"] = instrumentation.get_total_bytes(
+            latest_messages.values()
+        )
+        if processing_config["is_single_pass_catalogue_ingestion"]:
+            latest_vehicles_to_tuple_models = (
+                get_latest_vehicles_to_tuple_models_in_single_pass(
+                    logger, latest_messages
+                )
+            )
+        else:
+            latest_vehicles_to_tuple_models = (
+                get_latest_vehicles_to_tuple_models(
+                    logger, latest_messages, vehicle_apc_mappings
+                )
+            )
+        measurements["numberOfVehicles"] = len(latest_vehicles_to_tuple_models)
+    logger.debug("Reformat the cached vehicle models from strings to tuples")
+    cached_tuple_models_to_profiles = {
+        latest_vehicles_to_tuple_models.intern_string_model(k): v
+        for k, v in cached_string_models_to_profiles.items()
+    }
+    needed_tuple_models = latest_vehicles_to_tuple_models.needed_tuple_models
+    log_budget.log_lazily(
+        logger,
+        logging.DEBUG,
         "See if there are any new vehicle models",
-        extra={
-            "json_fields": {
-                "neededTupleModels": list(
-                    map(combine_model_tuple_to_string, needed_tuple_models)
-                ),
-                "cachedTupleModels": list(
-                    map(combine_model_tuple_to_string, cached_tuple_models)
-                ),
-            }
+        lambda: {
+            "neededTupleModels": list(
+                map(
+                    latest_vehicles_to_tuple_models.to_string_model,
+                    needed_tuple_models,
+                )
+            ),
+            "cachedTupleModels": list(cached_string_models_to_profiles),
+            "unusedCachedStringModels": (
+                latest_vehicles_to_tuple_models.get_unused_string_models(
+                    cached_string_models_to_profiles
+                )
+            ),
         },
     )
-    new_tuple_models = needed_tuple_models.difference(cached_tuple_models)
+    new_tuple_models = latest_vehicles_to_tuple_models.get_new_tuple_models(
+        cached_tuple_models_to_profiles
+    )
     if len(new_tuple_models) == 0:
         logger.info("No new vehicle models were found")
+        metrics.increment("cache_hits_total", len(needed_tuple_models))
     else:
         logger.info(
             "New vehicle models were found",
             extra={
                 "json_fields": {
                     "newVehicleModels": list(
-                        map(combine_model_tuple_to_string, new_tuple_models)
+                        map(
+                            latest_vehicles_to_tuple_models.to_string_model,
+                            new_tuple_models,
+                        )
                     )
                 }
             },
         )
-        logger.debug("Compute new anonymization profiles")
-        new_string_models_to_profiles = compute_new_profiles(
-            logger, new_tuple_models
+        logger.debug("Extract event timestamp to send")
+        min_event_timestamp = get_min_event_timestamp(logger, latest_messages)
+        reused_string_models_to_profiles = {}
+        tuple_models_to_compute = new_tuple_models
+        if processing_config["checkpoint_directory_path"] is not None:
+            (
+                reused_string_models_to_profiles,
+                tuple_models_to_compute,
+            ) = resume_from_checkpoints(
+                logger,
+                processing_config["checkpoint_directory_path"],
+                tuple_models_to_compute,
+            )
+        if processing_config["is_warm_start"]:
+            (
+                warm_started_string_models_to_profiles,
+                tuple_models_to_compute,
+            ) = warm_start(
+                logger,
+                tuple_models_to_compute,
+                cached_tuple_models_to_profiles,
+            )
+            reused_string_models_to_profiles |= (
+                warm_started_string_models_to_profiles
+            )
+        on_models_finished = None
+        if publish is not None:
+            on_models_finished = functools.partial(
+                publish_partial_message,
+                logger,
+                publish,
+                latest_vehicles_to_tuple_models,
+                cached_string_models_to_profiles
+                | reused_string_models_to_profiles,
+                min_event_timestamp,
+                processing_config["profile_collection_encoding"],
+                processing_config["profile_collection_max_message_bytes"],
+            )
+        new_string_models_to_profiles = dict(reused_string_models_to_profiles)
+        metrics.increment(
+            "cache_hits_total",
+            len(needed_tuple_models) - len(tuple_models_to_compute),
         )
+        metrics.increment("cache_misses_total", len(tuple_models_to_compute))
+        if len(tuple_models_to_compute) > 0:
+            logger.debug("Compute new anonymization profiles")
+            with instrumentation.time_stage(
+                logger, "computeNewProfiles"
+            ) as measurements:
+                measurements["numberOfModels"] = len(tuple_models_to_compute)
+                computed_string_models_to_profiles = compute(
+                    logger,
+                    processing_config,
+                    prioritize_tuple_models(
+                        latest_vehicles_to_tuple_models,
+                        tuple_models_to_compute,
+                    ),
+                    on_models_finished,
+                    observe_model_computation,
+                )
+                metrics.increment(
+                    "models_computed_total",
+                    len(computed_string_models_to_profiles),
+                )
+                new_string_models_to_profiles |= (
+                    computed_string_models_to_profiles
+                )
+        remaining_tuple_models = {
+            model
+            for model in tuple_models_to_compute
+            if latest_vehicles_to_tuple_models.to_string_model(model)
+            not in new_string_models_to_profiles
+        }
+        if len(remaining_tuple_models) > 0:
+            logger.warning(
+                "Not all new vehicle models could be computed in this run."
+                " Publish the profiles available and carry the remaining"
+                " models over to the next run.",
+                extra={
+                    "json_fields": {
+                        "remainingStringModels": sorted(
+                            map(
+                                combine_model_tuple_to_string,
+                                remaining_tuple_models,
+                            )
+                        ),
+                        "timeBudgetInSeconds": processing_config[
+                            "computation_time_budget_in_seconds"
+                        ],
+                    }
+                },
+            )
+        if on_new_profiles is not None:
+            on_new_profiles(new_string_models_to_profiles)
         logger.debug("Read the new anonymization profiles")
-        needed_string_models_to_profiles = (
-            get_needed_string_models_to_profiles(
+        with instrumentation.time_stage(logger, "formMessage") as measurements:
+            producer_message_parts = form_message_data_from_profiles(
                 logger,
+                latest_vehicles_to_tuple_models,
                 new_string_models_to_profiles,
                 cached_string_models_to_profiles,
-                needed_tuple_models,
+                is_partial=len(remaining_tuple_models) > 0,
+                encoding=processing_config["profile_collection_encoding"],
+                max_message_bytes=processing_config[
+                    "profile_collection_max_message_bytes"
+                ],
             )
+            measurements["numberOfParts"] = len(producer_message_parts)
+            measurements["messageBytes"] = sum(
+                map(len, producer_message_parts)
+            )
+    return producer_message_parts, min_event_timestamp, remaining_tuple_models
+
+
+def warm_up_cache(logger, processing_config, cache_reader):
+    cached_string_models_to_profiles = {}
+    latest_cache_messages = read_latest_collection(
+        logger, cache_reader, processing_config["is_latest_only_read"]
+    )
+    if latest_cache_messages is None:
+        logger.info(
+            "While warming up the cache, we found no old profiles."
+            " Hopefully this is the first time this service runs."
+            " Otherwise check the retention on the Pulsar topic or the"
+            " state of the vehicle catalogue upstream.",
+            extra={"json_fields": {"pulsarTopic": cache_reader.topic()}},
         )
-        latest_vehicles_to_string_models = {
-            k: combine_model_tuple_to_string(v)
-            for k, v in latest_vehicles_to_tuple_models.items()
-        }
-        logger.debug("Form message data to send")
-        producer_message_data = form_producer_message_data(
-            dict(sorted(latest_vehicles_to_string_models.items())),
-            dict(sorted(needed_string_models_to_profiles.items())),
+    else:
+        for latest_cache_message in latest_cache_messages:
+            cached_string_models_to_profiles |= build_cache(
+                logger, latest_cache_message
+            )
+    return cached_string_models_to_profiles
+
+
+def read_and_validate_catalogue_message(
+    logger, processing_config, validator, reader, previous_digest
+):
+    """Read the latest catalogue message and validate it right away.
+
+    If previous_digest is given and the message matches it, skip validating
+    the message as the run is likely to end without needing it.
+    """
+    result = {
+        "message": read_latest_message(
+            logger, reader, processing_config["is_latest_only_read"]
+        ),
+        "digest": None,
+    }
+    if processing_config["catalogue_digests_path"] is not None:
+        result["digest"] = catalogue_digests.get_message_digest(
+            result["message"]
         )
-        logger.debug("Extract event timestamp to send")
-        event_timestamps = {
-            feed_publisher_id: message.event_timestamp()
-            for feed_publisher_id, message in latest_messages.items()
+    if (
+        result["message"] is not None
+        and not processing_config["is_single_pass_catalogue_ingestion"]
+        and (result["digest"] is None or result["digest"] != previous_digest)
+    ):
+        result["vehicle_apc_mapping"] = validate_and_return_message_data(
+            logger, validator, result["message"]
+        )
+    return result
+
+
+def ingest_serially(logger, processing_config, resources, _previous_digests):
+    cached_string_models_to_profiles = {}
+    if not processing_config["is_fresh_start"]:
+        logger.info("Warm up cache")
+        cached_string_models_to_profiles = warm_up_cache(
+            logger, processing_config, resources["pulsar_cache_reader"]
+        )
+    logger.info("Read latest message from each catalogue topic")
+    readers = resources["pulsar_catalogue_readers"]
+    latest_messages = {
+        feed_publisher_id: read_latest_message(
+            logger, reader, processing_config["is_latest_only_read"]
+        )
+        for feed_publisher_id, reader in readers.items()
+    }
+    latest_digests = None
+    if processing_config["catalogue_digests_path"] is not None:
+        latest_digests = catalogue_digests.get_message_digests(latest_messages)
+    return (
+        cached_string_models_to_profiles,
+        latest_messages,
+        None,
+        latest_digests,
+    )
+
+
+def ingest_concurrently(
+    logger, processing_config, resources, previous_digests
+):
+    """Read the cache topic and all catalogue topics in parallel.
+
+    Each catalogue message is decoded and validated in the thread that read it
+    as soon as it has arrived unless it matches its digest from the previous
+    run. The validated catalogues are returned alongside the messages so that
+    they do not need to be validated again.
+    """
+    readers = resources["pulsar_catalogue_readers"]
+    validator = validators.get_vehicle_apc_mapping_validator()
+    if previous_digests is None:
+        previous_digests = {}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(readers) + 1
+    ) as executor:
+        cache_future = None
+        if not processing_config["is_fresh_start"]:
+            logger.info("Warm up cache")
+            cache_future = executor.submit(
+                warm_up_cache,
+                logger,
+                processing_config,
+                resources["pulsar_cache_reader"],
+            )
+        logger.info("Read latest message from each catalogue topic")
+        catalogue_futures = {
+            feed_publisher_id: executor.submit(
+                read_and_validate_catalogue_message,
+                logger,
+                processing_config,
+                validator,
+                reader,
+                previous_digests.get(feed_publisher_id),
+            )
+            for feed_publisher_id, reader in readers.items()
         }
-        for feed_publisher_id, event_timestamp in event_timestamps.items():
-            if event_timestamp is None:
-                message = latest_messages[feed_publisher_id]
-                logger.critical(
-                    "Event timestamp must exist as we have computed new models"
-                    " and that requires that a message has been received."
-                    " Either we have a logic error or the message is missing"
-                    " its event timestamp in the source topic.",
-                    extra={
-                        "json_fields": {
-                            "messageDataString": message.data().decode(
-                                encoding="utf-8", errors="replace"
-                            ),
-                            "feedPublisherId": feed_publisher_id,
-                            "topic": message.topic_name(),
-                            "properties": message.properties(),
-                        }
-                    },
-                )
-        nonempty_event_timestamps = {
-            k: v for k, v in event_timestamps.items() if v is not None
+        cached_string_models_to_profiles = {}
+        if cache_future is not None:
+            cached_string_models_to_profiles = cache_future.result()
+        results = {
+            feed_publisher_id: future.result()
+            for feed_publisher_id, future in catalogue_futures.items()
+        }
+    latest_messages = {
+        feed_publisher_id: result["message"]
+        for feed_publisher_id, result in results.items()
+    }
+    vehicle_apc_mappings = {
+        feed_publisher_id: result["vehicle_apc_mapping"]
+        for feed_publisher_id, result in results.items()
+        if "vehicle_apc_mapping" in result
+    }
+    latest_digests = None
+    if processing_config["catalogue_digests_path"] is not None:
+        latest_digests = {
+            feed_publisher_id: result["digest"]
+            for feed_publisher_id, result in results.items()
         }
-        min_event_timestamp = time.time_ns() // 1_000_000
-        if len(nonempty_event_timestamps) > 0:
-            min_event_timestamp = min(nonempty_event_timestamps.values())
-    return producer_message_data, min_event_timestamp
+    return (
+        cached_string_models_to_profiles,
+        latest_messages,
+        vehicle_apc_mappings,
+        latest_digests,
+    )
+
+
+def layer_profile_store(
+    logger, profile_store_path, cached_string_models_to_profiles
+):
+    """Combine the profiles in the local profile store with the Pulsar cache.
+
+    The profiles only found in the Pulsar cache are written into the local
+    profile store so that the store stays complete even if the producer topic
+    loses its messages.
+    """
+    logger.info(
+        "Read the local profile store",
+        extra={"json_fields": {"profileStorePath": profile_store_path}},
+    )
+    stored_string_models_to_profiles = profile_store.read_profiles(
+        logger, profile_store_path
+    )
+    only_in_pulsar_cache = {
+        k: v
+        for k, v in cached_string_models_to_profiles.items()
+        if k not in stored_string_models_to_profiles
+    }
+    if len(only_in_pulsar_cache) > 0:
+        profile_store.write_profiles(
+            logger, profile_store_path, only_in_pulsar_cache
+        )
+    logger.info(
+        "Combined the local profile store with the Pulsar cache",
+        extra={
+            "json_fields": {
+                "numberOfStoredProfiles": len(
+                    stored_string_models_to_profiles
+                ),
+                "numberOfProfilesOnlyInPulsarCache": len(only_in_pulsar_cache),
+            }
+        },
+    )
+    return cached_string_models_to_profiles | stored_string_models_to_profiles
 
 
-def process_messages(
+def send_profiles(
     logger,
-    processing_config,
-    pulsar_config,
+    publishing_config,
     resources,
+    producer_message_parts,
+    event_timestamp,
 ):
-    cached_string_models_to_profiles = {}
+    logger.info("Send the profiles")
+    part_properties = profile_chunking.get_part_properties(
+        len(producer_message_parts)
+    )
+    publishing.publish(
+        logger,
+        resources["pulsar_producer"],
+        [
+            publishing.create_message(data, properties, event_timestamp)
+            for data, properties in zip(
+                producer_message_parts, part_properties, strict=True
+            )
+        ],
+        publishing_config,
+    )
+    metrics.increment(
+        "message_bytes_produced_total", sum(map(len, producer_message_parts))
+    )
+
+
+def get_on_new_profiles(logger, processing_config):
+    profile_store_path = processing_config["profile_store_path"]
+    if profile_store_path is None:
+        return None
+    return functools.partial(
+        profile_store.write_profiles, logger, profile_store_path
+    )
+
+
+def ingest(logger, processing_config, resources, previous_digests=None):
+    """Read the cache and the latest catalogue messages.
+
+    The profiles in the local profile store, if any, are layered on top of the
+    Pulsar cache. If catalogue digests are configured, the digests of the
+    latest catalogue messages are returned as well.
+    """
     if processing_config["is_fresh_start"]:
         logger.info(
             "Skip warming up cache and create all anonymization profiles from"
             " scratch"
         )
-    else:
-        logger.info("Warm up cache")
-        cache_reader = resources["pulsar_cache_reader"]
-        latest_cache_message = get_latest_message(cache_reader)
-        if latest_cache_message is None:
-            logger.info(
-                "While warming up the cache, we found no old profiles."
-                " Hopefully this is the first time this service runs."
-                " Otherwise check the retention on the Pulsar topic or the"
-                " state of the vehicle catalogue upstream.",
-                extra={"json_fields": {"pulsarTopic": cache_reader.topic()}},
-            )
-        else:
-            cached_string_models_to_profiles = build_cache(
-                logger, latest_cache_message
-            )
+    ingest_topics = ingest_serially
+    if processing_config["is_concurrent_ingestion"]:
+        ingest_topics = ingest_concurrently
+    (
+        cached_string_models_to_profiles,
+        latest_messages,
+        vehicle_apc_mappings,
+        latest_digests,
+    ) = ingest_topics(logger, processing_config, resources, previous_digests)
+    profile_store_path = processing_config["profile_store_path"]
+    if profile_store_path is not None:
+        cached_string_models_to_profiles = layer_profile_store(
+            logger, profile_store_path, cached_string_models_to_profiles
+        )
+    return (
+        cached_string_models_to_profiles,
+        latest_messages,
+        vehicle_apc_mappings,
+        latest_digests,
+    )
 
-    logger.info("Read latest message from each catalogue topic")
-    readers = resources["pulsar_catalogue_readers"]
-    latest_messages = {
-        feed_publisher_id: get_latest_message(reader)
-        for feed_publisher_id, reader in readers.items()
-    }
-    # FIXME:
-    # Due to a known issue we close Pulsar before we use multiprocessing. Once
-    # the issue is satisfactorily resolved, do not close and recreate
-    # Pulsar resources here and leave it to the responsibility of main().
-    # https://github.com/apache/pulsar-client-python/issues/127
-    graceful_exit.close_pulsar(resources)
+
+def read_previous_catalogue_digests(logger, processing_config):
+    path = processing_config["catalogue_digests_path"]
+    if path is None or processing_config["is_fresh_start"]:
+        return None
+    return catalogue_digests.read_digests(logger, path)
+
+
+def log_missing_catalogue_messages(logger, latest_messages, topics):
     for feed_publisher_id, latest_message in latest_messages.items():
         if latest_message is None:
             logger.critical(
@@ -536,10 +1690,33 @@ def process_messages(
                 extra={
                     "json_fields": {
                         "feedPublisherId": feed_publisher_id,
-                        "topic": readers[feed_publisher_id]["topic"],
+                        "topic": topics[feed_publisher_id],
                     }
                 },
             )
+
+
+def generate_and_send(
+    logger,
+    processing_config,
+    resources,
+    cached_string_models_to_profiles,
+    latest_messages,
+    vehicle_apc_mappings=None,
+    on_new_profiles=None,
+):
+    """Generate and send a message if there is anything new to send.
+
+    The profiles are computed with the compute_new_profiles function in
+    resources, if any. As the computation uses multiprocessing, it must not
+    run in the process holding the Pulsar client in production, see the
+    compute_process module.
+
+    Return the data of the sent message parts or None if nothing was sent and
+    the new models that were left without a profile.
+    """
+    producer_message_parts = None
+    remaining_tuple_models = set()
     latest_nonempty_messages = {
         k: v for k, v in latest_messages.items() if v is not None
     }
@@ -548,30 +1725,102 @@ def process_messages(
             "At least one message was found when reading all the catalogue"
             " topics. Try to form a message if there is anything new to send."
         )
-        producer_message_data, event_timestamp = generate_message_to_send(
+        publish = None
+        if processing_config["incremental_publishing_batch_size"] is not None:
+            publish = functools.partial(
+                send_profiles,
+                logger,
+                processing_config["publishing"],
+                resources,
+            )
+        (
+            producer_message_parts,
+            event_timestamp,
+            remaining_tuple_models,
+        ) = generate_message_to_send(
             logger,
+            processing_config,
             cached_string_models_to_profiles,
             latest_messages,
+            vehicle_apc_mappings,
+            on_new_profiles,
+            publish,
+            resources.get("compute_new_profiles", compute_new_profiles),
         )
-        if producer_message_data is not None and event_timestamp is not None:
-            # FIXME:
-            # Due to a known issue we close Pulsar before we use
-            # multiprocessing. Once the issue is satisfactorily resolved, do
-            # not close and recreate Pulsar resources here and leave it to the
-            # responsibility of main().
-            # https://github.com/apache/pulsar-client-python/issues/127
-            logger.info("Create Pulsar client")
-            pulsar_client = pulsar_wrapper.create_client(
-                logger, pulsar_config["client"], pulsar_config["oauth2"]
-            )
-            resources["pulsar_client"] = pulsar_client
-            logger.info("Create Pulsar producer")
-            pulsar_producer = pulsar_wrapper.create_producer(
-                pulsar_client, pulsar_config["producer"]
-            )
-            resources["pulsar_producer"] = pulsar_producer
+        if producer_message_parts is not None and event_timestamp is not None:
+            with instrumentation.time_stage(
+                logger, "sendProfiles"
+            ) as measurements:
+                measurements["numberOfParts"] = len(producer_message_parts)
+                measurements["messageBytes"] = sum(
+                    map(len, producer_message_parts)
+                )
+                send_profiles(
+                    logger,
+                    processing_config["publishing"],
+                    resources,
+                    producer_message_parts,
+                    event_timestamp,
+                )
+        checkpoint_directory_path = processing_config[
+            "checkpoint_directory_path"
+        ]
+        if checkpoint_directory_path is not None:
+            logger.debug("Clear the checkpoint directory")
+            checkpoints.clear(checkpoint_directory_path)
+    return producer_message_parts, remaining_tuple_models
 
-            logger.info("Send the profiles")
-            pulsar_producer.send(
-                producer_message_data, event_timestamp=event_timestamp
-            )
+
+def process_messages(logger, processing_config, resources):
+    previous_digests = read_previous_catalogue_digests(
+        logger, processing_config
+    )
+    with instrumentation.time_stage(logger, "ingest") as measurements:
+        (
+            cached_string_models_to_profiles,
+            latest_messages,
+            vehicle_apc_mappings,
+            latest_digests,
+        ) = ingest(logger, processing_config, resources, previous_digests)
+        measurements["numberOfCachedProfiles"] = len(
+            cached_string_models_to_profiles
+        )
+        measurements["numberOfCatalogueMessages"] = sum(
+            message is not None for message in latest_messages.values()
+        )
+        measurements["catalogueBytes"] = instrumentation.get_total_bytes(
+            latest_messages.values()
+        )
+    if previous_digests is not None and latest_digests == previous_digests:
+        logger.info(
+            "No catalogue message has changed since the previous successful"
+            " run. There is nothing to do."
+        )
+        return
+    topics = {
+        feed_publisher_id: reader.topic()
+        for feed_publisher_id, reader in resources[
+            "pulsar_catalogue_readers"
+        ].items()
+    }
+    log_missing_catalogue_messages(logger, latest_messages, topics)
+    with instrumentation.time_stage(logger, "generateAndSend"):
+        _, remaining_tuple_models = generate_and_send(
+            logger,
+            processing_config,
+            resources,
+            cached_string_models_to_profiles,
+            latest_messages,
+            vehicle_apc_mappings,
+            get_on_new_profiles(logger, processing_config),
+        )
+    if len(remaining_tuple_models) > 0:
+        logger.info(
+            "Do not record the digests of the catalogue messages so that the"
+            " next run computes the remaining vehicle models"
+        )
+    elif latest_digests is not None:
+        logger.info("Record the digests of the processed catalogue messages")
+        catalogue_digests.write_digests(
+            processing_config["catalogue_digests_path"], latest_digests
+        )
@@ -0,0 +1,135 @@
+"""Share metrics with the health check server in the Prometheus text format.
+
+The metrics are kept in shared memory so that the main process can update them
+and the health check server process can read them. Each value is updated under
+its own lock. The shared memory is allocated on first use rather than on
+import. A process started with spawn, e.g. the compute process, re-imports
+this module so it must be handed the registry of its parent with set_registry
+instead of creating a registry of its own.
+"""
+
+import multiprocessing
+
+PREFIX = "waltti_apc_vehicle_anonymization_profiler"
+
+# The stages timed with instrumentation.time_stage.
+STAGES = (
+    "ingest",
+    "mapVehiclesToModels",
+    "computeNewProfiles",
+    "formMessage",
+    "generateAndSend",
+    "sendProfiles",
+)
+
+COUNTERS = {
+    "models_computed_total": "Vehicle models whose profile was computed.",
+    "cache_hits_total": (
+        "Needed vehicle models whose profile was found without computing it."
+    ),
+    "cache_misses_total": "Needed vehicle models whose profile was computed.",
+    "message_bytes_read_total": "Bytes of the Pulsar messages read.",
+    "message_bytes_produced_total": "Bytes of the Pulsar messages produced.",
+}
+
+SUMMARIES = {
+    "model_computation_seconds": (
+        "The duration of computing the profile of a single vehicle model,"
+        " the mean duration if several models were computed in one call."
+    ),
+}
+
+STAGE_SUMMARY = "stage_duration_seconds"
+STAGE_SUMMARY_HELP = "The duration of a stage of a run."
+
+
+def create_registry():
+    # Values of the spawn context can be handed to spawned processes, too,
+    # whereas forked processes inherit them regardless.
+    context = multiprocessing.get_context("spawn")
+
+    def create_summary():
+        return {
+            "sum": context.Value("d", 0.0),
+            "count": context.Value("q", 0),
+        }
+
+    return {
+        "counters": {name: context.Value("d", 0.0) for name in COUNTERS},
+        "summaries": {name: create_summary() for name in SUMMARIES},
+        "stages": {stage: create_summary() for stage in STAGES},
+    }
+
+
+# Created by get_registry or handed over by set_registry.
+registry = None
+
+
+def get_registry():
+    global registry
+    if registry is None:
+        registry = create_registry()
+    return registry
+
+
+def set_registry(a_registry):
+    """Use the registry created in another process, e.g. the parent."""
+    global registry
+    registry = a_registry
+
+
+def add_to_value(value, amount):
+    with value.get_lock():
+        value.value += amount
+
+
+def increment(name, amount=1):
+    add_to_value(get_registry()["counters"][name], amount)
+
+
+def observe_summary(summary, amount):
+    add_to_value(summary["sum"], amount)
+    add_to_value(summary["count"], 1)
+
+
+def observe(name, amount):
+    observe_summary(get_registry()["summaries"][name], amount)
+
+
+def observe_stage(stage, duration_in_seconds):
+    observe_summary(get_registry()["stages"][stage], duration_in_seconds)
+
+
+def format_number(number):
+    return repr(float(number)) if isinstance(number, float) else str(number)
+
+
+def render_summary(lines, name, labels, summary):
+    lines.append(
+        f"{PREFIX}_{name}_sum{labels} {format_number(summary['sum'].value)}"
+    )
+    lines.append(
+        f"{PREFIX}_{name}_count{labels}"
+        f" {format_number(summary['count'].value)}"
+    )
+
+
+def render(a_registry):
+    """Render the metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} counter")
+        lines.append(
+            f"{PREFIX}_{name}"
+            f" {format_number(a_registry['counters'][name].value)}"
+        )
+    for name, help_text in SUMMARIES.items():
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} summary")
+        render_summary(lines, name, "", a_registry["summaries"][name])
+    lines.append(f"# HELP {PREFIX}_{STAGE_SUMMARY} {STAGE_SUMMARY_HELP}")
+    lines.append(f"# TYPE {PREFIX}_{STAGE_SUMMARY} summary")
+    for stage, summary in a_registry["stages"].items():
+        render_summary(lines, STAGE_SUMMARY, f'{{stage="{stage}"}}', summary)
+    return "\n".join(lines) + "\n"
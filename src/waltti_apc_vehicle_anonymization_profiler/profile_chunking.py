@@ -0,0 +1,189 @@
+"""Split profile collections into parts that fit in a Pulsar message.
+
+A collection that does not fit in one message is sent as a sequence of parts.
+Each part is a valid profile collection of its own holding a subset of the
+vehicle models and the vehicles that use them. The parts are tied together
+with message properties so that a reader can reassemble the whole collection
+and tell a complete set of parts from a set whose sending was interrupted.
+
+A collection that fits in one message is sent without these properties just
+like before.
+"""
+
+import time
+import uuid
+
+COLLECTION_ID = "collectionId"
+PART_INDEX = "partIndex"
+PART_COUNT = "partCount"
+COLLECTION_START_TIMESTAMP = "collectionStartTimestamp"
+
+# The publish time is set by the broker whereas the start timestamp is set by
+# us so allow for some clock skew when seeking to the start of a collection.
+SEEK_MARGIN_IN_MILLISECONDS = 60_000
+
+
+class ProfileCollectionTooLargeError(ValueError):
+    """A single vehicle model does not fit in the byte budget."""
+
+
+def get_vehicles_to_models_subset(vehicles_to_models, models, vehicles):
+    """Keep the vehicles of models and the given vehicles."""
+    return {
+        k: v
+        for k, v in vehicles_to_models.items()
+        if v in models or k in vehicles
+    }
+
+
+def split_collection(
+    vehicles_to_models, models_to_profiles, encode, max_message_bytes
+):
+    """Encode the collection into as many parts as needed.
+
+    The vehicle models are split in halves until each part encoded with encode
+    fits in max_message_bytes. The parts are kept in the sorted order of the
+    vehicle models. The vehicles whose model has no profile are split in
+    halves along with the models so that they are spread over the parts.
+
+    Raises ProfileCollectionTooLargeError if a single vehicle model does not
+    fit.
+    """
+    data = encode(vehicles_to_models, models_to_profiles)
+    if max_message_bytes is None or len(data) <= max_message_bytes:
+        return [data]
+    models = sorted(models_to_profiles)
+    if len(models) == 1:
+        msg = (
+            f"The profile of the vehicle model {models[0]} takes {len(data)}"
+            f" bytes which exceeds the budget of {max_message_bytes} bytes"
+        )
+        raise ProfileCollectionTooLargeError(msg)
+    vehicles_without_profile = [
+        k for k, v in vehicles_to_models.items() if v not in models_to_profiles
+    ]
+    parts = []
+    half = len(models) // 2
+    # Round up so that a single vehicle without a profile stays in the first
+    # part.
+    vehicle_half = (len(vehicles_without_profile) + 1) // 2
+    for subset, vehicle_subset in (
+        (models[:half], vehicles_without_profile[:vehicle_half]),
+        (models[half:], vehicles_without_profile[vehicle_half:]),
+    ):
+        parts.extend(
+            split_collection(
+                get_vehicles_to_models_subset(
+                    vehicles_to_models, set(subset), set(vehicle_subset)
+                ),
+                {model: models_to_profiles[model] for model in subset},
+                encode,
+                max_message_bytes,
+            )
+        )
+    return parts
+
+
+def get_part_properties(number_of_parts):
+    """Get the message properties for each part of a collection.
+
+    Return a list of None if the collection fits in one message.
+    """
+    if number_of_parts == 1:
+        return [None]
+    collection_id = uuid.uuid4().hex
+    collection_start_timestamp = str(time.time_ns() // 1_000_000)
+    return [
+        {
+            COLLECTION_ID: collection_id,
+            COLLECTION_START_TIMESTAMP: collection_start_timestamp,
+            PART_COUNT: str(number_of_parts),
+            PART_INDEX: str(index),
+        }
+        for index in range(number_of_parts)
+    ]
+
+
+def get_part_info(message):
+    """Get the part information of the message.
+
+    Return None if the message is not a part of a multi-message collection.
+
+    Raises ValueError if the part properties are malformed.
+    """
+    properties = message.properties()
+    if COLLECTION_ID not in properties:
+        return None
+    try:
+        info = {
+            COLLECTION_ID: properties[COLLECTION_ID],
+            COLLECTION_START_TIMESTAMP: int(
+                properties[COLLECTION_START_TIMESTAMP]
+            ),
+            PART_COUNT: int(properties[PART_COUNT]),
+            PART_INDEX: int(properties[PART_INDEX]),
+        }
+    except KeyError as err:
+        msg = f"A part property is missing: {properties}"
+        raise ValueError(msg) from err
+    if not 0 <= info[PART_INDEX] < info[PART_COUNT]:
+        msg = f"The part index is out of range: {properties}"
+        raise ValueError(msg)
+    return info
+
+
+def is_part(message):
+    return COLLECTION_ID in message.properties()
+
+
+def get_last_part_info(message):
+    """Get the part information of the last part of a collection.
+
+    Return None if the message is not the last part of a well-formed
+    multi-message collection.
+    """
+    try:
+        info = get_part_info(message)
+    except ValueError:
+        return None
+    if info is None or info[PART_INDEX] != info[PART_COUNT] - 1:
+        return None
+    return info
+
+
+def find_latest_complete_collection(logger, messages):
+    """Find the messages of the latest complete collection in messages.
+
+    The parts of a collection are sent one after another so only the parts of
+    the collection being read so far are kept in memory. A collection whose
+    parts are interrupted by another message is incomplete and ignored.
+
+    Return None if there is no complete collection.
+    """
+    latest = None
+    collection_id = None
+    parts = {}
+    for message in messages:
+        try:
+            info = get_part_info(message)
+        except ValueError:
+            logger.warning(
+                "Ignore a profile collection message with malformed part"
+                " properties",
+                extra={"json_fields": {"properties": message.properties()}},
+            )
+            collection_id = None
+            parts = {}
+            continue
+        if info is None:
+            latest = [message]
+            collection_id = None
+            parts = {}
+            continue
+        if info[COLLECTION_ID] != collection_id:
+            collection_id = info[COLLECTION_ID]
+            parts = {}
+        parts[info[PART_INDEX]] = message
+        if parts.keys() == set(range(info[PART_COUNT])):
+            latest = [parts[index] for index in range(info[PART_COUNT])]
+    return latest
@@ -0,0 +1,252 @@
+"""Encode and decode profile collection messages.
+
+Besides the JSON encoding of schema version 1-0-0, profile collections can be
+encoded in a compact binary layout of schema version 2-0-0 in which each CSV
+profile is stored as typed numeric columns.
+
+All integers in the binary layout are little-endian. The layout is:
+
+- the magic bytes b"WAPC" and the format version as uint8,
+- the JSON header as uint32 length and UTF-8 bytes, holding schemaVersion and
+  vehicleModels,
+- the number of profiles as uint32,
+- for each profile, the model as uint16 length and UTF-8 bytes and the kind of
+  the profile as uint8:
+  - KIND_TABLE: the number of columns as uint16, for each column its name as
+    uint16 length and UTF-8 bytes and its type code b"q" for int64 or b"d" for
+    float64, the number of rows as uint32 and then the values of each column
+    in turn,
+  - KIND_TEXT: the CSV text as uint32 length and UTF-8 bytes. This is used for
+    profiles that cannot be represented as numeric columns losslessly.
+"""
+
+import array
+import csv
+import io
+import json
+import struct
+import sys
+
+JSON_SCHEMA_VERSION = "1-0-0"
+BINARY_SCHEMA_VERSION = "2-0-0"
+
+MAGIC = b"WAPC"
+FORMAT_VERSION = 1
+KIND_TABLE = 0
+KIND_TEXT = 1
+TYPE_CODES = (b"q", b"d")
+
+
+class ProfileEncodingError(ValueError):
+    """The binary profile collection is malformed."""
+
+
+def parse_column(values):
+    try:
+        return "q", [int(value) for value in values]
+    except ValueError:
+        return "d", [float(value) for value in values]
+
+
+def render_value(type_code, value):
+    if type_code == "q":
+        return str(value)
+    return repr(value)
+
+
+def render_csv(names, columns):
+    lines = [",".join(names)]
+    lines.extend(
+        ",".join(
+            render_value(column.typecode, column[i]) for column in columns
+        )
+        for i in range(len(columns[0]) if columns else 0)
+    )
+    return "\n".join(lines) + "\n"
+
+
+def parse_csv_table(profile):
+    """Parse a CSV profile into column names and typed columns.
+
+    Return None if the profile cannot be rendered back into exactly the same
+    text from the typed columns.
+    """
+    try:
+        rows = list(csv.reader(io.StringIO(profile)))
+        if len(rows) == 0 or any(len(row) != len(rows[0]) for row in rows):
+            return None
+        names = rows[0]
+        columns = [
+            array.array(*parse_column([row[i] for row in rows[1:]]))
+            for i in range(len(names))
+        ]
+    except (ValueError, OverflowError, csv.Error):
+        # OverflowError: an integer does not fit in the signed 64 bits of "q".
+        return None
+    if render_csv(names, columns) != profile:
+        return None
+    return names, columns
+
+
+class Writer:
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def pack(self, fmt, *values):
+        self.buffer.write(struct.pack("<" + fmt, *values))
+
+    def string(self, fmt, string):
+        encoded = string.encode("utf-8")
+        self.pack(fmt, len(encoded))
+        self.buffer.write(encoded)
+
+    def values(self, column):
+        if sys.byteorder != "little":
+            column = array.array(column.typecode, column)
+            column.byteswap()
+        self.buffer.write(column.tobytes())
+
+
+class Reader:
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def take(self, size):
+        if self.offset + size > len(self.view):
+            msg = "Unexpected end of the binary profile collection"
+            raise ProfileEncodingError(msg)
+        chunk = self.view[self.offset : self.offset + size]
+        self.offset += size
+        return chunk
+
+    def unpack(self, fmt):
+        fmt = "<" + fmt
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+    def string(self, fmt):
+        (length,) = self.unpack(fmt)
+        return str(self.take(length), "utf-8")
+
+    def values(self, type_code, count):
+        column = array.array(type_code)
+        column.frombytes(self.take(count * column.itemsize))
+        if sys.byteorder != "little":
+            column.byteswap()
+        return column
+
+
+def encode_binary(data):
+    writer = Writer()
+    writer.buffer.write(MAGIC)
+    writer.pack("B", FORMAT_VERSION)
+    writer.string(
+        "I",
+        json.dumps(
+            {
+                "schemaVersion": data["schemaVersion"],
+                "vehicleModels": data["vehicleModels"],
+            }
+        ),
+    )
+    writer.pack("I", len(data["modelProfiles"]))
+    for model, profile in data["modelProfiles"].items():
+        writer.string("H", model)
+        table = parse_csv_table(profile)
+        if table is None:
+            writer.pack("B", KIND_TEXT)
+            writer.string("I", profile)
+        else:
+            names, columns = table
+            writer.pack("B", KIND_TABLE)
+            writer.pack("H", len(names))
+            for name, column in zip(names, columns, strict=True):
+                writer.string("H", name)
+                writer.buffer.write(column.typecode.encode("ascii"))
+            writer.pack("I", len(columns[0]) if columns else 0)
+            for column in columns:
+                writer.values(column)
+    return writer.buffer.getvalue()
+
+
+def decode_binary_tables(data):
+    """Decode a binary profile collection keeping the profiles typed.
+
+    Each profile is either a tuple of column names and typed columns or the
+    CSV text for profiles that were stored as text.
+    """
+    reader = Reader(data)
+    if bytes(reader.take(len(MAGIC))) != MAGIC:
+        msg = "The data is not a binary profile collection"
+        raise ProfileEncodingError(msg)
+    (format_version,) = reader.unpack("B")
+    if format_version != FORMAT_VERSION:
+        msg = f"Unknown format version {format_version}"
+        raise ProfileEncodingError(msg)
+    header = json.loads(reader.string("I"))
+    (number_of_profiles,) = reader.unpack("I")
+    model_profiles = {}
+    for _ in range(number_of_profiles):
+        model = reader.string("H")
+        (kind,) = reader.unpack("B")
+        if kind == KIND_TEXT:
+            model_profiles[model] = reader.string("I")
+        elif kind == KIND_TABLE:
+            (number_of_columns,) = reader.unpack("H")
+            names = []
+            type_codes = []
+            for _ in range(number_of_columns):
+                names.append(reader.string("H"))
+                type_code = bytes(reader.take(1))
+                if type_code not in TYPE_CODES:
+                    msg = f"Unknown column type {type_code!r}"
+                    raise ProfileEncodingError(msg)
+                type_codes.append(type_code.decode("ascii"))
+            (number_of_rows,) = reader.unpack("I")
+            columns = [
+                reader.values(type_code, number_of_rows)
+                for type_code in type_codes
+            ]
+            model_profiles[model] = (names, columns)
+        else:
+            msg = f"Unknown profile kind {kind}"
+            raise ProfileEncodingError(msg)
+    if reader.offset != len(reader.view):
+        msg = "Extra data after the binary profile collection"
+        raise ProfileEncodingError(msg)
+    return header | {"modelProfiles": model_profiles}
+
+
+def decode_binary(data):
+    decoded = decode_binary_tables(data)
+    decoded["modelProfiles"] = {
+        model: profile if isinstance(profile, str) else render_csv(*profile)
+        for model, profile in decoded["modelProfiles"].items()
+    }
+    return decoded
+
+
+def is_binary(data):
+    return bytes(data[: len(MAGIC)]) == MAGIC
+
+
+def decode_profile_collection(data):
+    """Decode a profile collection in either encoding into a dict.
+
+    The profiles are always returned as CSV text.
+    """
+    if is_binary(data):
+        return decode_binary(data)
+    return json.loads(data)
+
+
+def encode_profile_collection(data, encoding):
+    if encoding == "binary":
+        return encode_binary(data)
+    return json.dumps(data).encode("utf-8")
+
+
+def get_schema_version(encoding):
+    if encoding == "binary":
+        return BINARY_SCHEMA_VERSION
+    return JSON_SCHEMA_VERSION
@@ -0,0 +1,153 @@
+"""A persistent local store of computed anonymization profiles.
+
+The store is an SQLite database, e.g. on a mounted volume, so that computed
+profiles survive restarts even if the profile message has expired from the
+retention of the producer topic. The database uses write-ahead logging so
+that several readers can read it while it is being written to. Each profile
+is stored with its SHA-256 digest which is checked on every read.
+"""
+
+import contextlib
+import hashlib
+import pathlib
+import sqlite3
+import time
+import traceback
+
+BUSY_TIMEOUT_IN_SECONDS = 30
+
+# The messages of SQLITE_NOTADB and SQLITE_CORRUPT. The error codes are
+# exposed on the exceptions only from Python 3.11 on.
+CORRUPTION_MESSAGES = (
+    "file is not a database",
+    "database disk image is malformed",
+)
+
+
+class CorruptProfileStoreError(sqlite3.DatabaseError):
+    """The profile store failed its integrity check."""
+
+
+def is_corrupt(err):
+    """Tell corruption apart from e.g. a locked or unopenable store."""
+    if isinstance(err, CorruptProfileStoreError):
+        return True
+    if isinstance(err, sqlite3.OperationalError):
+        return False
+    return any(message in str(err) for message in CORRUPTION_MESSAGES)
+
+
+def get_digest(profile):
+    return hashlib.sha256(profile.encode("utf-8")).hexdigest()
+
+
+def move_corrupt_database_aside(logger, path, err):
+    suffix = f".corrupt-{time.time_ns()}"
+    corrupt_path = pathlib.Path(f"{path}{suffix}")
+    logger.error(
+        "The profile store is corrupt. Move it aside and start from an empty"
+        " store.",
+        extra={
+            "json_fields": {
+                "err": traceback.format_exception(err),
+                "path": str(path),
+                "corruptPath": str(corrupt_path),
+            }
+        },
+    )
+    for sidecar_suffix in ("-wal", "-shm"):
+        sidecar_path = pathlib.Path(f"{path}{sidecar_suffix}")
+        if sidecar_path.exists():
+            sidecar_path.rename(f"{path}{suffix}{sidecar_suffix}")
+    if pathlib.Path(path).exists():
+        pathlib.Path(path).rename(corrupt_path)
+
+
+def check_integrity(connection):
+    (result,) = connection.execute("PRAGMA quick_check").fetchone()
+    if result != "ok":
+        msg = f"SQLite quick_check failed: {result}"
+        raise CorruptProfileStoreError(msg)
+
+
+def connect(path):
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_IN_SECONDS)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        check_integrity(connection)
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                " model TEXT PRIMARY KEY,"
+                " profile TEXT NOT NULL,"
+                " sha256 TEXT NOT NULL,"
+                " updated_at_ms INTEGER NOT NULL"
+                ")"
+            )
+    except Exception:
+        connection.close()
+        raise
+    return connection
+
+
+@contextlib.contextmanager
+def open_profile_store(logger, path):
+    """Open the profile store, replacing it if it is corrupt.
+
+    Other errors, e.g. sqlite3.OperationalError if the store stays locked
+    longer than the busy timeout, are raised as such so that the stored
+    profiles are kept.
+    """
+    try:
+        connection = connect(path)
+    except sqlite3.DatabaseError as err:
+        if not is_corrupt(err):
+            raise
+        move_corrupt_database_aside(logger, path, err)
+        connection = connect(path)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def read_profiles(logger, path):
+    """Read all intact profiles from the store.
+
+    Profiles whose digest does not match are logged and left out so that they
+    will be computed again and overwritten.
+    """
+    string_models_to_profiles = {}
+    with open_profile_store(logger, path) as connection:
+        rows = connection.execute(
+            "SELECT model, profile, sha256 FROM profiles ORDER BY model"
+        ).fetchall()
+    for model, profile, digest in rows:
+        if get_digest(profile) != digest:
+            logger.error(
+                "The profile in the profile store does not match its digest."
+                " Ignore it so that it will be computed again.",
+                extra={
+                    "json_fields": {
+                        "path": str(path),
+                        "stringModel": model,
+                    }
+                },
+            )
+        else:
+            string_models_to_profiles[model] = profile
+    return string_models_to_profiles
+
+
+def write_profiles(logger, path, string_models_to_profiles):
+    updated_at_ms = time.time_ns() // 1_000_000
+    with open_profile_store(logger, path) as connection, connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO profiles"
+            " (model, profile, sha256, updated_at_ms) VALUES (?, ?, ?, ?)",
+            [
+                (model, profile, get_digest(profile), updated_at_ms)
+                for model, profile in string_models_to_profiles.items()
+            ],
+        )
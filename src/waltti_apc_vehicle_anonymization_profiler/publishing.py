@@ -0,0 +1,150 @@
+"""Publish messages asynchronously and wait for their acknowledgements.
+
+Several messages are kept in flight at once so that sending them does not take
+a round trip to the broker for each message. A message that fails with a
+transient error is sent again after a backoff.
+"""
+
+import collections
+import threading
+import time
+
+import pulsar
+
+# The results worth retrying. Others, e.g. MessageTooBig, would fail again.
+TRANSIENT_RESULTS = frozenset(
+    [
+        pulsar.Result.ConnectError,
+        pulsar.Result.NotConnected,
+        pulsar.Result.ProducerQueueIsFull,
+        pulsar.Result.ServiceUnitNotReady,
+        pulsar.Result.Timeout,
+        pulsar.Result.TooManyLookupRequestException,
+    ]
+)
+
+RETRY_BACKOFF_IN_SECONDS = 1.0
+
+
+class PublishError(RuntimeError):
+    """A message could not be published."""
+
+
+def create_message(data, properties=None, event_timestamp=None):
+    return {
+        "data": data,
+        "properties": properties,
+        "event_timestamp": event_timestamp,
+    }
+
+
+def send_message_async(producer, message, callback):
+    kwargs = {"event_timestamp": message["event_timestamp"]}
+    if message["properties"] is not None:
+        kwargs["properties"] = message["properties"]
+    producer.send_async(message["data"], callback, **kwargs)
+
+
+def publish(logger, producer, messages, publishing_config):
+    """Publish the messages and wait until each has been acknowledged.
+
+    At most max_in_flight_messages messages are waiting for acknowledgement at
+    a time. A message failing with a transient error is sent again up to
+    max_send_attempts times in total.
+
+    Return the acknowledgement latencies in seconds in the order of the
+    messages.
+
+    Raises PublishError if a message could not be published. No new messages
+    are sent after a failure but the messages already in flight are waited
+    for.
+    """
+    max_in_flight = publishing_config["max_in_flight_messages"]
+    max_attempts = publishing_config["max_send_attempts"]
+    # The default lock of a condition is reentrant so the callback may also
+    # run synchronously within send_async.
+    condition = threading.Condition()
+    # Tuples of (earliest send time, index, attempt).
+    to_send = collections.deque(
+        (0.0, index, 1) for index in range(len(messages))
+    )
+    in_flight = 0
+    latencies = [None] * len(messages)
+    retries = []
+    failures = []
+
+    def create_callback(index, attempt, sent_at):
+        # Exceptions must not escape the callback as the Pulsar client would
+        # terminate the process so only record the result here.
+        def callback(result, _message_id):
+            nonlocal in_flight
+            latency = time.monotonic() - sent_at
+            with condition:
+                in_flight -= 1
+                if result == pulsar.Result.Ok:
+                    latencies[index] = latency
+                elif result in TRANSIENT_RESULTS and attempt < max_attempts:
+                    retries.append((index, attempt, str(result)))
+                    to_send.append(
+                        (
+                            time.monotonic() + RETRY_BACKOFF_IN_SECONDS,
+                            index,
+                            attempt + 1,
+                        )
+                    )
+                else:
+                    failures.append((index, attempt, str(result)))
+                condition.notify_all()
+
+        return callback
+
+    with condition:
+        while in_flight > 0 or (len(to_send) > 0 and len(failures) == 0):
+            now = time.monotonic()
+            can_send = (
+                len(failures) == 0
+                and len(to_send) > 0
+                and in_flight < max_in_flight
+            )
+            if can_send and to_send[0][0] <= now:
+                _, index, attempt = to_send.popleft()
+                in_flight += 1
+                send_message_async(
+                    producer,
+                    messages[index],
+                    create_callback(index, attempt, now),
+                )
+            elif can_send:
+                condition.wait(timeout=to_send[0][0] - now)
+            else:
+                condition.wait()
+    for index, attempt, result in retries:
+        logger.warning(
+            "Publishing a message failed with a transient error. Retry.",
+            extra={
+                "json_fields": {
+                    "messageIndex": index,
+                    "attempt": attempt,
+                    "result": result,
+                }
+            },
+        )
+    if len(failures) > 0:
+        index, attempt, result = failures[0]
+        msg = (
+            f"Publishing message {index} failed on attempt {attempt} with the"
+            f" result {result}"
+        )
+        raise PublishError(msg)
+    logger.info(
+        "Published messages",
+        extra={
+            "json_fields": {
+                "numberOfMessages": len(messages),
+                "numberOfRetries": len(retries),
+                "ackLatenciesInSeconds": latencies,
+                "maxAckLatencyInSeconds": max(latencies, default=None),
+            }
+        },
+    )
+    return latencies
@@ -0,0 +1,177 @@
+"""Estimate how long computing the profile of a vehicle model takes.
+
+The durations of past computations of single vehicle models are recorded
+together with the models and their maximum counts. A model that has been
+recorded before is predicted to take its mean recorded duration. For other
+models, a power law, duration = coefficient * maximumCount ** exponent, is
+fitted to the records in log-log space. The predictions are used to schedule
+the longest computations first.
+"""
+
+import json
+import math
+import os
+import pathlib
+import traceback
+
+from waltti_apc_vehicle_anonymization_profiler import vehicle_model_index
+
+# Keep only the latest records so that the file stays small and the fit
+# follows changes in the computation.
+MAX_RECORDS = 1000
+
+
+def read_records(logger, path):
+    """Read the recorded durations.
+
+    A missing or unreadable file results in no records so that the models are
+    scheduled by their maximum counts only. Malformed records are logged and
+    left out.
+    """
+    records = []
+    try:
+        records = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        logger.info(
+            "No recorded computation durations were found",
+            extra={"json_fields": {"path": str(path)}},
+        )
+    except Exception as err:
+        logger.error(
+            "Could not read the recorded computation durations. Schedule the"
+            " computations by maximum count only.",
+            extra={
+                "json_fields": {
+                    "err": traceback.format_exception(err),
+                    "path": str(path),
+                }
+            },
+        )
+    if not isinstance(records, list):
+        records = [records]
+    valid_records = [record for record in records if is_valid(record)]
+    if len(valid_records) < len(records):
+        logger.warning(
+            "Skip malformed recorded computation durations",
+            extra={
+                "json_fields": {
+                    "numberOfMalformedRecords": len(records)
+                    - len(valid_records),
+                    "path": str(path),
+                }
+            },
+        )
+    return valid_records
+
+
+def is_number(value):
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def is_valid(record):
+    return (
+        isinstance(record, dict)
+        and is_number(record.get("maximumCount"))
+        and is_number(record.get("durationInSeconds"))
+        and isinstance(record.get("stringModel", ""), str)
+    )
+
+
+def write_records(path, records):
+    """Write the latest records atomically."""
+    tmp_path = pathlib.Path(f"{path}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(records[-MAX_RECORDS:], f)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp_path.replace(path)
+
+
+def create_record(tuple_model, duration_in_seconds):
+    return {
+        "stringModel": vehicle_model_index.combine_model_tuple_to_string(
+            tuple_model
+        ),
+        "maximumCount": sum(tuple_model),
+        "durationInSeconds": duration_in_seconds,
+    }
+
+
+def get_mean_durations(records):
+    """Get the mean recorded duration of each recorded string model."""
+    durations = {}
+    for record in records:
+        string_model = record.get("stringModel")
+        if string_model is not None:
+            durations.setdefault(string_model, []).append(
+                record["durationInSeconds"]
+            )
+    return {k: sum(v) / len(v) for k, v in durations.items()}
+
+
+def fit(records):
+    """Fit a power law to the records.
+
+    Return None if there are no usable records. With only one distinct
+    maximum count, the duration is assumed to grow linearly. The exponent is
+    kept non-negative as a larger model never computes faster, e.g. if noisy
+    records suggest otherwise.
+    """
+    points = [
+        (
+            math.log(max(1, record["maximumCount"])),
+            math.log(record["durationInSeconds"]),
+        )
+        for record in records
+        if record["durationInSeconds"] > 0
+    ]
+    if len(points) == 0:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance_x = sum((x - mean_x) ** 2 for x, _ in points)
+    exponent = 1.0
+    if variance_x > 0:
+        exponent = (
+            sum((x - mean_x) * (y - mean_y) for x, y in points) / variance_x
+        )
+    exponent = max(0.0, exponent)
+    return {
+        "coefficient": math.exp(mean_y - exponent * mean_x),
+        "exponent": exponent,
+        "meanDurations": get_mean_durations(records),
+    }
+
+
+def predict(fitted, tuple_model):
+    """Predict the duration in seconds or None if nothing has been fitted."""
+    if fitted is None:
+        return None
+    duration = fitted["meanDurations"].get(
+        vehicle_model_index.combine_model_tuple_to_string(tuple_model)
+    )
+    if duration is not None:
+        return duration
+    return (
+        fitted["coefficient"] * max(1, sum(tuple_model)) ** fitted["exponent"]
+    )
+
+
+def schedule_longest_first(fitted, tuple_models):
+    """Order the models so that the longest predicted computations come first.
+
+    Starting the longest computations first and the rest as workers become
+    free keeps the workers busy until the end. Without a fit the maximum count
+    stands in for the duration. Equal predictions are ordered by the maximum
+    count, the largest first.
+    """
+
+    def get_sort_key(model):
+        predicted = predict(fitted, model)
+        return (
+            -(sum(model) if predicted is None else predicted),
+            -sum(model),
+            model,
+        )
+
+    return sorted(tuple_models, key=get_sort_key)
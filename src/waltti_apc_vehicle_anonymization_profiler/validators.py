@@ -1,17 +1,277 @@
 """Get validators."""
 
+import functools
 import importlib.resources
 import json
+import re
 
-import jsonschema
+# Keywords that do not affect validation.
+ANNOTATION_KEYWORDS = frozenset(
+    [
+        "$comment",
+        "$id",
+        "$schema",
+        "default",
+        "description",
+        "examples",
+        "title",
+    ]
+)
+
+TYPE_CHECKS = {
+    "array": lambda instance: isinstance(instance, list),
+    "boolean": lambda instance: isinstance(instance, bool),
+    "integer": lambda instance: (
+        isinstance(instance, int) and not isinstance(instance, bool)
+    )
+    or (isinstance(instance, float) and instance.is_integer()),
+    "null": lambda instance: instance is None,
+    "number": lambda instance: isinstance(instance, int | float)
+    and not isinstance(instance, bool),
+    "object": lambda instance: isinstance(instance, dict),
+    "string": lambda instance: isinstance(instance, str),
+}
+
+
+class UnsupportedSchemaError(Exception):
+    """The schema uses keywords that the fast path does not support."""
+
+
+def accept(_):
+    return True
+
+
+def reject(_):
+    return False
+
+
+def freeze(instance):
+    """Turn a JSON value into a hashable value with JSON equality semantics.
+
+    Booleans are kept apart from numbers as true is not equal to 1 in JSON
+    Schema whereas 1 and 1.0 are equal both in JSON Schema and in Python.
+    """
+    if isinstance(instance, dict):
+        return (
+            "object",
+            frozenset((k, freeze(v)) for k, v in instance.items()),
+        )
+    if isinstance(instance, list):
+        return ("array", tuple(map(freeze, instance)))
+    if isinstance(instance, bool):
+        return ("boolean", instance)
+    return ("value", instance)
+
+
+def has_unique_items(instance):
+    seen = set()
+    for item in instance:
+        frozen = freeze(item)
+        if frozen in seen:
+            return False
+        seen.add(frozen)
+    return True
+
+
+def compile_type(expected_type):
+    types = (
+        [expected_type] if isinstance(expected_type, str) else expected_type
+    )
+    type_checks = [TYPE_CHECKS[t] for t in types]
+    return lambda instance: any(check(instance) for check in type_checks)
+
+
+def compile_object_checks(schema):
+    checks = []
+    properties = {
+        name: compile_schema(subschema)
+        for name, subschema in schema.get("properties", {}).items()
+    }
+    pattern_properties = [
+        (re.compile(pattern), compile_schema(subschema))
+        for pattern, subschema in schema.get("patternProperties", {}).items()
+    ]
+    additional_properties = schema.get("additionalProperties", True)
+    check_additional = None
+    if additional_properties is False:
+        check_additional = reject
+    elif additional_properties is not True:
+        check_additional = compile_schema(additional_properties)
+    required = schema.get("required", [])
+    min_properties = schema.get("minProperties")
+
+    if required:
+        checks.append(lambda instance: all(k in instance for k in required))
+    if min_properties is not None:
+        checks.append(lambda instance: len(instance) >= min_properties)
+    if properties or pattern_properties or check_additional is not None:
+
+        def check_properties(instance):
+            for key, value in instance.items():
+                is_matched = False
+                check_property = properties.get(key)
+                if check_property is not None:
+                    is_matched = True
+                    if not check_property(value):
+                        return False
+                for regex, check_pattern_property in pattern_properties:
+                    if regex.search(key):
+                        is_matched = True
+                        if not check_pattern_property(value):
+                            return False
+                if (
+                    not is_matched
+                    and check_additional is not None
+                    and not check_additional(value)
+                ):
+                    return False
+            return True
+
+        checks.append(check_properties)
+    return checks
+
+
+def compile_array_checks(schema):
+    checks = []
+    min_items = schema.get("minItems")
+    if min_items is not None:
+        checks.append(lambda instance: len(instance) >= min_items)
+    if "items" in schema:
+        check_item = compile_schema(schema["items"])
+        checks.append(lambda instance: all(map(check_item, instance)))
+    if schema.get("uniqueItems", False):
+        checks.append(has_unique_items)
+    return checks
+
+
+def compile_string_checks(schema):
+    checks = []
+    min_length = schema.get("minLength")
+    if min_length is not None:
+        checks.append(lambda instance: len(instance) >= min_length)
+    if "pattern" in schema:
+        regex = re.compile(schema["pattern"])
+        checks.append(lambda instance: regex.search(instance) is not None)
+    return checks
 
 
+def compile_number_checks(schema):
+    checks = []
+    minimum = schema.get("minimum")
+    if minimum is not None:
+        checks.append(lambda instance: instance >= minimum)
+    return checks
+
+
+SUPPORTED_KEYWORDS = ANNOTATION_KEYWORDS | frozenset(
+    [
+        "additionalProperties",
+        "items",
+        "minItems",
+        "minLength",
+        "minProperties",
+        "minimum",
+        "pattern",
+        "patternProperties",
+        "properties",
+        "required",
+        "type",
+        "uniqueItems",
+    ]
+)
+
+
+def compile_schema(schema):
+    """Compile a JSON Schema into a function that returns True if valid.
+
+    Only the subset of JSON Schema used by the schemas of this service is
+    supported. Raises UnsupportedSchemaError for anything else.
+    """
+    if schema is True:
+        return accept
+    if schema is False:
+        return reject
+    unsupported = set(schema.keys()) - SUPPORTED_KEYWORDS
+    if unsupported:
+        msg = f"Unsupported keywords: {sorted(unsupported)}"
+        raise UnsupportedSchemaError(msg)
+    check_type = None
+    if "type" in schema:
+        check_type = compile_type(schema["type"])
+    typed_checks = [
+        (TYPE_CHECKS["object"], compile_object_checks(schema)),
+        (TYPE_CHECKS["array"], compile_array_checks(schema)),
+        (TYPE_CHECKS["string"], compile_string_checks(schema)),
+        (TYPE_CHECKS["number"], compile_number_checks(schema)),
+    ]
+    typed_checks = [(t, c) for t, c in typed_checks if c]
+
+    def check(instance):
+        if check_type is not None and not check_type(instance):
+            return False
+        for is_type, checks in typed_checks:
+            if is_type(instance):
+                return all(c(instance) for c in checks)
+        return True
+
+    return check
+
+
+def get_validation_error_class():
+    """Get jsonschema.ValidationError, importing jsonschema only now."""
+    import jsonschema
+
+    return jsonschema.ValidationError
+
+
+class FastValidator:
+    """Validate with a compiled schema and fall back to jsonschema on errors.
+
+    The compiled check is only used to accept valid instances quickly. When it
+    rejects an instance, or if the schema could not be compiled, the
+    jsonschema validator decides and raises the detailed
+    jsonschema.ValidationError.
+
+    As importing jsonschema is slow, the jsonschema validator is created only
+    when it is first needed.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        try:
+            self.check = compile_schema(schema)
+        except UnsupportedSchemaError:
+            self.check = None
+
+    @functools.cached_property
+    def fallback(self):
+        import jsonschema
+
+        return jsonschema.Draft202012Validator(self.schema)
+
+    def is_valid(self, instance):
+        if self.check is not None and self.check(instance):
+            return True
+        return self.fallback.is_valid(instance)
+
+    def validate(self, instance):
+        if self.check is not None and self.check(instance):
+            return
+        self.fallback.validate(instance)
+
+
+@functools.cache
 def get_validator(path):
     """Get a validator for the schema in the given path.
 
+    The schema is read and compiled only once per path.
+
     Raises json.JSONDecodeError if the schema file is not valid JSON.
 
-    Raises jsonschema.SchemaError if the schema is not a valid JSON Schema.
+    Raises jsonschema.SchemaError if the schema is not a valid JSON Schema and
+    the schema cannot be compiled into the fast path. A schema that compiles
+    is checked against the meta-schema only once the fallback is needed, e.g.
+    in the tests, to avoid importing jsonschema on every startup.
 
     Raises FileNotFoundError if the path is incorrect.
 
@@ -20,20 +280,26 @@ def get_validator(path):
     need to litter all code with try-except to catch mistakes in the path or
     the schema.
     """
-    return jsonschema.Draft202012Validator(
-        json.loads(
-            importlib.resources.files(
-                "waltti_apc_vehicle_anonymization_profiler"
-            )
-            .joinpath(path)
-            .read_text(encoding="utf-8")
-        )
+    schema = json.loads(
+        importlib.resources.files("waltti_apc_vehicle_anonymization_profiler")
+        .joinpath(path)
+        .read_text(encoding="utf-8")
     )
+    validator = FastValidator(schema)
+    if validator.check is None:
+        validator.fallback.check_schema(schema)
+    return validator
 
 
 def get_vehicle_apc_mapping_validator():
     return get_validator("schemas/vehicle-apc-mapping.schema.json")
 
 
+@functools.cache
+def get_vehicle_validator():
+    """Get a validator for a single vehicle in the vehicle-APC mapping."""
+    return FastValidator(get_vehicle_apc_mapping_validator().schema["items"])
+
+
 def get_profile_collection_validator():
     return get_validator("schemas/profile-collection.schema.json")
@@ -0,0 +1,150 @@
+"""Index the vehicles by their vehicle models and the models by vehicles.
+
+A vehicle model is a tuple of the seating capacity and the standing capacity.
+Its string form, e.g. "49-77", names the profile of the model in the profile
+collections. The index interns the model tuples so that each distinct model
+is stored once and converted to and from its string form once. It maps the
+vehicles to their models and the models back to their vehicles so that the
+questions on new, needed and unused models are answered with one lookup per
+model.
+"""
+
+import collections.abc
+
+
+def split_model_string_to_tuple(model_string):
+    return tuple(map(int, model_string.split(sep="-", maxsplit=1)))
+
+
+def combine_model_tuple_to_string(model_tuple):
+    return "-".join(map(str, model_tuple))
+
+
+def get_vehicle_string(vehicle):
+    return vehicle["operatorId"] + "_" + vehicle["vehicleShortName"]
+
+
+def get_vehicle_key(feed_publisher_id, vehicle):
+    return feed_publisher_id + ":" + get_vehicle_string(vehicle)
+
+
+class VehicleModelIndex(collections.abc.Mapping):
+    """Map the vehicle keys to their model tuples and the models back.
+
+    The index is a read-only mapping from the vehicle keys to the model tuples
+    so it compares equal to a dict with the same items. Add vehicles with
+    add_vehicle or update.
+    """
+
+    def __init__(self, vehicles_to_tuple_models=None):
+        # Interned model tuple to its string form and back.
+        self._tuple_models_to_string_models = {}
+        self._string_models_to_tuple_models = {}
+        self._vehicles_to_tuple_models = {}
+        # Only the models of at least one vehicle, i.e. the needed models.
+        self._tuple_models_to_vehicles = {}
+        if vehicles_to_tuple_models is not None:
+            self.update(vehicles_to_tuple_models)
+
+    def __getitem__(self, vehicle_key):
+        return self._vehicles_to_tuple_models[vehicle_key]
+
+    def __iter__(self):
+        return iter(self._vehicles_to_tuple_models)
+
+    def __len__(self):
+        return len(self._vehicles_to_tuple_models)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._vehicles_to_tuple_models!r})"
+
+    def intern(self, tuple_model):
+        """Return the stored tuple equal to tuple_model, storing it if new."""
+        string_model = self._tuple_models_to_string_models.get(tuple_model)
+        if string_model is None:
+            string_model = combine_model_tuple_to_string(tuple_model)
+            self._tuple_models_to_string_models[tuple_model] = string_model
+            self._string_models_to_tuple_models[string_model] = tuple_model
+            return tuple_model
+        return self._string_models_to_tuple_models[string_model]
+
+    def intern_string_model(self, string_model):
+        """Return the interned tuple of string_model."""
+        tuple_model = self._string_models_to_tuple_models.get(string_model)
+        if tuple_model is None:
+            tuple_model = self.intern(
+                split_model_string_to_tuple(string_model)
+            )
+            # Also remember the non-canonical forms, e.g. "49-077".
+            self._string_models_to_tuple_models[string_model] = tuple_model
+        return tuple_model
+
+    def to_string_model(self, tuple_model):
+        return self._tuple_models_to_string_models[self.intern(tuple_model)]
+
+    def add_vehicle(self, vehicle_key, tuple_model):
+        """Map the vehicle to the model, replacing any earlier model."""
+        tuple_model = self.intern(tuple_model)
+        previous_tuple_model = self._vehicles_to_tuple_models.get(vehicle_key)
+        if previous_tuple_model is not None:
+            vehicles = self._tuple_models_to_vehicles[previous_tuple_model]
+            vehicles.discard(vehicle_key)
+            if len(vehicles) == 0:
+                del self._tuple_models_to_vehicles[previous_tuple_model]
+        self._vehicles_to_tuple_models[vehicle_key] = tuple_model
+        self._tuple_models_to_vehicles.setdefault(tuple_model, set()).add(
+            vehicle_key
+        )
+
+    def update(self, vehicles_to_tuple_models):
+        for vehicle_key, tuple_model in vehicles_to_tuple_models.items():
+            self.add_vehicle(vehicle_key, tuple_model)
+
+    @property
+    def needed_tuple_models(self):
+        """A read-only set-like view of the models of the vehicles."""
+        return self._tuple_models_to_vehicles.keys()
+
+    def get_vehicles(self, tuple_model):
+        return frozenset(self._tuple_models_to_vehicles.get(tuple_model, ()))
+
+    def count_vehicles(self, tuple_model):
+        return len(self._tuple_models_to_vehicles.get(tuple_model, ()))
+
+    def is_needed_string_model(self, string_model):
+        return (
+            self.intern_string_model(string_model)
+            in self._tuple_models_to_vehicles
+        )
+
+    def get_new_tuple_models(self, cached_tuple_models):
+        """Return the needed models that are not in cached_tuple_models."""
+        return {
+            model
+            for model in self._tuple_models_to_vehicles
+            if model not in cached_tuple_models
+        }
+
+    def get_needed_string_models_to_profiles(self, string_models_to_profiles):
+        """Keep only the profiles of the needed models."""
+        needed_string_models_to_profiles = {}
+        for model in self._tuple_models_to_vehicles:
+            string_model = self._tuple_models_to_string_models[model]
+            profile = string_models_to_profiles.get(string_model)
+            if profile is not None:
+                needed_string_models_to_profiles[string_model] = profile
+        return needed_string_models_to_profiles
+
+    def get_unused_string_models(self, string_models):
+        """Return the string models that no vehicle uses."""
+        return [
+            string_model
+            for string_model in string_models
+            if not self.is_needed_string_model(string_model)
+        ]
+
+    def get_vehicles_to_string_models(self):
+        return {
+            vehicle_key: self._tuple_models_to_string_models[model]
+            for vehicle_key, model in self._vehicles_to_tuple_models.items()
+        }
@@ -0,0 +1,34 @@
+import logging
+
+from waltti_apc_vehicle_anonymization_profiler import catalogue_digests
+
+
+def test_message_digest_changes_with_content(mocker):
+    message = mocker.MagicMock()
+    message.message_id.return_value.serialize.return_value = b"\x01\x02"
+    message.data.return_value = b"foo"
+    digest = catalogue_digests.get_message_digest(message)
+    assert digest["messageId"] == "0102"
+    message.data.return_value = b"bar"
+    assert catalogue_digests.get_message_digest(message) != digest
+
+
+def test_missing_message_has_no_digest():
+    assert catalogue_digests.get_message_digest(None) is None
+
+
+def test_write_and_read_digests(tmp_path):
+    path = tmp_path / "digests.json"
+    digests = {
+        "fi:kuopio": {"messageId": "0102", "sha256": "abc"},
+        "fi:jyvaskyla": None,
+    }
+    catalogue_digests.write_digests(path, digests)
+    assert catalogue_digests.read_digests(logging.getLogger(), path) == digests
+
+
+def test_read_missing_or_broken_digests(tmp_path):
+    path = tmp_path / "digests.json"
+    assert catalogue_digests.read_digests(logging.getLogger(), path) == {}
+    path.write_text("{")
+    assert catalogue_digests.read_digests(logging.getLogger(), path) == {}
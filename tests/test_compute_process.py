@@ -0,0 +1,75 @@
+import logging
+import multiprocessing
+import threading
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import compute_process
+
+
+def fake_compute_new_profiles(
+    _logger,
+    processing_config,
+    new_tuple_models,
+    on_models_finished=None,
+    on_model_timed=None,
+):
+    if processing_config.get("is_failing"):
+        msg = "Computation failed"
+        raise ValueError(msg)
+    string_models_to_profiles = {}
+    for model in new_tuple_models:
+        string_model = f"{model[0]}-{model[1]}"
+        string_models_to_profiles[string_model] = "foo"
+        on_model_timed(model, 1.0)
+        if on_models_finished is not None:
+            on_models_finished(dict(string_models_to_profiles))
+    return string_models_to_profiles
+
+
+@pytest.fixture()
+def connection():
+    connection, child_connection = multiprocessing.Pipe()
+    thread = threading.Thread(
+        target=compute_process.serve_jobs,
+        args=(
+            child_connection,
+            logging.getLogger(),
+            fake_compute_new_profiles,
+        ),
+    )
+    thread.start()
+    yield connection
+    connection.send(None)
+    thread.join()
+
+
+def test_events_and_result_are_passed_over_the_pipe(connection):
+    finished = []
+    timed = []
+    connection.send(({}, [(1, 2), (3, 4)], True))
+    output = compute_process.receive_result(
+        connection, finished.append, lambda *args: timed.append(args)
+    )
+    assert output == {"1-2": "foo", "3-4": "foo"}
+    assert finished == [{"1-2": "foo"}, {"1-2": "foo", "3-4": "foo"}]
+    assert timed == [((1, 2), 1.0), ((3, 4), 1.0)]
+
+
+def test_failure_is_raised_in_the_main_process(connection):
+    connection.send(({"is_failing": True}, [(1, 2)], False))
+    with pytest.raises(compute_process.ComputeProcessError, match="failed"):
+        compute_process.receive_result(connection, None, None)
+    # The compute process keeps serving after a failure.
+    connection.send(({}, [(1, 2)], False))
+    assert compute_process.receive_result(connection, None, None) == {
+        "1-2": "foo"
+    }
+
+
+def test_start_and_close_compute_process(mocker):
+    process_class = multiprocessing.get_context("spawn").Process
+    start_spy = mocker.spy(process_class, "start")
+    compute = compute_process.start_compute_process(logging.getLogger())
+    process = start_spy.call_args.args[0]
+    compute["close_compute_process"]()
+    assert process.exitcode == 0
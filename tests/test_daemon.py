@@ -0,0 +1,68 @@
+import logging
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import daemon
+
+
+@pytest.fixture()
+def daemon_config():
+    return {
+        "poll_interval_in_seconds": 1,
+        "debounce_in_seconds": 10,
+        "max_debounce_in_seconds": 60,
+    }
+
+
+def create_message(mocker, message_id):
+    message = mocker.MagicMock()
+    message.message_id.return_value.serialize.return_value = message_id
+    return message
+
+
+def create_reader(mocker, messages):
+    reader = mocker.MagicMock()
+    reader.has_message_available.side_effect = [True] * len(messages) + [False]
+    reader.read_next.side_effect = messages
+    return reader
+
+
+def test_debounce_is_not_over_without_changes(daemon_config):
+    assert not daemon.is_debounce_over(daemon_config, 100, None, None)
+
+
+def test_debounce_is_not_over_during_burst(daemon_config):
+    assert not daemon.is_debounce_over(daemon_config, 100, 95, 99)
+
+
+def test_debounce_is_over_after_quiet_period(daemon_config):
+    assert daemon.is_debounce_over(daemon_config, 100, 80, 90)
+
+
+def test_debounce_is_over_after_max_period(daemon_config):
+    assert daemon.is_debounce_over(daemon_config, 100, 40, 99)
+
+
+def test_poll_catalogue_readers_finds_only_changed_feeds(mocker):
+    old_message = create_message(mocker, b"1")
+    new_message = create_message(mocker, b"2")
+    resources = {
+        "pulsar_catalogue_readers": {
+            "fi:jyvaskyla": create_reader(mocker, [old_message]),
+            "fi:kuopio": create_reader(mocker, [old_message, new_message]),
+            "fi:oulu": create_reader(mocker, []),
+        }
+    }
+    latest_messages = {
+        "fi:jyvaskyla": old_message,
+        "fi:kuopio": old_message,
+        "fi:oulu": None,
+    }
+    changed = daemon.poll_catalogue_readers(
+        logging.getLogger(), resources, latest_messages
+    )
+    assert changed == {"fi:kuopio"}
+    assert latest_messages == {
+        "fi:jyvaskyla": old_message,
+        "fi:kuopio": new_message,
+        "fi:oulu": None,
+    }
@@ -0,0 +1,112 @@
+import logging
+import logging.handlers
+from queue import SimpleQueue
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import gcp_logging
+
+
+def create_record(level):
+    return logging.LogRecord("test", level, __file__, 1, "msg", None, None)
+
+
+def test_get_log_queue_size(monkeypatch):
+    monkeypatch.delenv("LOG_QUEUE_SIZE", raising=False)
+    assert gcp_logging.get_log_queue_size() is None
+    monkeypatch.setenv("LOG_QUEUE_SIZE", "8")
+    assert gcp_logging.get_log_queue_size() == 8
+
+
+@pytest.mark.parametrize("string", ["0", "-1", "foo"])
+def test_get_log_queue_size_rejects_invalid(monkeypatch, string):
+    monkeypatch.setenv("LOG_QUEUE_SIZE", string)
+    with pytest.raises(ValueError, match="LOG_QUEUE_SIZE"):
+        gcp_logging.get_log_queue_size()
+
+
+def test_bounded_queue_handler_drops_only_below_warning():
+    queue = SimpleQueue()
+    handler = gcp_logging.BoundedQueueHandler(queue, 2)
+    for _ in range(3):
+        handler.handle(create_record(logging.INFO))
+    assert queue.qsize() == 2
+    assert handler.number_of_dropped_records == 1
+    handler.handle(create_record(logging.WARNING))
+    handler.handle(create_record(logging.ERROR))
+    assert queue.qsize() == 4
+    assert handler.number_of_dropped_records == 1
+
+
+def test_flush_logs_drains_the_queue(mocker, monkeypatch):
+    written = []
+    structured_log_handler = mocker.Mock(
+        level=logging.NOTSET, handle=written.append
+    )
+    queue = SimpleQueue()
+    handler = gcp_logging.BoundedQueueHandler(queue, 1)
+    listener = logging.handlers.QueueListener(
+        queue, structured_log_handler, respect_handler_level=True
+    )
+    monkeypatch.setitem(gcp_logging.log_queue, "handler", handler)
+    monkeypatch.setitem(gcp_logging.log_queue, "listener", listener)
+    logger = logging.getLogger("test_flush_logs")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        logger.info("Kept")
+        logger.info("Dropped")
+        logger.warning("Overflowed")
+        # Start writing only now to fill up the queue deterministically.
+        listener.start()
+        gcp_logging.flush_logs(logger)
+    finally:
+        logger.removeHandler(handler)
+    assert [record.getMessage() for record in written] == [
+        "Kept",
+        "Overflowed",
+        "Dropped log records as the log queue was full",
+    ]
+    assert written[-1].json_fields == {"numberOfDroppedRecords": 1}
+    assert gcp_logging.log_queue == {"handler": None, "listener": None}
+
+
+def test_create_logger_without_queue_logs_synchronously(mocker, monkeypatch):
+    monkeypatch.delenv("LOG_QUEUE_SIZE", raising=False)
+    setup_logging = mocker.patch(
+        "google.cloud.logging_v2.handlers.setup_logging"
+    )
+    gcp_logging.create_logger("test_create_logger")
+    assert not isinstance(
+        setup_logging.call_args.args[0], gcp_logging.BoundedQueueHandler
+    )
+    assert gcp_logging.log_queue["listener"] is None
+
+
+def test_exception_reaches_writer_with_exc_info(mocker):
+    written = []
+    structured_log_handler = mocker.Mock(
+        level=logging.NOTSET, handle=written.append
+    )
+    queue = SimpleQueue()
+    handler = gcp_logging.BoundedQueueHandler(queue, 10)
+    listener = logging.handlers.QueueListener(
+        queue, structured_log_handler, respect_handler_level=True
+    )
+    logger = logging.getLogger("test_exception_reaches_writer")
+    logger.propagate = False
+    logger.addHandler(handler)
+    listener.start()
+    try:
+        try:
+            {}["missing"]
+        except KeyError:
+            logger.exception("Failed with %s", "args")
+    finally:
+        listener.stop()
+        logger.removeHandler(handler)
+    (record,) = written
+    assert record.msg == "Failed with %s"
+    assert record.args == ("args",)
+    assert record.exc_info[0] is KeyError
+    assert record.getMessage() == "Failed with args"
@@ -2,7 +2,7 @@ import time
 
 import pytest
 import requests
-from waltti_apc_vehicle_anonymization_profiler import health_check
+from waltti_apc_vehicle_anonymization_profiler import health_check, metrics
 
 
 @pytest.fixture(scope="module")
@@ -16,9 +16,11 @@ def url(port):
     return f"http://{host}:{port}/healthz"
 
 
-@pytest.fixture()
-def server(port):
-    server = health_check.create_health_check_server({"port": port})
+@pytest.fixture(params=["process", "thread"])
+def server(request, port):
+    server = health_check.create_health_check_server(
+        {"port": port, "server_type": request.param}
+    )
     # Give the server some time to start up in the other process.
     time.sleep(0.1)
     yield server
@@ -62,3 +64,21 @@ def test_unhealthy_after_setting_not_ok_after_ok(url, server):
     server["set_health_ok"](False)
     response = requests.get(url)
     assert_unhealthy(response)
+
+
+def test_metrics_are_shared_with_the_server(port, server):
+    metrics.increment("message_bytes_produced_total", 10)
+    response = requests.get(f"http://127.0.0.1:{port}/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    produced = next(
+        line
+        for line in response.text.splitlines()
+        if line.startswith(f"{metrics.PREFIX}_message_bytes_produced_total ")
+    )
+    assert float(produced.split()[1]) >= 10
+
+
+def test_set_health_ok_rejects_non_boolean(server):
+    with pytest.raises(TypeError):
+        server["set_health_ok"](1)
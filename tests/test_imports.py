@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+import pytest
+
+# Modules that are slow to import and not needed on every run.
+LAZY_MODULES = [
+    "apc_anonymizer",
+    "flask",
+    "google.cloud.logging_v2",
+    "jsonschema",
+]
+
+# The logger is created first thing on every run so the logging library is
+# always imported at startup. It imports Flask, if installed, to read the
+# request context.
+LAZY_MODULES_AT_STARTUP = [
+    module
+    for module in LAZY_MODULES
+    if module not in ("flask", "google.cloud.logging_v2")
+]
+
+
+@pytest.mark.parametrize("module", LAZY_MODULES)
+def test_importing_main_does_not_import_lazy_module(module):
+    code = (
+        "import sys\n"
+        "import waltti_apc_vehicle_anonymization_profiler.main\n"
+        f"print({module!r} in sys.modules)\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code],  # noqa: S603
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert completed.stdout.strip() == "False"
+
+
+@pytest.mark.parametrize("module", LAZY_MODULES_AT_STARTUP)
+def test_starting_up_does_not_import_lazy_module(module):
+    code = (
+        "import sys\n"
+        "from waltti_apc_vehicle_anonymization_profiler import main\n"
+        "main.gcp_logging.create_logger('test')\n"
+        f"print({module!r} in sys.modules)\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code],  # noqa: S603
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert completed.stdout.strip() == "False"
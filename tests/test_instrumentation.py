@@ -0,0 +1,45 @@
+import logging
+import pstats
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import instrumentation
+
+
+def test_time_stage_logs_duration_and_measurements(mocker):
+    logger = mocker.Mock()
+    with instrumentation.time_stage(logger, "formMessage") as measurements:
+        measurements["messageBytes"] = 42
+    json_fields = logger.info.call_args.kwargs["extra"]["json_fields"]
+    assert json_fields["stage"] == "formMessage"
+    assert json_fields["messageBytes"] == 42
+    assert json_fields["durationInSeconds"] >= 0
+
+
+def test_time_stage_logs_even_if_stage_raises(mocker):
+    logger = mocker.Mock()
+    with pytest.raises(RuntimeError), instrumentation.time_stage(
+        logger, "ingest"
+    ):
+        raise RuntimeError
+    logger.info.assert_called_once()
+
+
+def exit_while_captured(logger, output_path):
+    with instrumentation.capture_cprofile(logger, output_path):
+        sum(range(1000))
+        raise SystemExit(1)
+
+
+def test_capture_cprofile_writes_stats_on_exit(tmp_path):
+    logger = logging.getLogger(__name__)
+    output_path = tmp_path / "run.prof"
+    with pytest.raises(SystemExit):
+        exit_while_captured(logger, str(output_path))
+    assert pstats.Stats(str(output_path)).total_calls > 0
+
+
+def test_capture_cprofile_without_path_does_nothing(mocker):
+    profile_mock = mocker.patch("cProfile.Profile")
+    with instrumentation.capture_cprofile(logging.getLogger(__name__), None):
+        pass
+    profile_mock.assert_not_called()
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import json_streaming
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "[]",
+        " [ ] ",
+        "[1]",
+        '[{"a": [1, 2, {"b": "]"}]}, "c" , null, true, 1.5e3]',
+        "\n[\n  {},\n  []\n]\n",
+    ],
+)
+def test_iterate_json_array_matches_json_loads(text):
+    assert list(json_streaming.iterate_json_array(text)) == json.loads(text)
+
+
+@pytest.mark.parametrize(
+    "text", ["", "{}", "[", "[1", "[1,]", "[1 2]", "[1] x", "[1]]"]
+)
+def test_iterate_json_array_rejects_invalid_arrays(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(json_streaming.iterate_json_array(text))
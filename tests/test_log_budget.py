@@ -0,0 +1,35 @@
+import hashlib
+import logging
+
+from waltti_apc_vehicle_anonymization_profiler import log_budget
+
+
+def test_log_lazily_builds_fields_only_if_enabled(mocker):
+    logger = logging.getLogger("test_log_lazily")
+    logger.setLevel(logging.INFO)
+    build_json_fields = mocker.Mock(return_value={"foo": 1})
+    log_budget.log_lazily(logger, logging.DEBUG, "Hidden", build_json_fields)
+    build_json_fields.assert_not_called()
+    log_budget.log_lazily(logger, logging.INFO, "Shown", build_json_fields)
+    build_json_fields.assert_called_once()
+
+
+def test_summarize_payload_keeps_small_payloads():
+    assert log_budget.summarize_payload({"a": [1, 2]}) == {"a": [1, 2]}
+    assert log_budget.summarize_payload("foo") == "foo"
+    assert log_budget.summarize_payload(b"foo") == "foo"
+
+
+def test_summarize_payload_replaces_large_payloads():
+    data = b"x" * 100
+    summary = log_budget.summarize_payload(data, max_length=10)
+    assert summary["sha256"] == hashlib.sha256(data).hexdigest()
+    assert summary["lengthInBytes"] == 100
+    assert summary["preview"] == "x" * 100
+    summary = log_budget.summarize_payload(list(range(100)), max_length=10)
+    assert summary["preview"].startswith("[0, 1, 2")
+
+
+def test_summarize_items():
+    summary = log_budget.summarize_items(list(range(20)), max_samples=3)
+    assert summary == {"count": 20, "samples": [0, 1, 2]}
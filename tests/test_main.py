@@ -3,8 +3,9 @@ import logging
 import os
 import pathlib
 
+import pulsar
 import pytest
-from waltti_apc_vehicle_anonymization_profiler import main
+from waltti_apc_vehicle_anonymization_profiler import main, message_processing
 
 
 @pytest.fixture()
@@ -227,6 +228,9 @@ def test_main(
         "waltti_apc_vehicle_anonymization_profiler.main.pulsar_wrapper.create_client"
     )
     producer_main_mock = mocker.MagicMock()
+    producer_main_mock.send_async.side_effect = (
+        lambda _data, callback, **_kwargs: callback(pulsar.Result.Ok, None)
+    )
     mocker.patch(
         "waltti_apc_vehicle_anonymization_profiler.main.pulsar_wrapper.create_producer",
         return_value=producer_main_mock,
@@ -268,28 +272,22 @@ def test_main(
         "waltti_apc_vehicle_anonymization_profiler.graceful_exit.sys.exit"
     )
     mocker.patch(
-        "waltti_apc_vehicle_anonymization_profiler.message_processing.hyperparameter_optimization.run_inference_for_all_vehicle_models",
+        "apc_anonymizer.mechanisms.simple.hyperparameter_optimization.run_inference_for_all_vehicle_models",
         side_effect=add_csv_files,
     )
-    # FIXME:
-    # Due to a known issue we destroy and create Pulsar resources in
-    # message_processing.py. Once the issue is satisfactorily resolved, pass
-    # just the producer and the readers onwards as usual from main() to
-    # message_processing, remove these mocks and replace mock on which
-    # the assert happens.
-    # https://github.com/apache/pulsar-client-python/issues/127
-    producer_mock = mocker.MagicMock()
-    mocker.patch(
-        "waltti_apc_vehicle_anonymization_profiler.message_processing.pulsar_wrapper.create_producer",
-        return_value=producer_mock,
-    )
+    # Compute in this process so that the mocked computation is used.
     mocker.patch(
-        "waltti_apc_vehicle_anonymization_profiler.message_processing.graceful_exit.close_pulsar"
+        "waltti_apc_vehicle_anonymization_profiler.main.compute_process.start_compute_process",
+        return_value={
+            "close_compute_process": mocker.MagicMock(),
+            "compute_new_profiles": message_processing.compute_new_profiles,
+        },
     )
 
     main.main()
 
-    producer_mock.send.assert_called_with(
+    producer_main_mock.send_async.assert_called_with(
         expected_producer_message_data,
+        mocker.ANY,
         event_timestamp=expected_producer_message_event_timestamp,
     )
@@ -1,4 +1,14 @@
-from waltti_apc_vehicle_anonymization_profiler import message_processing
+import json
+import logging
+import pathlib
+
+import pulsar
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import (
+    message_processing,
+    profile_chunking,
+    vehicle_model_index,
+)
 
 
 def test_split_model_string_to_tuple():
@@ -85,3 +95,589 @@ def test_transform_capacity_to_minimum_counts_five_and_five():
         "FULL": 9,
     }
     assert output == expected_output
+
+
+def create_message_with_data(mocker, data):
+    message = mocker.Mock()
+    message.data.return_value = data
+    return message
+
+
+def test_read_latest_message_from_latest_position(mocker):
+    reader = mocker.MagicMock()
+    reader.has_message_available.side_effect = [True, False]
+    latest = create_message_with_data(mocker, b"latest")
+    reader.read_next.return_value = latest
+    output = message_processing.read_latest_message(
+        logging.getLogger(), reader, True
+    )
+    assert output is latest
+    reader.seek.assert_not_called()
+
+
+def test_read_latest_message_falls_back_to_full_scan(mocker):
+    reader = mocker.MagicMock()
+    reader.has_message_available.side_effect = [False, True, True, False]
+    latest = create_message_with_data(mocker, b"latest")
+    reader.read_next.side_effect = [
+        create_message_with_data(mocker, b"earliest"),
+        latest,
+    ]
+    output = message_processing.read_latest_message(
+        logging.getLogger(), reader, True
+    )
+    assert output is latest
+    reader.seek.assert_called_once_with(pulsar.MessageId.earliest)
+
+
+def test_read_latest_message_full_scan_only(mocker):
+    reader = mocker.MagicMock()
+    reader.has_message_available.return_value = False
+    output = message_processing.read_latest_message(
+        logging.getLogger(), reader, False
+    )
+    assert output is None
+    reader.seek.assert_not_called()
+
+
+def create_reader(mocker, data):
+    message = mocker.MagicMock()
+    message.data.return_value = json.dumps(data).encode("utf-8")
+    message.message_id.return_value.serialize.return_value = b"id"
+    reader = mocker.MagicMock()
+    reader.has_message_available.side_effect = [True, False]
+    reader.read_next.return_value = message
+    return reader
+
+
+def create_resources(mocker):
+    vehicle = {
+        "operatorId": "1",
+        "vehicleShortName": "2",
+        "equipment": [{"type": "PASSENGER_COUNTER", "id": "3"}],
+    }
+    return {
+        "pulsar_cache_reader": create_reader(
+            mocker,
+            {
+                "vehicleModels": {"a:1_2": "1-2"},
+                "modelProfiles": {"1-2": "x"},
+            },
+        ),
+        "pulsar_catalogue_readers": {
+            "a": create_reader(mocker, [vehicle]),
+            "b": create_reader(mocker, []),
+        },
+    }
+
+
+def test_ingest_concurrently_matches_ingest_serially(mocker):
+    processing_config = {
+        "catalogue_digests_path": None,
+        "is_fresh_start": False,
+        "is_latest_only_read": True,
+        "is_single_pass_catalogue_ingestion": False,
+    }
+    logger = logging.getLogger()
+    serial = message_processing.ingest_serially(
+        logger, processing_config, create_resources(mocker), None
+    )
+    concurrent = message_processing.ingest_concurrently(
+        logger, processing_config, create_resources(mocker), None
+    )
+    assert concurrent[0] == serial[0] == {"1-2": "x"}
+    assert concurrent[1].keys() == serial[1].keys()
+    assert serial[2] is None
+    assert concurrent[2] == {
+        "a": [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "equipment": [{"type": "PASSENGER_COUNTER", "id": "3"}],
+            }
+        ],
+        "b": [],
+    }
+    assert serial[3] is None
+    assert concurrent[3] is None
+
+
+def test_ingest_concurrently_skips_validating_unchanged_catalogues(mocker):
+    processing_config = {
+        "catalogue_digests_path": "unused",
+        "is_fresh_start": True,
+        "is_latest_only_read": True,
+        "is_single_pass_catalogue_ingestion": False,
+    }
+    logger = logging.getLogger()
+    first = message_processing.ingest_concurrently(
+        logger, processing_config, create_resources(mocker), None
+    )
+    assert first[2].keys() == {"a", "b"}
+    second = message_processing.ingest_concurrently(
+        logger, processing_config, create_resources(mocker), first[3]
+    )
+    assert second[2] == {}
+    assert second[3] == first[3]
+
+
+@pytest.fixture()
+def mock_computation(mocker):
+    def add_csv_files(config):
+        tmp_path = pathlib.Path(config["outputDirectory"])
+        for vm in config["vehicleModels"]:
+            for csv_filename in vm["outputFilenames"]:
+                (tmp_path / csv_filename).write_text(
+                    f"{csv_filename},{len(vm)}"
+                )
+
+    return mocker.patch(
+        "apc_anonymizer.mechanisms.simple.hyperparameter_optimization.run_inference_for_all_vehicle_models",
+        side_effect=add_csv_files,
+    )
+
+
+def test_compute_new_profiles_in_parallel(mock_computation):
+    new_tuple_models = {(1, 2), (3, 4), (5, 6)}
+    serial = message_processing.compute_new_profiles(
+        logging.getLogger(),
+        {
+            "checkpoint_directory_path": None,
+            "computation_time_budget_in_seconds": None,
+            "computation_processes": 1,
+            "incremental_publishing_batch_size": None,
+            "runtime_records_path": None,
+        },
+        new_tuple_models,
+    )
+    parallel = message_processing.compute_new_profiles(
+        logging.getLogger(),
+        {
+            "checkpoint_directory_path": None,
+            "computation_time_budget_in_seconds": None,
+            "computation_processes": 2,
+            "incremental_publishing_batch_size": None,
+            "runtime_records_path": None,
+        },
+        new_tuple_models,
+    )
+    assert parallel == serial
+    assert sorted(parallel.keys()) == ["1-2", "3-4", "5-6"]
+
+
+@pytest.mark.parametrize("computation_processes", [1, 2])
+def test_compute_new_profiles_incrementally(
+    mocker, mock_computation, computation_processes
+):
+    on_models_finished = mocker.MagicMock()
+    new_tuple_models = {(1, 2), (3, 4), (5, 6), (7, 8), (9, 10)}
+    output = message_processing.compute_new_profiles(
+        logging.getLogger(),
+        {
+            "checkpoint_directory_path": None,
+            "computation_time_budget_in_seconds": None,
+            "computation_processes": computation_processes,
+            "incremental_publishing_batch_size": 2,
+            "runtime_records_path": None,
+        },
+        new_tuple_models,
+        on_models_finished,
+    )
+    assert len(output) == 5
+    finished_counts = [
+        len(call.args[0]) for call in on_models_finished.call_args_list
+    ]
+    assert finished_counts == [2, 4]
+
+
+def test_compute_new_profiles_observes_each_model_in_one_call(
+    mocker, mock_computation
+):
+    observe = mocker.patch(
+        "waltti_apc_vehicle_anonymization_profiler.metrics.observe"
+    )
+    new_tuple_models = {(1, 2), (3, 4), (5, 6)}
+    output = message_processing.compute_new_profiles(
+        logging.getLogger(),
+        {
+            "checkpoint_directory_path": None,
+            "computation_time_budget_in_seconds": None,
+            "computation_processes": 1,
+            "incremental_publishing_batch_size": None,
+            "runtime_records_path": None,
+        },
+        new_tuple_models,
+        on_model_timed=message_processing.observe_model_computation,
+    )
+    assert sorted(output) == ["1-2", "3-4", "5-6"]
+    assert mock_computation.call_count == 1
+    assert observe.call_count == 3
+    for call in observe.call_args_list:
+        assert call.args[0] == "model_computation_seconds"
+
+
+def create_catalogue_message(mocker, data):
+    message = mocker.MagicMock()
+    message.data.return_value = json.dumps(data).encode("utf-8")
+    return message
+
+
+@pytest.fixture()
+def catalogue():
+    return [
+        {
+            "operatorId": "1",
+            "vehicleShortName": "1",
+            "seatingCapacity": 49,
+            "standingCapacity": 77,
+            "equipment": [{"type": "LOCATION_PRODUCER", "id": "a"}],
+        },
+        {
+            "operatorId": "1",
+            "vehicleShortName": "2",
+            "seatingCapacity": 49,
+            "standingCapacity": 77,
+            "equipment": [
+                {"type": "PASSENGER_COUNTER", "id": "b"},
+                {"type": "PASSENGER_COUNTER", "id": "c"},
+            ],
+        },
+        {
+            "operatorId": "1",
+            "vehicleShortName": "3",
+            "seatingCapacity": 39,
+            "equipment": [{"type": "PASSENGER_COUNTER", "id": "d"}],
+        },
+        {
+            "operatorId": "2",
+            "vehicleShortName": "3",
+            "seatingCapacity": 39,
+            "standingCapacity": 38,
+            "equipment": [{"type": "PASSENGER_COUNTER", "id": "e"}],
+        },
+    ]
+
+
+def test_single_pass_matches_multiple_passes(mocker, catalogue):
+    messages = {
+        "fi:kuopio": create_catalogue_message(mocker, catalogue),
+        "fi:jyvaskyla": create_catalogue_message(mocker, catalogue[1:2]),
+    }
+    logger = logging.getLogger()
+    single_pass = (
+        message_processing.get_latest_vehicles_to_tuple_models_in_single_pass(
+            logger, messages
+        )
+    )
+    assert single_pass == (
+        message_processing.get_latest_vehicles_to_tuple_models(
+            logger, messages
+        )
+    )
+    assert single_pass == {
+        "fi:kuopio:1_2": (49, 77),
+        "fi:kuopio:2_3": (39, 38),
+        "fi:jyvaskyla:1_2": (49, 77),
+    }
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"[{",
+        json.dumps([{"operatorId": "1"}]).encode("utf-8"),
+    ],
+)
+def test_single_pass_skips_invalid_catalogue(mocker, catalogue, data):
+    invalid_message = mocker.MagicMock()
+    invalid_message.data.return_value = data
+    messages = {
+        "fi:kuopio": create_catalogue_message(mocker, catalogue),
+        "fi:jyvaskyla": invalid_message,
+    }
+    output = (
+        message_processing.get_latest_vehicles_to_tuple_models_in_single_pass(
+            logging.getLogger(), messages
+        )
+    )
+    assert output == {
+        "fi:kuopio:1_2": (49, 77),
+        "fi:kuopio:2_3": (39, 38),
+    }
+
+
+@pytest.mark.parametrize("is_single_pass", [True, False])
+def test_vehicles_without_capacity_are_logged_once_per_feed(
+    mocker, catalogue, is_single_pass
+):
+    without_capacity = [
+        {
+            "operatorId": "1",
+            "vehicleShortName": str(i),
+            "equipment": [{"type": "PASSENGER_COUNTER", "id": f"x{i}"}],
+        }
+        for i in range(10, 30)
+    ]
+    messages = {
+        "fi:kuopio": create_catalogue_message(
+            mocker, catalogue + without_capacity
+        )
+    }
+    logger = mocker.Mock()
+    if is_single_pass:
+        message_processing.get_latest_vehicles_to_tuple_models_in_single_pass(
+            logger, messages
+        )
+    else:
+        message_processing.get_latest_vehicles_to_tuple_models(
+            logger, messages
+        )
+    logger.error.assert_called_once()
+    json_fields = logger.error.call_args.kwargs["extra"]["json_fields"]
+    assert json_fields["feedPublisherId"] == "fi:kuopio"
+    assert json_fields["vehicles"]["count"] == 21
+    assert len(json_fields["vehicles"]["samples"]) == 10
+
+
+def test_single_pass_rejects_duplicate_vehicles(mocker, catalogue):
+    message = create_catalogue_message(mocker, catalogue + catalogue[:1])
+    with pytest.raises(message_processing.InvalidCatalogueError):
+        message_processing.stream_vehicles_to_tuple_models(
+            logging.getLogger(), "fi:kuopio", message
+        )
+
+
+@pytest.mark.parametrize("encoding", ["json", "binary"])
+def test_build_cache_reads_both_encodings(mocker, encoding):
+    profiles = {"1-2": "count,EMPTY\n0,0.5\n", "3-4": "x"}
+    message = mocker.MagicMock()
+    message.data.return_value = message_processing.form_producer_message_data(
+        {"1_1": "1-2", "1_2": "3-4"}, profiles, encoding
+    )
+    assert (
+        message_processing.build_cache(logging.getLogger(), message)
+        == profiles
+    )
+
+
+class FakeReader:
+    def __init__(self, messages):
+        self.messages = messages
+        self.position = len(messages) - 1
+        self.seeks = []
+
+    def has_message_available(self):
+        return self.position < len(self.messages)
+
+    def read_next(self):
+        self.position += 1
+        return self.messages[self.position - 1]
+
+    def seek(self, position):
+        self.seeks.append(position)
+        if not isinstance(position, int):
+            self.position = 0
+        else:
+            self.position = next(
+                i
+                for i, message in enumerate(self.messages)
+                if message.publish_timestamp() >= position
+            )
+
+    def topic(self):
+        return "topic"
+
+
+def create_profile_messages(mocker, vehicles_to_models, models_to_profiles):
+    parts = profile_chunking.split_collection(
+        vehicles_to_models,
+        models_to_profiles,
+        message_processing.form_producer_message_data,
+        400,
+    )
+    messages = []
+    for data, properties in zip(
+        parts,
+        profile_chunking.get_part_properties(len(parts)),
+        strict=True,
+    ):
+        message = mocker.MagicMock()
+        message.data.return_value = data
+        message.properties.return_value = properties or {}
+        message.publish_timestamp.return_value = int(
+            (properties or {}).get(
+                profile_chunking.COLLECTION_START_TIMESTAMP, 0
+            )
+        )
+        messages.append(message)
+    return messages
+
+
+@pytest.mark.parametrize("is_latest_only_read", [True, False])
+def test_warm_up_cache_reassembles_latest_complete_collection(
+    mocker, is_latest_only_read
+):
+    old = {f"{i}-0": "x" * 20 for i in range(20)}
+    new = {f"{i}-0": "y" * 20 for i in range(20)}
+    old_messages = create_profile_messages(
+        mocker, {f"1_{i}": f"{i}-0" for i in range(20)}, old
+    )
+    new_messages = create_profile_messages(
+        mocker, {f"1_{i}": f"{i}-0" for i in range(20)}, new
+    )
+    assert len(old_messages) > 1
+    logger = logging.getLogger()
+    processing_config = {"is_latest_only_read": is_latest_only_read}
+
+    reader = FakeReader(old_messages + new_messages)
+    if not is_latest_only_read:
+        reader.position = 0
+    assert (
+        message_processing.warm_up_cache(logger, processing_config, reader)
+        == new
+    )
+    assert all(isinstance(position, int) for position in reader.seeks)
+
+    reader = FakeReader(old_messages + new_messages[:-1])
+    if not is_latest_only_read:
+        reader.position = 0
+    assert (
+        message_processing.warm_up_cache(logger, processing_config, reader)
+        == old
+    )
+
+
+def test_get_computation_input_distance():
+    assert (
+        message_processing.get_computation_input_distance((36, 0), (35, 1))
+        == 0
+    )
+    assert (
+        message_processing.get_computation_input_distance((49, 77), (49, 77))
+        == 0
+    )
+    assert (
+        message_processing.get_computation_input_distance((49, 77), (49, 78))
+        > 0
+    )
+
+
+def test_warm_start_reuses_only_identical_computations():
+    reused, to_compute = message_processing.warm_start(
+        logging.getLogger(),
+        {(35, 1), (49, 78), (1, 1)},
+        {(36, 0): "a", (49, 77): "b"},
+    )
+    assert reused == {"35-1": "a"}
+    assert to_compute == {(49, 78), (1, 1)}
+
+
+def test_warm_start_without_cache_computes_everything():
+    reused, to_compute = message_processing.warm_start(
+        logging.getLogger(), {(1, 2)}, {}
+    )
+    assert reused == {}
+    assert to_compute == {(1, 2)}
+
+
+@pytest.mark.parametrize("computation_processes", [1, 2])
+def test_compute_new_profiles_records_checkpoints(
+    tmp_path, mock_computation, computation_processes
+):
+    output = message_processing.compute_new_profiles(
+        logging.getLogger(),
+        {
+            "checkpoint_directory_path": str(tmp_path),
+            "computation_time_budget_in_seconds": None,
+            "computation_processes": computation_processes,
+            "incremental_publishing_batch_size": None,
+            "runtime_records_path": None,
+        },
+        {(1, 2), (3, 4)},
+    )
+    assert (
+        message_processing.checkpoints.read_profiles(
+            logging.getLogger(), tmp_path
+        )
+        == output
+    )
+    assert sorted(output) == ["1-2", "3-4"]
+
+
+def test_resume_from_checkpoints(tmp_path):
+    logger = logging.getLogger()
+    message_processing.checkpoints.write_profiles(
+        logger, tmp_path, {"1-2": "a", "5-6": "c"}
+    )
+    resumed, to_compute = message_processing.resume_from_checkpoints(
+        logger, tmp_path, {(1, 2), (3, 4)}
+    )
+    assert resumed == {"1-2": "a"}
+    assert to_compute == {(3, 4)}
+    message_processing.checkpoints.clear(tmp_path)
+    assert message_processing.checkpoints.read_profiles(logger, tmp_path) == {}
+
+
+def test_prioritize_tuple_models_by_number_of_vehicles():
+    latest_vehicles_to_tuple_models = vehicle_model_index.VehicleModelIndex(
+        {
+            "a": (1, 2),
+            "b": (3, 4),
+            "c": (3, 4),
+            "d": (5, 6),
+            "e": (5, 6),
+            "f": (5, 6),
+        }
+    )
+    assert message_processing.prioritize_tuple_models(
+        latest_vehicles_to_tuple_models, {(1, 2), (3, 4), (5, 6), (0, 1)}
+    ) == [(5, 6), (3, 4), (1, 2), (0, 1)]
+
+
+def test_compute_new_profiles_in_batches_stops_after_deadline(mocker):
+    compute = mocker.patch(
+        "waltti_apc_vehicle_anonymization_profiler.message_processing.compute_new_profiles_serially",
+        side_effect=lambda _, batch: {
+            message_processing.combine_model_tuple_to_string(batch[0]): "x"
+        },
+    )
+    mocker.patch(
+        "waltti_apc_vehicle_anonymization_profiler.message_processing.time.monotonic",
+        side_effect=[0, 0, 100],
+    )
+    output = message_processing.compute_new_profiles_in_batches(
+        logging.getLogger(), [(5, 6), (3, 4), (1, 2)], 1, deadline=10
+    )
+    assert output == {"5-6": "x", "3-4": "x"}
+    assert compute.call_count == 2
+
+
+def test_compute_new_profiles_in_parallel_starts_nothing_after_deadline(
+    mock_computation,
+):
+    output = message_processing.compute_new_profiles_in_parallel(
+        logging.getLogger(), [(1, 2), (3, 4)], 2, deadline=0
+    )
+    assert output == {}
+
+
+@pytest.mark.parametrize("computation_processes", [1, 2])
+def test_compute_new_profiles_records_durations(
+    tmp_path, mock_computation, computation_processes
+):
+    path = tmp_path / "records.json"
+    message_processing.compute_new_profiles(
+        logging.getLogger(),
+        {
+            "checkpoint_directory_path": str(tmp_path / "checkpoints"),
+            "computation_time_budget_in_seconds": None,
+            "computation_processes": computation_processes,
+            "incremental_publishing_batch_size": None,
+            "runtime_records_path": str(path),
+        },
+        {(1, 2), (3, 4)},
+    )
+    records = message_processing.runtime_estimator.read_records(
+        logging.getLogger(), path
+    )
+    assert sorted(record["maximumCount"] for record in records) == [3, 7]
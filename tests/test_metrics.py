@@ -0,0 +1,76 @@
+import multiprocessing
+import subprocess
+import sys
+
+from waltti_apc_vehicle_anonymization_profiler import metrics
+
+
+def test_render_counters_and_summaries(mocker):
+    registry = metrics.create_registry()
+    mocker.patch.object(metrics, "registry", registry)
+    metrics.increment("models_computed_total", 3)
+    metrics.observe("model_computation_seconds", 1.5)
+    metrics.observe("model_computation_seconds", 0.5)
+    metrics.observe_stage("ingest", 0.25)
+    text = metrics.render(registry)
+    prefix = metrics.PREFIX
+    assert f"# TYPE {prefix}_models_computed_total counter" in text
+    assert f"{prefix}_models_computed_total 3.0\n" in text
+    assert f"{prefix}_model_computation_seconds_sum 2.0\n" in text
+    assert f"{prefix}_model_computation_seconds_count 2\n" in text
+    assert (
+        f'{prefix}_stage_duration_seconds_sum{{stage="ingest"}} 0.25' in text
+    )
+    assert f'{prefix}_stage_duration_seconds_count{{stage="ingest"}} 1' in text
+
+
+def increment_many_times():
+    for _ in range(1000):
+        metrics.increment("cache_hits_total")
+
+
+def test_increment_is_shared_between_processes(mocker):
+    registry = metrics.create_registry()
+    mocker.patch.object(metrics, "registry", registry)
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=increment_many_times) for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    increment_many_times()
+    for process in processes:
+        process.join()
+    assert registry["counters"]["cache_hits_total"].value == 5000
+
+
+def test_registry_is_not_created_on_import():
+    completed = subprocess.run(
+        [  # noqa: S603
+            sys.executable,
+            "-c",
+            "from waltti_apc_vehicle_anonymization_profiler import metrics;"
+            " print(metrics.registry is None)",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert completed.stdout.strip() == "True"
+
+
+def increment_in_spawned_process(registry):
+    metrics.set_registry(registry)
+    increment_many_times()
+
+
+def test_registry_is_shared_with_spawned_process(mocker):
+    registry = metrics.create_registry()
+    mocker.patch.object(metrics, "registry", registry)
+    process = multiprocessing.get_context("spawn").Process(
+        target=increment_in_spawned_process, args=(registry,)
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert registry["counters"]["cache_hits_total"].value == 1000
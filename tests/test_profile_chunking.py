@@ -0,0 +1,137 @@
+import json
+import logging
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import profile_chunking
+
+
+def encode(vehicles_to_models, models_to_profiles):
+    return json.dumps(
+        {
+            "vehicleModels": vehicles_to_models,
+            "modelProfiles": models_to_profiles,
+        }
+    ).encode("utf-8")
+
+
+@pytest.fixture()
+def collection():
+    return (
+        {f"1_{i}": f"{i % 5}-0" for i in range(20)},
+        {f"{i}-0": "x" * 100 for i in range(5)},
+    )
+
+
+def test_split_collection_keeps_fitting_collection_whole(collection):
+    parts = profile_chunking.split_collection(*collection, encode, 10_000)
+    assert parts == [encode(*collection)]
+
+
+def test_split_collection_splits_under_budget(collection):
+    vehicles_to_models, models_to_profiles = collection
+    parts = profile_chunking.split_collection(*collection, encode, 300)
+    assert len(parts) > 1
+    assert all(len(part) <= 300 for part in parts)
+    decoded = [json.loads(part) for part in parts]
+    assert {
+        k: v for part in decoded for k, v in part["vehicleModels"].items()
+    } == vehicles_to_models
+    assert {
+        k: v for part in decoded for k, v in part["modelProfiles"].items()
+    } == models_to_profiles
+    assert all(
+        set(part["vehicleModels"].values()) == set(part["modelProfiles"])
+        for part in decoded
+    )
+
+
+def test_split_collection_keeps_vehicles_without_profile(collection):
+    vehicles_to_models, models_to_profiles = collection
+    vehicles_to_models = vehicles_to_models | {"1_99": "9-9"}
+    whole = profile_chunking.split_collection(
+        vehicles_to_models, models_to_profiles, encode, 10_000
+    )
+    assert json.loads(whole[0])["vehicleModels"]["1_99"] == "9-9"
+    parts = profile_chunking.split_collection(
+        vehicles_to_models, models_to_profiles, encode, 300
+    )
+    assert len(parts) > 1
+    decoded = [json.loads(part) for part in parts]
+    assert decoded[0]["vehicleModels"]["1_99"] == "9-9"
+    assert all("1_99" not in part["vehicleModels"] for part in decoded[1:])
+    assert {
+        k: v for part in decoded for k, v in part["vehicleModels"].items()
+    } == vehicles_to_models
+
+
+def test_split_collection_spreads_many_vehicles_without_profile(collection):
+    vehicles_to_models, models_to_profiles = collection
+    vehicles_to_models = vehicles_to_models | {
+        f"1_{i}": f"9-{i % 3}" for i in range(100, 140)
+    }
+    parts = profile_chunking.split_collection(
+        vehicles_to_models, models_to_profiles, encode, 400
+    )
+    assert all(len(part) <= 400 for part in parts)
+    decoded = [json.loads(part) for part in parts]
+    assert {
+        k: v for part in decoded for k, v in part["vehicleModels"].items()
+    } == vehicles_to_models
+    assert all(
+        any(v.startswith("9-") for v in part["vehicleModels"].values())
+        for part in decoded
+    )
+
+
+def test_split_collection_rejects_too_large_model(collection):
+    with pytest.raises(profile_chunking.ProfileCollectionTooLargeError):
+        profile_chunking.split_collection(*collection, encode, 50)
+
+
+def create_messages(mocker, number_of_parts, collection_id="c"):
+    messages = []
+    properties = profile_chunking.get_part_properties(number_of_parts)
+    for index, part_properties in enumerate(properties):
+        message = mocker.MagicMock()
+        message.properties.return_value = (
+            {} if part_properties is None else part_properties
+        )
+        if part_properties is not None:
+            part_properties[profile_chunking.COLLECTION_ID] = collection_id
+        message.data.return_value = f"{collection_id}{index}"
+        messages.append(message)
+    return messages
+
+
+def find_data(messages):
+    collection = profile_chunking.find_latest_complete_collection(
+        logging.getLogger(), messages
+    )
+    if collection is None:
+        return None
+    return [message.data() for message in collection]
+
+
+def test_find_latest_complete_collection(mocker):
+    single = create_messages(mocker, 1, "s")
+    complete = create_messages(mocker, 3, "a")
+    incomplete = create_messages(mocker, 3, "b")
+    assert find_data([]) is None
+    assert find_data(single) == ["s0"]
+    assert find_data(single + complete) == ["a0", "a1", "a2"]
+    assert find_data(complete + incomplete[:2]) == ["a0", "a1", "a2"]
+    assert find_data(complete[1:]) is None
+    assert find_data(
+        complete[:1] + incomplete[:1] + complete[1:] + single
+    ) == ["s0"]
+    assert find_data(complete[:1] + incomplete[:1] + complete[1:]) is None
+
+
+def test_find_latest_complete_collection_ignores_malformed_parts(mocker):
+    complete = create_messages(mocker, 2, "a")
+    malformed = create_messages(mocker, 2, "b")
+    del malformed[0].properties.return_value[profile_chunking.PART_COUNT]
+    assert find_data(complete + malformed) == ["a0", "a1"]
+    assert profile_chunking.get_last_part_info(malformed[0]) is None
+    assert profile_chunking.get_last_part_info(complete[0]) is None
+    assert profile_chunking.get_last_part_info(complete[1]) is not None
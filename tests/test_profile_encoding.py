@@ -0,0 +1,78 @@
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import profile_encoding
+
+
+@pytest.fixture()
+def collection():
+    return {
+        "schemaVersion": profile_encoding.BINARY_SCHEMA_VERSION,
+        "vehicleModels": {"1_2": "10-20", "1_3": "30-40", "1_4": "50-60"},
+        "modelProfiles": {
+            "10-20": "count,EMPTY,FULL\n0,0.25,0.75\n1,1.0,0.0\n",
+            "30-40": "count,EMPTY\n0,1\n1,2\n",
+            "50-60": "not,numeric\r\na,b\r\n",
+        },
+    }
+
+
+def test_binary_round_trip(collection):
+    data = profile_encoding.encode_profile_collection(collection, "binary")
+    assert profile_encoding.is_binary(data)
+    assert profile_encoding.decode_profile_collection(data) == collection
+
+
+def test_binary_keeps_numeric_profiles_typed(collection):
+    data = profile_encoding.encode_profile_collection(collection, "binary")
+    decoded = profile_encoding.decode_binary_tables(data)
+    names, columns = decoded["modelProfiles"]["10-20"]
+    assert names == ["count", "EMPTY", "FULL"]
+    assert [column.typecode for column in columns] == ["q", "d", "d"]
+    assert list(columns[1]) == [0.25, 1.0]
+    assert decoded["modelProfiles"]["50-60"] == "not,numeric\r\na,b\r\n"
+
+
+@pytest.mark.parametrize(
+    "profile",
+    [
+        "count,EMPTY\n0,0.10\n",
+        "count,EMPTY\n0,1\n",
+        "count,EMPTY\n0,1",
+        "count,EMPTY\n0\n",
+        "count,EMPTY\n0,nan\n",
+    ],
+)
+def test_parse_csv_table_is_lossless_or_none(profile):
+    table = profile_encoding.parse_csv_table(profile)
+    if table is not None:
+        assert profile_encoding.render_csv(*table) == profile
+
+
+def test_binary_keeps_integers_beyond_int64_as_text(collection):
+    profile = "count,EMPTY\n0,99999999999999999999\n"
+    assert profile_encoding.parse_csv_table(profile) is None
+    collection["modelProfiles"]["30-40"] = profile
+    data = profile_encoding.encode_profile_collection(collection, "binary")
+    decoded = profile_encoding.decode_binary_tables(data)
+    assert decoded["modelProfiles"]["30-40"] == profile
+    assert profile_encoding.decode_profile_collection(data) == collection
+
+
+def test_json_is_not_binary(collection):
+    data = profile_encoding.encode_profile_collection(collection, "json")
+    assert not profile_encoding.is_binary(data)
+    assert profile_encoding.decode_profile_collection(data) == collection
+
+
+@pytest.mark.parametrize(
+    "transform",
+    [
+        lambda data: data[:-1],
+        lambda data: data + b"\x00",
+        lambda data: data[:4] + b"\x09" + data[5:],
+        lambda data: b"XXXX" + data[4:],
+    ],
+)
+def test_decode_binary_rejects_malformed_data(collection, transform):
+    data = profile_encoding.encode_profile_collection(collection, "binary")
+    with pytest.raises(profile_encoding.ProfileEncodingError):
+        profile_encoding.decode_binary(transform(data))
@@ -0,0 +1,66 @@
+import logging
+import sqlite3
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import profile_store
+
+
+@pytest.fixture()
+def logger():
+    return logging.getLogger()
+
+
+@pytest.fixture()
+def path(tmp_path):
+    return tmp_path / "profiles.sqlite3"
+
+
+def test_read_profiles_from_new_store(logger, path):
+    assert profile_store.read_profiles(logger, path) == {}
+
+
+def test_write_and_read_profiles(logger, path):
+    profile_store.write_profiles(logger, path, {"1-2": "foo", "3-4": "bar"})
+    profile_store.write_profiles(logger, path, {"1-2": "baz"})
+    assert profile_store.read_profiles(logger, path) == {
+        "1-2": "baz",
+        "3-4": "bar",
+    }
+
+
+def test_profile_not_matching_digest_is_ignored(logger, path):
+    profile_store.write_profiles(logger, path, {"1-2": "foo", "3-4": "bar"})
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(
+            "UPDATE profiles SET profile = 'tampered' WHERE model = '1-2'"
+        )
+    connection.close()
+    assert profile_store.read_profiles(logger, path) == {"3-4": "bar"}
+
+
+def test_corrupt_store_is_moved_aside(logger, path):
+    path.write_bytes(b"this is not an SQLite database" * 1000)
+    assert profile_store.read_profiles(logger, path) == {}
+    assert len(list(path.parent.glob("profiles.sqlite3.corrupt-*"))) == 1
+
+
+def test_locked_store_is_not_moved_aside(logger, path, monkeypatch):
+    profile_store.write_profiles(logger, path, {"1-2": "foo"})
+    monkeypatch.setattr(profile_store, "BUSY_TIMEOUT_IN_SECONDS", 0.1)
+    holder = sqlite3.connect(path, isolation_level=None)
+    try:
+        holder.execute("PRAGMA locking_mode=EXCLUSIVE")
+        holder.execute("BEGIN EXCLUSIVE")
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            profile_store.read_profiles(logger, path)
+    finally:
+        holder.close()
+    assert list(path.parent.glob("profiles.sqlite3.corrupt-*")) == []
+    assert profile_store.read_profiles(logger, path) == {"1-2": "foo"}
+
+
+def test_store_is_created_in_missing_directory(logger, tmp_path):
+    path = tmp_path / "missing" / "profiles.sqlite3"
+    profile_store.write_profiles(logger, path, {"1-2": "foo"})
+    assert profile_store.read_profiles(logger, path) == {"1-2": "foo"}
@@ -0,0 +1,116 @@
+import logging
+import threading
+
+import pulsar
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import publishing
+
+
+@pytest.fixture()
+def publishing_config():
+    return {"max_in_flight_messages": 2, "max_send_attempts": 3}
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(mocker):
+    mocker.patch.object(publishing, "RETRY_BACKOFF_IN_SECONDS", 0)
+
+
+class FakeProducer:
+    """Acknowledge the messages from another thread in a given order."""
+
+    def __init__(self, results_by_data=None):
+        self.results_by_data = results_by_data or {}
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def send_async(self, data, callback, **kwargs):
+        with self.lock:
+            self.sent.append((data, kwargs))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            results = self.results_by_data.get(data, [])
+            result = results.pop(0) if len(results) > 0 else pulsar.Result.Ok
+
+        def acknowledge():
+            with self.lock:
+                self.in_flight -= 1
+            callback(result, None)
+
+        threading.Timer(0.01, acknowledge).start()
+
+
+def test_publish_bounds_in_flight_messages(publishing_config):
+    producer = FakeProducer()
+    messages = [
+        publishing.create_message(
+            bytes([i]), {"partIndex": str(i)}, event_timestamp=1
+        )
+        for i in range(5)
+    ]
+    latencies = publishing.publish(
+        logging.getLogger(), producer, messages, publishing_config
+    )
+    assert [data for data, _ in producer.sent] == [
+        bytes([i]) for i in range(5)
+    ]
+    assert producer.sent[0][1] == {
+        "event_timestamp": 1,
+        "properties": {"partIndex": "0"},
+    }
+    assert producer.max_in_flight <= 2
+    assert all(latency >= 0 for latency in latencies)
+
+
+def test_publish_retries_transient_failures(publishing_config):
+    producer = FakeProducer(
+        {b"a": [pulsar.Result.Timeout, pulsar.Result.ProducerQueueIsFull]}
+    )
+    messages = [
+        publishing.create_message(b"a"),
+        publishing.create_message(b"b"),
+    ]
+    publishing.publish(
+        logging.getLogger(), producer, messages, publishing_config
+    )
+    assert [data for data, _ in producer.sent].count(b"a") == 3
+    assert producer.sent[0][1] == {"event_timestamp": None}
+
+
+def test_publish_gives_up_after_max_attempts(publishing_config):
+    producer = FakeProducer({b"a": [pulsar.Result.Timeout] * 3})
+    with pytest.raises(publishing.PublishError, match="attempt 3"):
+        publishing.publish(
+            logging.getLogger(),
+            producer,
+            [publishing.create_message(b"a")],
+            publishing_config,
+        )
+
+
+def test_publish_does_not_retry_permanent_failures(publishing_config):
+    producer = FakeProducer({b"a": [pulsar.Result.MessageTooBig]})
+    messages = [publishing.create_message(b"a")] + [
+        publishing.create_message(b"b") for _ in range(3)
+    ]
+    with pytest.raises(publishing.PublishError, match="MessageTooBig"):
+        publishing.publish(
+            logging.getLogger(), producer, messages, publishing_config
+        )
+    assert len(producer.sent) < len(messages)
+
+
+def test_publish_with_synchronous_callback(publishing_config, mocker):
+    producer = mocker.Mock()
+    producer.send_async.side_effect = (
+        lambda _data, callback, **_kwargs: callback(pulsar.Result.Ok, None)
+    )
+    publishing.publish(
+        logging.getLogger(),
+        producer,
+        [publishing.create_message(b"a"), publishing.create_message(b"b")],
+        publishing_config,
+    )
+    assert producer.send_async.call_count == 2
@@ -0,0 +1,103 @@
+import json
+import logging
+
+import pytest
+from waltti_apc_vehicle_anonymization_profiler import runtime_estimator
+
+
+def test_fit_recovers_power_law():
+    records = [
+        runtime_estimator.create_record((m, 0), 0.5 * m**1.5)
+        for m in (10, 50, 200)
+    ]
+    fitted = runtime_estimator.fit(records)
+    assert fitted["exponent"] == pytest.approx(1.5)
+    assert fitted["coefficient"] == pytest.approx(0.5)
+    assert runtime_estimator.predict(fitted, (60, 40)) == pytest.approx(500)
+
+
+def test_fit_keeps_exponent_non_negative():
+    records = [
+        runtime_estimator.create_record((10, 0), 4.0),
+        runtime_estimator.create_record((100, 0), 1.0),
+    ]
+    fitted = runtime_estimator.fit(records)
+    assert fitted["exponent"] == 0
+    assert runtime_estimator.predict(fitted, (30, 0)) == pytest.approx(2.0)
+
+
+def test_fit_without_records():
+    assert runtime_estimator.fit([]) is None
+    assert runtime_estimator.predict(None, 100) is None
+
+
+def test_fit_with_one_maximum_count_is_linear():
+    fitted = runtime_estimator.fit(
+        [runtime_estimator.create_record((5, 5), 20)]
+    )
+    assert runtime_estimator.predict(fitted, (30, 0)) == pytest.approx(60)
+
+
+def test_schedule_longest_first():
+    models = {(10, 10), (40, 80), (30, 0)}
+    assert runtime_estimator.schedule_longest_first(None, models) == [
+        (40, 80),
+        (30, 0),
+        (10, 10),
+    ]
+
+
+def test_schedule_longest_first_uses_recorded_durations():
+    records = [
+        runtime_estimator.create_record((10, 10), 100.0),
+        runtime_estimator.create_record((10, 10), 80.0),
+        runtime_estimator.create_record((40, 80), 30.0),
+        runtime_estimator.create_record((20, 0), 1.0),
+    ]
+    fitted = runtime_estimator.fit(records)
+    assert runtime_estimator.predict(fitted, (10, 10)) == pytest.approx(90)
+    assert runtime_estimator.schedule_longest_first(
+        fitted, {(10, 10), (40, 80), (30, 0)}
+    ) == [(10, 10), (40, 80), (30, 0)]
+
+
+def test_read_and_write_records(tmp_path):
+    logger = logging.getLogger()
+    path = tmp_path / "records.json"
+    assert runtime_estimator.read_records(logger, path) == []
+    records = [
+        runtime_estimator.create_record((i, 0), 1.0)
+        for i in range(runtime_estimator.MAX_RECORDS + 5)
+    ]
+    runtime_estimator.write_records(path, records)
+    assert (
+        runtime_estimator.read_records(logger, path)
+        == records[-runtime_estimator.MAX_RECORDS :]
+    )
+    path.write_text("not json")
+    assert runtime_estimator.read_records(logger, path) == []
+
+
+def test_read_records_skips_malformed_records(tmp_path):
+    logger = logging.getLogger()
+    path = tmp_path / "records.json"
+    valid = [
+        runtime_estimator.create_record((1, 2), 1.0),
+        {"maximumCount": 3, "durationInSeconds": 2},
+    ]
+    path.write_text(
+        json.dumps(
+            [
+                *valid,
+                {"maximumCount": 3},
+                {"maximumCount": "3", "durationInSeconds": 1.0},
+                {"maximumCount": 3, "durationInSeconds": None},
+                [3, 1.0],
+            ]
+        )
+    )
+    records = runtime_estimator.read_records(logger, path)
+    assert records == valid
+    assert runtime_estimator.fit(records) is not None
+    path.write_text(json.dumps({"maximumCount": 3}))
+    assert runtime_estimator.read_records(logger, path) == []
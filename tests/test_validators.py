@@ -21,6 +21,17 @@ def test_get_profile_collection_validator():
         )
 
 
+@pytest.mark.parametrize(
+    "get_validator",
+    [
+        validators.get_vehicle_apc_mapping_validator,
+        validators.get_profile_collection_validator,
+    ],
+)
+def test_schemas_are_valid_json_schemas(get_validator):
+    jsonschema.Draft202012Validator.check_schema(get_validator().schema)
+
+
 def test_model_names_follow_schema_regex():
     example_key_value_follow_regex = {
         "vehicleModels": {"fi:kuopio:1234_124": "45-60"},
@@ -43,3 +54,108 @@ def test_model_names_follow_schema_regex():
         validator.validate(example_wrong_key)
     with pytest.raises(jsonschema.ValidationError):
         validator.validate(example_wrong_value)
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        [],
+        [{"operatorId": "1", "vehicleShortName": "2", "equipment": []}],
+        [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "seatingCapacity": 1.0,
+                "standingCapacity": 0,
+                "equipment": [{"type": "PASSENGER_COUNTER", "id": "3"}],
+            }
+        ],
+        [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "seatingCapacity": -1,
+                "equipment": [{"type": "PASSENGER_COUNTER", "id": "3"}],
+            }
+        ],
+        [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "seatingCapacity": True,
+                "equipment": [{"type": "PASSENGER_COUNTER", "id": "3"}],
+            }
+        ],
+        [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "equipment": [
+                    {"type": "PASSENGER_COUNTER", "id": "3"},
+                    {"id": "3", "type": "PASSENGER_COUNTER"},
+                ],
+            }
+        ],
+        [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "equipment": [{"type": "A", "id": "3", "extra": [1, True]}],
+            },
+            {
+                "vehicleShortName": "2",
+                "operatorId": "1",
+                "equipment": [{"type": "A", "id": "3", "extra": [1.0, True]}],
+            },
+        ],
+        [
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "equipment": [{"type": "A", "id": "3", "extra": [1, True]}],
+            },
+            {
+                "operatorId": "1",
+                "vehicleShortName": "2",
+                "equipment": [{"type": "A", "id": "3", "extra": [1, 1]}],
+            },
+        ],
+        [{"operatorId": "", "vehicleShortName": "2", "equipment": [{}]}],
+        {"operatorId": "1"},
+    ],
+)
+def test_vehicle_apc_mapping_compiled_check_agrees_with_jsonschema(instance):
+    validator = validators.get_vehicle_apc_mapping_validator()
+    assert validator.check is not None
+    assert validator.check(instance) == validator.fallback.is_valid(instance)
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        {"vehicleModels": {"a": "1-2"}, "modelProfiles": {"1-2": "x"}},
+        {"vehicleModels": {"a": "1-2"}, "modelProfiles": {"1-2": ""}},
+        {"vehicleModels": {}, "modelProfiles": {"1-2": "x"}},
+        {"vehicleModels": {"a": "1-2"}, "modelProfiles": {"x1-2": "x"}},
+        {"vehicleModels": {"a": "1-2"}},
+        {
+            "schemaVersion": "1-0",
+            "vehicleModels": {"a": "1-2"},
+            "modelProfiles": {"1-2": "x"},
+        },
+    ],
+)
+def test_profile_collection_compiled_check_agrees_with_jsonschema(instance):
+    validator = validators.get_profile_collection_validator()
+    assert validator.check is not None
+    assert validator.check(instance) == validator.fallback.is_valid(instance)
+
+
+def test_unsupported_schema_falls_back_to_jsonschema():
+    validator = validators.FastValidator(
+        {"type": "string", "format": "date", "maxLength": 3}
+    )
+    assert validator.check is None
+    validator.validate("foo")
+    with pytest.raises(jsonschema.ValidationError):
+        validator.validate("foobar")
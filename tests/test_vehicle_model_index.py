@@ -0,0 +1,66 @@
+from waltti_apc_vehicle_anonymization_profiler import vehicle_model_index
+
+
+def create_index():
+    return vehicle_model_index.VehicleModelIndex(
+        {
+            "fi:kuopio:1_2": (49, 77),
+            "fi:kuopio:2_3": (39, 38),
+            "fi:jyvaskyla:1_2": (49, 77),
+        }
+    )
+
+
+def test_get_vehicle_key():
+    vehicle = {"operatorId": "1", "vehicleShortName": "2"}
+    assert (
+        vehicle_model_index.get_vehicle_key("fi:kuopio", vehicle)
+        == "fi:kuopio:1_2"
+    )
+
+
+def test_index_is_a_mapping_of_vehicles_to_models():
+    index = create_index()
+    assert index == {
+        "fi:kuopio:1_2": (49, 77),
+        "fi:kuopio:2_3": (39, 38),
+        "fi:jyvaskyla:1_2": (49, 77),
+    }
+    assert set(index.needed_tuple_models) == {(49, 77), (39, 38)}
+    assert index.get_vehicles((49, 77)) == {
+        "fi:kuopio:1_2",
+        "fi:jyvaskyla:1_2",
+    }
+    assert index.count_vehicles((1, 1)) == 0
+
+
+def test_intern_returns_the_stored_tuple():
+    index = create_index()
+    model = index["fi:kuopio:1_2"]
+    assert index.intern((49, int("77"))) is model
+    assert index.intern_string_model("49-77") is model
+    assert index.intern_string_model("49-077") is model
+    assert index.to_string_model((39, 38)) == "39-38"
+
+
+def test_add_vehicle_replaces_the_model_in_both_directions():
+    index = create_index()
+    index.add_vehicle("fi:kuopio:2_3", (49, 77))
+    assert index["fi:kuopio:2_3"] == (49, 77)
+    assert set(index.needed_tuple_models) == {(49, 77)}
+    assert index.count_vehicles((49, 77)) == 3
+    assert index.get_vehicles((39, 38)) == frozenset()
+
+
+def test_queries():
+    index = create_index()
+    assert index.get_new_tuple_models({(39, 38): "x"}) == {(49, 77)}
+    assert index.get_needed_string_models_to_profiles(
+        {"49-77": "a", "1-1": "b"}
+    ) == {"49-77": "a"}
+    assert index.get_unused_string_models(["49-77", "1-1", "39-38"]) == ["1-1"]
+    assert index.get_vehicles_to_string_models() == {
+        "fi:kuopio:1_2": "49-77",
+        "fi:kuopio:2_3": "39-38",
+        "fi:jyvaskyla:1_2": "49-77",
+    }